@@ -7,6 +7,17 @@ BASE_DIR="$(pwd)"
 SRC_DIR="${BASE_DIR}/src"
 TERRAFORM_DIR="${BASE_DIR}/infrastructure/tf_generated"
 
+# Must match the runtime in infrastructure/lambda.tf so the precompiled .pyc files are used
+PYTHON="${PYTHON:-python3.12}"
+if ! ${PYTHON} -c 'import sys; sys.exit(sys.version_info[:2] != (3, 12))'; then
+    echo "${PYTHON} is not Python 3.12; set PYTHON to a 3.12 interpreter" >&2
+    exit 1
+fi
+
+# Already provided by the python3.12 Lambda runtime; bundling them only adds
+# size and a second copy to load
+RUNTIME_PROVIDED="boto3 botocore s3transfer jmespath dateutil python_dateutil six urllib3"
+
 # Function to build a lambda
 build_lambda() {
     local lambda_dir=$1
@@ -19,21 +30,43 @@ build_lambda() {
     mkdir -p ${BUILD_DIR}/common
     cp -R ${SRC_DIR}/common/* ${BUILD_DIR}/common/
 
-    cat ${BUILD_DIR}/requirements.txt ${SRC_DIR}/common/requirements.txt > ${BUILD_DIR}/combined_requirements.txt
+    cat ${BUILD_DIR}/requirements.txt ${SRC_DIR}/common/requirements.txt | sort -u > ${BUILD_DIR}/combined_requirements.txt
+
+    pip install --platform manylinux2014_x86_64 --implementation cp --python-version 3.12 --only-binary=:all: \
+        --no-compile --target ${BUILD_DIR} -r ${BUILD_DIR}/combined_requirements.txt
+
+    strip_package ${BUILD_DIR}
 
-    pip install --platform manylinux2014_x86_64 --implementation cp --only-binary=:all: --target ${BUILD_DIR} -r ${BUILD_DIR}/combined_requirements.txt
+    # Lambda's filesystem is read-only, so without these every cold start recompiles
+    # the sources in memory. Unchecked hashes also skip the per-import source stat.
+    ${PYTHON} -m compileall -q -j 0 --invalidation-mode unchecked-hash ${BUILD_DIR}
 
-    rm -rf ${BUILD_DIR}/tests ${BUILD_DIR}/*requirements.txt
-    (cd ${BUILD_DIR} && zip -r ${TERRAFORM_DIR}/${lambda_name}.zip .)
+    rm -f ${TERRAFORM_DIR}/${lambda_name}.zip
+    (cd ${BUILD_DIR} && zip -q -r -9 -X ${TERRAFORM_DIR}/${lambda_name}.zip .)
 
     rm -rf ${BUILD_DIR}
 
-    echo "${lambda_name} built successfully."
+    echo "${lambda_name} built successfully ($(du -h ${TERRAFORM_DIR}/${lambda_name}.zip | cut -f1))."
+}
+
+strip_package() {
+    local build_dir=$1
+
+    rm -rf ${build_dir}/tests ${build_dir}/common/tests ${build_dir}/bin ${build_dir}/*requirements.txt ${build_dir}/common/*requirements.txt
+    for package in ${RUNTIME_PROVIDED}; do
+        rm -rf ${build_dir}/${package} ${build_dir}/${package}-*.dist-info
+    done
+    find ${build_dir} -depth -type d \( -name "__pycache__" -o -name "tests" \) -exec rm -rf {} +
+    find ${build_dir} -type f \( -name "*.pyi" -o -name "*.c" -o -name "*.h" -o -name "*.pyx" -o -name "py.typed" \) -delete
+    find ${build_dir} -name "*.dist-info" -type d -exec rm -rf {}/RECORD {}/INSTALLER {}/REQUESTED {}/direct_url.json \;
+    if command -v strip > /dev/null; then
+        find ${build_dir} -name "*.so" -type f -exec strip --strip-unneeded {} \;
+    fi
 }
 
 # Build all lambdas
 for lambda_dir in ${SRC_DIR}/*/; do
-    if [[ "$lambda_dir" != *"common"* && "$lambda_dir" != *"htmlcov"* && "$lambda_dir" != *"env"* ]]; then
+    if [[ "$lambda_dir" != *"common"* && "$lambda_dir" != *"htmlcov"* && "$lambda_dir" != *"env"* && "$lambda_dir" != *"benchmarks"* ]]; then
         build_lambda $lambda_dir
     fi
 done
@@ -13,4 +13,56 @@ resource "aws_dynamodb_table" "elevation_requests" {
     name = "requested_at"
     type = "S"
   }
+
+  attribute {
+    name = "status"
+    type = "S"
+  }
+
+  # Epoch seconds for the current status: requested, expires or demoted time
+  attribute {
+    name = "status_time"
+    type = "N"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  global_secondary_index {
+    name            = "status-index"
+    hash_key        = "status"
+    range_key       = "status_time"
+    projection_type = "ALL"
+  }
+}
+
+# Pre-aggregated counts (total, day#..., user#..., approver#...) for the dashboard
+resource "aws_dynamodb_table" "elevation_statistics" {
+  name         = "${terraform.workspace}_GithubElevationStatistics"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "aggregate"
+
+  attribute {
+    name = "aggregate"
+    type = "S"
+  }
+}
+
+resource "aws_dynamodb_table" "webhook_deliveries" {
+  name         = "${terraform.workspace}_GithubWebhookDeliveries"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "delivery_id"
+
+  attribute {
+    name = "delivery_id"
+    type = "S"
+  }
+
+  # Claims only need to outlive GitHub's redelivery window
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
 }
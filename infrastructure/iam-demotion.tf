@@ -32,6 +32,7 @@ data "aws_iam_policy_document" "allow_lambda_logging_github_permission_manager_d
     effect = "Allow"
     actions = [
       "ssm:GetParameter",
+      "ssm:GetParameters",
     ]
     resources = [
       aws_ssm_parameter.github_permission_manager_webhook_app_id.arn,
@@ -45,9 +46,24 @@ data "aws_iam_policy_document" "allow_lambda_logging_github_permission_manager_d
     actions = [
       "dynamodb:PutItem",
       "dynamodb:GetItem",
+      "dynamodb:UpdateItem",
+      "dynamodb:Query",
     ]
     resources = [
       aws_dynamodb_table.elevation_requests.arn,
+      "${aws_dynamodb_table.elevation_requests.arn}/index/*",
+    ]
+  }
+
+  # Counter items get best-effort ADD updates after each request record is written
+  statement {
+    effect = "Allow"
+    actions = [
+      "dynamodb:GetItem",
+      "dynamodb:UpdateItem",
+    ]
+    resources = [
+      aws_dynamodb_table.elevation_statistics.arn,
     ]
   }
 }
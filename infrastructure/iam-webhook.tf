@@ -32,6 +32,7 @@ data "aws_iam_policy_document" "allow_lambda_logging_github_permission_manager_w
     effect = "Allow"
     actions = [
       "ssm:GetParameter",
+      "ssm:GetParameters",
     ]
     resources = [
       aws_ssm_parameter.github_permission_manager_webhook_secret_for_webhook.arn,
@@ -52,6 +53,43 @@ data "aws_iam_policy_document" "allow_lambda_logging_github_permission_manager_w
     ]
     resources = [
       aws_dynamodb_table.elevation_requests.arn,
+      "${aws_dynamodb_table.elevation_requests.arn}/index/*",
+    ]
+  }
+
+  # Counter items get best-effort ADD updates after each request record is written
+  statement {
+    effect = "Allow"
+    actions = [
+      "dynamodb:GetItem",
+      "dynamodb:UpdateItem",
+    ]
+    resources = [
+      aws_dynamodb_table.elevation_statistics.arn,
+    ]
+  }
+
+  statement {
+    effect = "Allow"
+    actions = [
+      "dynamodb:PutItem",
+      "dynamodb:DeleteItem",
+    ]
+    resources = [
+      aws_dynamodb_table.webhook_deliveries.arn,
+    ]
+  }
+
+  statement {
+    effect = "Allow"
+    actions = [
+      "sqs:SendMessage",
+      "sqs:ReceiveMessage",
+      "sqs:DeleteMessage",
+      "sqs:GetQueueAttributes",
+    ]
+    resources = [
+      aws_sqs_queue.webhook_deliveries.arn,
     ]
   }
 
@@ -13,9 +13,15 @@ resource "aws_lambda_function" "github_permission_manager_webhook" {
 
   environment {
     variables = {
-      ELEVATION_DURATION = "300"
-      STEP_FUNCTION_ARN  = aws_sfn_state_machine.user_demotion.arn
-      WORKSPACE          = terraform.workspace
+      ELEVATION_DURATION     = "300"
+      STEP_FUNCTION_ARN      = aws_sfn_state_machine.user_demotion.arn
+      WORKSPACE              = terraform.workspace
+      LOG_LEVEL              = "INFO"
+      LOG_SAMPLE_RATE        = "0.05"
+      GITHUB_GRAPHQL_LOOKUPS = "false"
+      # "async" acknowledges deliveries with a 202 and leaves the work to the worker
+      INGESTION_MODE         = "sync"
+      INGESTION_QUEUE_URL    = aws_sqs_queue.webhook_deliveries.url
     }
   }
 }
@@ -25,6 +31,35 @@ resource "aws_cloudwatch_log_group" "github_permission_manager_webhook_log_group
   retention_in_days = 30
 }
 
+resource "aws_lambda_function" "github_permission_manager_worker" {
+  function_name = "${terraform.workspace}_github_permission_manager_worker"
+  description   = "processes webhook deliveries queued in async ingestion mode"
+  role          = aws_iam_role.github_permission_manager_webhook.arn
+  handler       = "worker.handler"
+  memory_size   = 128
+  runtime       = "python3.12"
+  architectures = ["x86_64"]
+  timeout       = 120
+
+  filename         = local.github_permission_manager_webhook_archive_path
+  source_code_hash = filebase64sha256(local.github_permission_manager_webhook_archive_path)
+
+  environment {
+    variables = {
+      ELEVATION_DURATION     = "300"
+      WORKSPACE              = terraform.workspace
+      LOG_LEVEL              = "INFO"
+      LOG_SAMPLE_RATE        = "0.05"
+      GITHUB_GRAPHQL_LOOKUPS = "false"
+    }
+  }
+}
+
+resource "aws_cloudwatch_log_group" "github_permission_manager_worker_log_group" {
+  name              = "/aws/lambda/${aws_lambda_function.github_permission_manager_worker.function_name}"
+  retention_in_days = 30
+}
+
 resource "aws_lambda_function" "github_permission_manager_demotion" {
   function_name = "${terraform.workspace}_github_permission_manager_demotion"
   description   = "demotes users back to normal members"
@@ -40,7 +75,10 @@ resource "aws_lambda_function" "github_permission_manager_demotion" {
 
   environment {
     variables = {
-      WORKSPACE = terraform.workspace
+      WORKSPACE              = terraform.workspace
+      LOG_LEVEL              = "INFO"
+      LOG_SAMPLE_RATE        = "0.05"
+      GITHUB_GRAPHQL_LOOKUPS = "false"
     }
   }
 
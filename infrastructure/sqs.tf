@@ -0,0 +1,25 @@
+resource "aws_sqs_queue" "webhook_deliveries_dead_letter" {
+  name                      = "${terraform.workspace}_github_permission_manager_webhook_deliveries_dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "webhook_deliveries" {
+  name = "${terraform.workspace}_github_permission_manager_webhook_deliveries"
+  # At least six times the worker timeout, as AWS recommends for Lambda event sources
+  visibility_timeout_seconds = 720
+  message_retention_seconds  = 86400
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.webhook_deliveries_dead_letter.arn
+    maxReceiveCount     = 5
+  })
+}
+
+# Larger batches share one token and one team listing per organization
+resource "aws_lambda_event_source_mapping" "github_permission_manager_worker" {
+  event_source_arn                   = aws_sqs_queue.webhook_deliveries.arn
+  function_name                      = aws_lambda_function.github_permission_manager_worker.arn
+  batch_size                         = 50
+  maximum_batching_window_in_seconds = 2
+  function_response_types            = ["ReportBatchItemFailures"]
+}
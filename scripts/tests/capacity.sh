@@ -0,0 +1,26 @@
+#!/bin/bash
+
+set -euo pipefail
+
+cd "$(git rev-parse --show-toplevel)"
+
+# Replays a burst of signed webhook deliveries (an incident where many engineers
+# request elevation at once) against the webhook handler, with in-process
+# stand-ins for GitHub and AWS, and reports throughput, p50/p95/p99 latency,
+# outbound calls and deliveries that would need redelivery. Tune it with
+# CAPACITY_ENGINEERS, CAPACITY_RATE (deliveries per second, 0 for a burst),
+# CAPACITY_CONCURRENCY and CAPACITY_SECONDARY_LIMIT_EVERY, plus the latency
+# variables used by test-response-time.
+
+BASE_DIR="$(pwd)"
+SRC_DIR="${BASE_DIR}/src"
+cd ${SRC_DIR}
+source env/bin/activate
+cd benchmarks
+python load_replay.py \
+    --engineers "${CAPACITY_ENGINEERS:-50}" \
+    --rate "${CAPACITY_RATE:-0}" \
+    --concurrency "${CAPACITY_CONCURRENCY:-10}" \
+    --secondary-limit-every "${CAPACITY_SECONDARY_LIMIT_EVERY:-0}" \
+    --json capacity-results.json
+deactivate
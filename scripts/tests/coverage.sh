@@ -23,7 +23,8 @@ cd ${SRC_DIR}
 source env/bin/activate
 coverage_files=()
 for lambda_dir in ${SRC_DIR}/*/; do
-    if [[ "$lambda_dir" != *"env"* && "$lambda_dir" != *"htmlcov"* ]]; then
+    # Benchmarks run separately from scripts/tests/response-time.sh
+    if [[ "$lambda_dir" != *"env"* && "$lambda_dir" != *"htmlcov"* && "$lambda_dir" != *"benchmarks"* ]]; then
         echo "Running unit tests for ${lambda_dir}..."
         pushd $lambda_dir > /dev/null
         python -m coverage run --source=. -m pytest
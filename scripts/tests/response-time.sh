@@ -0,0 +1,32 @@
+#!/bin/bash
+
+set -euo pipefail
+
+cd "$(git rev-parse --show-toplevel)"
+
+# Runs the handler benchmark suite in src/benchmarks against in-process
+# stand-ins for GitHub, SSM, DynamoDB and Step Functions. Each scenario fails
+# if its outbound call counts change or its median latency exceeds the budget
+# derived from the injected latency (BENCHMARK_GITHUB_LATENCY_MS,
+# BENCHMARK_AWS_LATENCY_MS). Set BENCHMARK_COMPARE=1 to also fail on a >20%
+# median regression against the last run saved under src/benchmarks/.benchmarks.
+# It then reports handler import time per function and fails if a handler
+# imports boto3, requests, jwt or cryptography at module load.
+
+BASE_DIR="$(pwd)"
+SRC_DIR="${BASE_DIR}/src"
+cd ${SRC_DIR}
+source env/bin/activate
+cd benchmarks
+compare_args=()
+if [[ "${BENCHMARK_COMPARE:-}" == "1" ]]; then
+    compare_args=(--benchmark-compare --benchmark-compare-fail=median:20%)
+fi
+python -m pytest \
+    --benchmark-autosave \
+    --benchmark-json=benchmark-results.json \
+    --benchmark-columns=min,median,mean,max,stddev,iqr,rounds \
+    ${compare_args[@]+"${compare_args[@]}"}
+# Cold-start import cost per function, from python -X importtime
+python import_time.py --json import-time.json
+deactivate
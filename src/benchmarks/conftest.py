@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import os
+import sys
+import uuid
+import boto3
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+# The webhook handler imports its utilities module the way the Lambda runtime lays it out
+sys.path.insert(0, os.path.join(SRC_DIR, 'github_permission_manager_webhook'))
+
+import common.github_client as github_client_module
+from github_permission_manager_webhook import handler as webhook_handler
+from github_permission_manager_demotion import handler as demotion_handler
+from stand_ins import Latency, StandIns
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+WORKSPACE = 'bench'
+WEBHOOK_SECRET = 'benchmark-webhook-secret'
+ROUNDS = int(os.getenv('BENCHMARK_ROUNDS', '20'))
+CPU_ALLOWANCE_MS = float(os.getenv('BENCHMARK_CPU_ALLOWANCE_MS', '40'))
+# Cold starts also parse and validate the App's RSA private key, which alone is ~60 ms
+COLD_START_ALLOWANCE_MS = float(os.getenv('BENCHMARK_COLD_START_ALLOWANCE_MS', '120'))
+
+def load_payload(name):
+    with open(os.path.join(PAYLOAD_DIR, f"{name}.json"), 'rb') as payload_file:
+        return payload_file.read()
+
+def signed_event(github_event, body, secret=WEBHOOK_SECRET):
+    signature = "sha256=" + hmac.new(secret.encode('utf-8'), msg=body, digestmod=hashlib.sha256).hexdigest()
+    return {
+        'headers': {
+            'X-GitHub-Event': github_event,
+            'X-GitHub-Delivery': str(uuid.uuid4()),
+            'X-Hub-Signature-256': signature,
+            'Content-Type': 'application/json'
+        },
+        'body': body.decode('utf-8'),
+        'isBase64Encoded': False
+    }
+
+def latency_budget_ms(latency, github_round_trips, aws_round_trips, overlapping=0, cold=False):
+    # Sequential round trips on the critical path plus a fixed allowance for our own CPU time.
+    # Each overlapping GitHub and AWS pair only costs the slower of the two.
+    round_trips = github_round_trips * latency.github + aws_round_trips * latency.aws
+    budget = (round_trips - overlapping * min(latency.github, latency.aws)) * 1000 + CPU_ALLOWANCE_MS
+    return budget + COLD_START_ALLOWANCE_MS if cold else budget
+
+def assert_within_budget(benchmark, budget_ms):
+    if benchmark.stats is None:
+        return  # --benchmark-disable runs each scenario once without timing
+    median_ms = benchmark.stats.stats.median * 1000
+    assert median_ms <= budget_ms, f"median {median_ms:.1f} ms exceeds budget {budget_ms:.1f} ms"
+
+def generate_private_key_pem():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode('utf-8')
+
+def build_stand_ins(private_key_pem, latency=None, rate_limits=None, team_members=('requester', 'approver'),
+                    owners=('org-admin', 'requester'), roles=None):
+    webhook_names = webhook_handler.get_parameter_names(WORKSPACE)
+    demotion_names = demotion_handler.get_parameter_names(WORKSPACE)
+    parameters = {
+        webhook_names['webhook_secret']: WEBHOOK_SECRET,
+        webhook_names['step_function_arn']: 'arn:aws:states:eu-west-2:123456789012:stateMachine:bench_user_demotion',
+    }
+    for names in (webhook_names, demotion_names):
+        parameters[names['app_id']] = '12345'
+        parameters[names['private_key']] = private_key_pem
+        parameters[names['installation_id']] = '4001'
+    return StandIns(
+        latency or Latency.from_env(),
+        parameters,
+        team_members=team_members,
+        owners=owners,
+        roles={'org-admin': 'admin', 'requester': 'admin'} if roles is None else roles,
+        rate_limits=rate_limits
+    )
+
+def install_stand_ins(monkeypatch, services):
+    """Points boto3 and the shared GitHub session at the stand-ins and starts both handlers cold."""
+    monkeypatch.setenv('WORKSPACE', WORKSPACE)
+    monkeypatch.setenv('ELEVATION_DURATION', '300')
+    monkeypatch.setattr(boto3, 'client', services.client)
+    monkeypatch.setattr(boto3, 'resource', services.resource)
+    monkeypatch.setattr(github_client_module, '_shared_session', services.github)
+    # Fresh quota records and ETags, as a new container would have
+    monkeypatch.setattr(github_client_module, '_shared_rate_limits', None)
+    monkeypatch.setattr(github_client_module, '_shared_etags', None)
+    webhook_handler.runtime_context.invalidate()
+    demotion_handler.runtime_context.invalidate()
+
+@pytest.fixture(scope='session')
+def private_key_pem():
+    return generate_private_key_pem()
+
+@pytest.fixture
+def stand_ins(monkeypatch, private_key_pem):
+    services = build_stand_ins(private_key_pem)
+    install_stand_ins(monkeypatch, services)
+    yield services
+    webhook_handler.runtime_context.invalidate()
+    demotion_handler.runtime_context.invalidate()
@@ -0,0 +1,79 @@
+# Measures what each Lambda pays to import its handler module, using the
+# interpreter's own -X importtime report, e.g.
+#   python benchmarks/import_time.py --runs 5 --json import-time.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTIONS = ['github_permission_manager_webhook', 'github_permission_manager_demotion']
+# Only needed once a request actually reaches AWS or GitHub, so never at import
+DEFERRED_MODULES = ['boto3', 'botocore', 'requests', 'urllib3', 'jwt', 'cryptography']
+
+def parse_importtime(stderr):
+    """Returns {module: (self_us, cumulative_us)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def import_handler(function_name):
+    # Same layout as the deployed archive: handler.py at the root, common/ next to it
+    probe = "import sys, json, handler; print(json.dumps(sorted(m for m in %r if m in sys.modules)))" % (DEFERRED_MODULES,)
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, PYTHONDONTWRITEBYTECODE='1')
+    env.pop('AWS_LAMBDA_FUNCTION_NAME', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], cwd=os.path.join(SRC_DIR, function_name),
+                            env=env, capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr), json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(function_name, runs=5, top=10):
+    totals, modules, loaded = [], {}, []
+    for _ in range(runs):
+        modules, loaded = import_handler(function_name)
+        totals.append(modules['handler'][1] / 1000)
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        'function': function_name,
+        'runs': runs,
+        'handler_import_ms': {'median': statistics.median(totals), 'min': min(totals), 'max': max(totals)},
+        'modules_imported': len(modules),
+        'deferred_modules_loaded': loaded,
+        'slowest_modules': [{'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+                            for name, (self_us, cumulative_us) in slowest]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report handler import time per Lambda function")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, help='fail when a median handler import exceeds this')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    reports = [measure(function_name, args.runs, args.top) for function_name in FUNCTIONS]
+    failures = []
+    for report in reports:
+        timing = report['handler_import_ms']
+        print(f"{report['function']}: median {timing['median']:.1f} ms (min {timing['min']:.1f}, max {timing['max']:.1f}), "
+              f"{report['modules_imported']} modules")
+        for module in report['slowest_modules']:
+            print(f"  {module['self_ms']:8.2f} ms self {module['cumulative_ms']:8.2f} ms cumulative  {module['module']}")
+        if report['deferred_modules_loaded']:
+            failures.append(f"{report['function']} imports {', '.join(report['deferred_modules_loaded'])} at module load")
+        if args.budget_ms is not None and timing['median'] > args.budget_ms:
+            failures.append(f"{report['function']} import median {timing['median']:.1f} ms exceeds {args.budget_ms} ms")
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(reports, report_file, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+# Replays a burst of signed webhook deliveries against the webhook handler with
+# in-process stand-ins for GitHub, SSM, DynamoDB and Step Functions, e.g.
+#   python benchmarks/load_replay.py --engineers 40 --rate 20 --concurrency 10
+#   python benchmarks/load_replay.py --recorded deliveries.jsonl --secondary-limit-every 25
+import argparse
+import copy
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+# conftest puts src/ on the path, so it comes before the common imports
+from conftest import WEBHOOK_SECRET, build_stand_ins, generate_private_key_pem, install_stand_ins, load_payload, signed_event, webhook_handler
+from common.logger import logger
+from common.metrics import metrics
+from common.runtime import RuntimeContext
+from stand_ins import Latency, RateLimitProfile
+
+# GitHub marks a delivery failed when no response arrives within 10 seconds;
+# failed deliveries have to be redelivered
+GITHUB_DELIVERY_TIMEOUT_SECONDS = 10
+APPROVER = 'approver'
+FIRST_ISSUE_NUMBER = 1000
+
+class Delivery:
+    def __init__(self, github_event, body):
+        self.github_event = github_event
+        self.body = body if isinstance(body, bytes) else body.encode('utf-8')
+
+def synthetic_deliveries(engineers, approval_lag=5):
+    """An incident: each engineer opens an elevation issue and is approved approval_lag deliveries later."""
+    opened, approval = json.loads(load_payload('issues_opened')), json.loads(load_payload('issue_comment_approval'))
+    deliveries, pending = [], []
+    for number in range(engineers):
+        login, issue_number = f"engineer-{number}", FIRST_ISSUE_NUMBER + number
+        payload = copy.deepcopy(opened)
+        payload['issue'].update(number=issue_number, user=dict(payload['issue']['user'], login=login))
+        deliveries.append(Delivery('issues', json.dumps(payload)))
+        payload = copy.deepcopy(approval)
+        payload['issue'].update(number=issue_number, user=dict(payload['issue']['user'], login=login))
+        payload['comment']['user']['login'] = APPROVER
+        pending.append(Delivery('issue_comment', json.dumps(payload)))
+        if len(pending) > approval_lag:
+            deliveries.append(pending.pop(0))
+    return deliveries + pending
+
+def recorded_deliveries(path):
+    """Reads JSON Lines of {"github_event": ..., "payload": {...}} or {"github_event": ..., "body": "..."}."""
+    deliveries = []
+    with open(path) as deliveries_file:
+        for line in deliveries_file:
+            if line.strip():
+                record = json.loads(line)
+                body = record['body'] if 'body' in record else json.dumps(record['payload'])
+                deliveries.append(Delivery(record['github_event'], body))
+    return deliveries
+
+def delivery_users(deliveries):
+    users = set()
+    for delivery in deliveries:
+        payload = json.loads(delivery.body)
+        users.update(user['login'] for user in ((payload.get('issue') or {}).get('user'),
+                                                (payload.get('comment') or {}).get('user')) if user)
+    return users
+
+class ContainerContext:
+    """Stands in for the handler's runtime_context with one container per harness thread.
+
+    Lambda runs concurrent invocations in separate execution environments, so each
+    thread gets its own warm manager and a new thread starts cold.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.cold_starts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _build(self):
+        with self._lock:
+            self.cold_starts += 1
+        return self.factory()
+
+    def _context(self):
+        if not hasattr(self._local, 'context'):
+            self._local.context = RuntimeContext(self._build)
+        return self._local.context
+
+    def get(self):
+        return self._context().get()
+
+    def invalidate(self):
+        self._context().invalidate()
+
+class Outcome:
+    def __init__(self, scheduled_at, started_at, finished_at, status_code=None, error=None):
+        self.latency = finished_at - scheduled_at  # what GitHub waits, including time queued for a container
+        self.service_time = finished_at - started_at
+        self.status_code = status_code
+        self.error = error
+
+def percentile(values, fraction):
+    # Nearest rank, so a reported p99 is always a latency that was actually observed
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def invoke(delivery, scheduled_at):
+    started_at = time.perf_counter()
+    try:
+        response = webhook_handler.handler(signed_event(delivery.github_event, delivery.body, WEBHOOK_SECRET), None)
+        return Outcome(scheduled_at, started_at, time.perf_counter(), status_code=response['statusCode'])
+    except Exception as err:
+        return Outcome(scheduled_at, started_at, time.perf_counter(), error=type(err).__name__)
+
+def replay(deliveries, rate=0, concurrency=10):
+    """Sends the deliveries at rate per second (0 for as fast as the containers allow) and returns the outcomes."""
+    futures = []
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for number, delivery in enumerate(deliveries):
+            scheduled_at = started_at + number / rate if rate else time.perf_counter()
+            time.sleep(max(0.0, scheduled_at - time.perf_counter()))
+            futures.append(executor.submit(invoke, delivery, scheduled_at))
+    return [future.result() for future in futures], time.perf_counter() - started_at
+
+def summarise(outcomes, elapsed, services, containers, timeout_seconds=GITHUB_DELIVERY_TIMEOUT_SECONDS):
+    def milliseconds(values):
+        return {name: round(percentile(values, fraction) * 1000, 1) if values else None
+                for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))}
+
+    status_codes, errors = {}, {}
+    for outcome in outcomes:
+        if outcome.error:
+            errors[outcome.error] = errors.get(outcome.error, 0) + 1
+        else:
+            status_codes[str(outcome.status_code)] = status_codes.get(str(outcome.status_code), 0) + 1
+    timeouts = sum(1 for outcome in outcomes if outcome.latency > timeout_seconds)
+    failed = sum(1 for outcome in outcomes if outcome.error or outcome.status_code >= 500 or outcome.latency > timeout_seconds)
+    return {
+        'deliveries': len(outcomes),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(len(outcomes) / elapsed, 2) if elapsed else None,
+        'latency_ms': milliseconds([outcome.latency for outcome in outcomes]),
+        'service_time_ms': milliseconds([outcome.service_time for outcome in outcomes]),
+        'status_codes': status_codes,
+        'errors': errors,
+        'timeouts': timeouts,
+        'redeliveries_needed': failed,
+        'cold_starts': containers.cold_starts,
+        'calls': {service: services.calls.count(service) for service in sorted({service for service, _ in services.calls.calls})},
+        'github_rate_limited': services.github.rate_limited,
+        # The counters the handlers kept, to check against the status codes
+        'statistics': {name: value for name, value in services.dynamodb.Table('GithubElevationStatistics').items.get(('total',), {}).items()
+                       if name in ('requested', 'elevated', 'active')},
+    }
+
+def run(deliveries, rate=0, concurrency=10, latency=None, rate_limits=None, timeout_seconds=GITHUB_DELIVERY_TIMEOUT_SECONDS):
+    users = delivery_users(deliveries)
+    services = build_stand_ins(generate_private_key_pem(), latency, rate_limits, team_members=users | {APPROVER},
+                               roles={'org-admin': 'admin', **{user: 'member' for user in users}})
+    containers = ContainerContext(webhook_handler.build_permission_manager)
+    with pytest.MonkeyPatch.context() as patcher:
+        install_stand_ins(patcher, services)
+        patcher.setattr(webhook_handler, 'runtime_context', containers)
+        # EMF lines and logs from every invocation would drown the report
+        with open('/dev/null', 'w') as discard:
+            patcher.setattr(metrics, 'stream', discard)
+            patcher.setattr(logger, 'stream', discard)
+            outcomes, elapsed = replay(deliveries, rate, concurrency)
+    return summarise(outcomes, elapsed, services, containers, timeout_seconds)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a burst of signed webhook deliveries against the webhook handler")
+    parser.add_argument('--recorded', help='JSON Lines of recorded deliveries; synthetic incident traffic otherwise')
+    parser.add_argument('--engineers', type=int, default=30, help='engineers requesting elevation in the synthetic burst')
+    parser.add_argument('--rate', type=float, default=0, help='deliveries per second, 0 for as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=10, help='concurrent Lambda containers')
+    parser.add_argument('--github-latency-ms', type=float)
+    parser.add_argument('--aws-latency-ms', type=float)
+    parser.add_argument('--quota', type=int, help='primary GitHub requests allowed before 403s')
+    parser.add_argument('--secondary-limit-every', type=int, default=0, help='answer every Nth GitHub request with a secondary limit')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--timeout-s', type=float, default=GITHUB_DELIVERY_TIMEOUT_SECONDS)
+    parser.add_argument('--max-p99-ms', type=float, help='fail when the p99 delivery latency exceeds this')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    deliveries = recorded_deliveries(args.recorded) if args.recorded else synthetic_deliveries(args.engineers)
+    defaults = Latency.from_env()
+    latency = Latency(defaults.github * 1000 if args.github_latency_ms is None else args.github_latency_ms,
+                      defaults.aws * 1000 if args.aws_latency_ms is None else args.aws_latency_ms)
+    rate_limits = None
+    if args.quota or args.secondary_limit_every:
+        rate_limits = RateLimitProfile(args.quota, secondary_every=args.secondary_limit_every, retry_after=args.retry_after)
+    report = run(deliveries, args.rate, args.concurrency, latency, rate_limits, args.timeout_s)
+
+    latency_ms = report['latency_ms']
+    print(f"{report['deliveries']} deliveries in {report['elapsed_s']:.2f} s ({report['throughput_per_s']} / s), "
+          f"{report['cold_starts']} cold starts")
+    print(f"latency p50 {latency_ms['p50']} ms p95 {latency_ms['p95']} ms p99 {latency_ms['p99']} ms max {latency_ms['max']} ms")
+    print(f"status codes {report['status_codes']}, errors {report['errors']}")
+    print(f"outbound calls {report['calls']}, GitHub rate limited {report['github_rate_limited']}")
+    print(f"{report['timeouts']} over the {args.timeout_s:g} s delivery timeout, {report['redeliveries_needed']} need redelivery")
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    failures = []
+    if report['redeliveries_needed']:
+        failures.append(f"{report['redeliveries_needed']} deliveries would need redelivery")
+    if args.max_p99_ms is not None and latency_ms['p99'] > args.max_p99_ms:
+        failures.append(f"p99 {latency_ms['p99']} ms exceeds {args.max_p99_ms} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
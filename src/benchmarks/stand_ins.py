@@ -0,0 +1,372 @@
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import requests
+
+GITHUB_LATENCY_ENV = 'BENCHMARK_GITHUB_LATENCY_MS'
+AWS_LATENCY_ENV = 'BENCHMARK_AWS_LATENCY_MS'
+DEFAULT_GITHUB_LATENCY_MS = 20
+DEFAULT_AWS_LATENCY_MS = 5
+
+class Latency:
+    """Simulated round-trip time per service, in seconds."""
+
+    def __init__(self, github=None, aws=None):
+        self.github = (DEFAULT_GITHUB_LATENCY_MS if github is None else github) / 1000
+        self.aws = (DEFAULT_AWS_LATENCY_MS if aws is None else aws) / 1000
+
+    @classmethod
+    def from_env(cls):
+        return cls(float(os.getenv(GITHUB_LATENCY_ENV, DEFAULT_GITHUB_LATENCY_MS)),
+                   float(os.getenv(AWS_LATENCY_ENV, DEFAULT_AWS_LATENCY_MS)))
+
+class CallLog:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, service, operation):
+        with self._lock:
+            self.calls.append((service, operation))
+
+    def count(self, service=None):
+        return sum(1 for called, _ in self.calls if service is None or called == service)
+
+    def clear(self):
+        with self._lock:
+            self.calls = []
+
+class RateLimitProfile:
+    """How the GitHub stand-in rations requests.
+
+    quota is the primary limit per window; every secondary_every-th request is
+    answered with a secondary rate limit asking the client to retry after
+    retry_after seconds. Zero or None turns either off.
+    """
+
+    def __init__(self, quota=None, window_seconds=3600, secondary_every=0, retry_after=1):
+        self.quota = quota
+        self.window_seconds = window_seconds
+        self.secondary_every = secondary_every
+        self.retry_after = retry_after
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, links=None, headers=None):
+        self.status_code = status_code
+        self._body = body
+        self.links = links or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+class FakeGitHub:
+    """Stands in for the requests.Session talking to api.github.com."""
+
+    def __init__(self, latency, calls, team_members=(), owners=(), roles=None, rate_limits=None):
+        self.latency = latency
+        self.calls = calls
+        self.rate_limits = rate_limits
+        self.requests = 0
+        self.rate_limited = 0
+        self._window_started = time.time()
+        self._lock = threading.Lock()
+        self.team_members = set(team_members)
+        self.owners = list(owners)
+        self.roles = dict(roles or {})
+        self.routes = [
+            ('POST', r'/app/installations/(?P<id>[^/]+)/access_tokens$', self._access_token),
+            ('GET', r'/orgs/(?P<org>[^/]+)/teams/(?P<slug>[^/]+)/memberships/(?P<user>[^/]+)$', self._team_membership),
+            ('GET', r'/orgs/(?P<org>[^/]+)/teams/(?P<slug>[^/]+)/members$', self._team_members),
+            ('GET', r'/orgs/(?P<org>[^/]+)/memberships/(?P<user>[^/]+)$', self._org_membership),
+            ('PUT', r'/orgs/(?P<org>[^/]+)/memberships/(?P<user>[^/]+)$', self._set_org_membership),
+            ('GET', r'/orgs/(?P<org>[^/]+)/members$', self._members),
+            ('POST', r'/repos/(?P<repo>[^/]+/[^/]+)/issues/(?P<number>\d+)/comments$', self._comment),
+            ('PATCH', r'/repos/(?P<repo>[^/]+/[^/]+)/issues/(?P<number>\d+)$', self._issue),
+            ('POST', r'/graphql$', self._graphql),
+        ]
+
+    def request(self, method, url, **kwargs):
+        path = re.sub(r'^https://api\.github\.com', '', url)
+        time.sleep(self.latency.github)
+        limited, headers = self._ration()
+        if limited is not None:
+            self.calls.record('github', f"{method} rate-limited")
+            return limited
+        for route_method, pattern, route in self.routes:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                self.calls.record('github', f"{method} {pattern}")
+                response = route(kwargs, **match.groupdict())
+                response.headers.update(headers)
+                return response
+        self.calls.record('github', f"{method} {path}")
+        return FakeResponse(404, {'message': 'Not Found'})
+
+    def _ration(self):
+        # Returns (rate-limited response or None, quota headers for a normal response)
+        profile = self.rate_limits
+        if profile is None:
+            return None, {}
+        with self._lock:
+            self.requests += 1
+            now = time.time()
+            if now - self._window_started >= profile.window_seconds:
+                self._window_started, self.requests = now, 1
+            reset = str(int(self._window_started + profile.window_seconds))
+            headers = {}
+            if profile.quota:
+                remaining = max(profile.quota - self.requests, 0)
+                headers = {'X-RateLimit-Limit': str(profile.quota), 'X-RateLimit-Remaining': str(remaining),
+                           'X-RateLimit-Reset': reset}
+                if self.requests > profile.quota:
+                    self.rate_limited += 1
+                    return FakeResponse(403, {'message': 'API rate limit exceeded'}, headers=headers), headers
+            if profile.secondary_every and self.requests % profile.secondary_every == 0:
+                self.rate_limited += 1
+                return FakeResponse(403, {'message': 'You have exceeded a secondary rate limit'},
+                                    headers=dict(headers, **{'Retry-After': str(profile.retry_after)})), headers
+        return None, headers
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def _access_token(self, _kwargs, id):
+        expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return FakeResponse(201, {'token': f"ghs_installation_{id}", 'expires_at': expires_at})
+
+    def _team_membership(self, _kwargs, org, slug, user):
+        if user in self.team_members:
+            return FakeResponse(200, {'state': 'active', 'role': 'member'})
+        return FakeResponse(404, {'message': 'Not Found'})
+
+    def _team_members(self, _kwargs, org, slug):
+        return FakeResponse(200, [{'login': login} for login in sorted(self.team_members)])
+
+    def _org_membership(self, _kwargs, org, user):
+        role = self.roles.get(user)
+        return FakeResponse(200, {'role': role}) if role else FakeResponse(404, {'message': 'Not Found'})
+
+    def _set_org_membership(self, kwargs, org, user):
+        self.roles[user] = kwargs['json']['role']
+        return FakeResponse(200, {'role': self.roles[user]})
+
+    def _members(self, kwargs, org):
+        per_page = int((kwargs.get('params') or {}).get('per_page', 30))
+        return FakeResponse(200, [{'login': login} for login in self.owners[:per_page]])
+
+    def _graphql(self, kwargs):
+        # Answers the elevation context query from the same state as the REST routes
+        variables = kwargs['json']['variables']
+        roles = {login: 'admin' for login in self.owners}
+        roles.update(self.roles)
+        organization = {'membersWithRole': {
+            'pageInfo': {'hasNextPage': False},
+            'edges': [{'role': role.upper(), 'node': {'login': login}} for login, role in roles.items()]
+        }}
+        if variables['withTeam']:
+            organization['team'] = {
+                alias: {'nodes': [{'login': variables[alias]}] if variables[alias] in self.team_members else []}
+                for alias in ('approver', 'requester')
+            }
+        data = {'organization': organization}
+        if variables['withIssue']:
+            data['repository'] = {'issue': {'state': 'OPEN'}}
+        return FakeResponse(200, {'data': data})
+
+    def _comment(self, _kwargs, repo, number):
+        return FakeResponse(201, {'id': 1})
+
+    def _issue(self, _kwargs, repo, number):
+        return FakeResponse(200, {'state': 'closed'})
+
+class FakeSSM:
+    def __init__(self, latency, calls, values):
+        self.latency = latency
+        self.calls = calls
+        self.values = dict(values)
+
+    def get_parameters(self, Names, WithDecryption=False):
+        time.sleep(self.latency.aws)
+        self.calls.record('ssm', 'GetParameters')
+        return {
+            'Parameters': [{'Name': name, 'Value': self.values[name], 'Version': 1} for name in Names if name in self.values],
+            'InvalidParameters': [name for name in Names if name not in self.values]
+        }
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+class _Exceptions:
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+
+def _condition_values(condition):
+    # boto3 condition objects expose (Key(name), value) through get_expression()
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        return {name: value for part in expression['values'] for name, value in _condition_values(part).items()}
+    key, value = expression['values']
+    return {key.name: value}
+
+def _condition_holds(item, condition, values, names):
+    # Only the two shapes the stores write: attribute_not_exists(...) and "attribute = :placeholder"
+    if not condition:
+        return True
+    if condition.startswith('attribute_not_exists'):
+        return item is None
+    attribute, placeholder = [part.strip() for part in condition.split('=')]
+    return item is not None and item.get(names.get(attribute, attribute)) == values[placeholder]
+
+def _apply_update(item, expression, values, names):
+    action, _, assignments = expression.partition(' ')
+    for assignment in assignments.split(','):
+        if action.lower() == 'set':
+            attribute, placeholder = [part.strip() for part in assignment.split('=')]
+            item[names.get(attribute, attribute)] = values[placeholder]
+        else:  # ADD
+            attribute, placeholder = assignment.split()
+            name = names.get(attribute, attribute)
+            item[name] = item.get(name, 0) + values[placeholder]
+
+class FakeTable:
+    """Implements the slice of the DynamoDB Table API used by the stores."""
+
+    def __init__(self, name, key_names, latency, calls, dynamodb):
+        self.name = name
+        self.key_names = key_names
+        self.latency = latency
+        self.calls = calls
+        self.items = {}
+        self.meta = dynamodb.meta
+        self._lock = dynamodb.lock
+
+    def _key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def _call(self, operation):
+        time.sleep(self.latency.aws)
+        self.calls.record('dynamodb', f"{self.name}.{operation}")
+
+    def put_item(self, Item, ConditionExpression=None):
+        self._call('PutItem')
+        with self._lock:
+            if not _condition_holds(self.items.get(self._key(Item)), ConditionExpression, {}, {}):
+                raise ConditionalCheckFailedException(ConditionExpression)
+            self.items[self._key(Item)] = dict(Item)
+        return {}
+
+    def get_item(self, Key):
+        self._call('GetItem')
+        with self._lock:
+            item = self.items.get(self._key(Key))
+        return {'Item': dict(item)} if item else {}
+
+    def delete_item(self, Key):
+        self._call('DeleteItem')
+        with self._lock:
+            self.items.pop(self._key(Key), None)
+        return {}
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, Limit=None, **_kwargs):
+        self._call('Query')
+        wanted = _condition_values(KeyConditionExpression)
+        with self._lock:
+            items = [item for item in self.items.values() if all(item.get(name) == value for name, value in wanted.items())]
+        items.sort(key=lambda item: item[self.key_names[-1]], reverse=not ScanIndexForward)
+        return {'Items': items[:Limit] if Limit else items}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    ExpressionAttributeNames=None):
+        self._call('UpdateItem')
+        with self._lock:
+            if not _condition_holds(self.items.get(self._key(Key)), ConditionExpression, ExpressionAttributeValues,
+                                    ExpressionAttributeNames or {}):
+                raise ConditionalCheckFailedException(ConditionExpression)
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            _apply_update(item, UpdateExpression, ExpressionAttributeValues, ExpressionAttributeNames or {})
+        return {}
+
+class FakeDynamoDBClient:
+    exceptions = _Exceptions
+
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+
+    def update_item(self, TableName, **kwargs):
+        return self.dynamodb.tables[TableName].update_item(**kwargs)
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+class FakeDynamoDB:
+    KEYS = {
+        'GithubElevationRequests': ('user', 'requested_at'),
+        'GithubWebhookDeliveries': ('delivery_id',),
+        'GithubElevationStatistics': ('aggregate',),
+    }
+
+    def __init__(self, latency, calls):
+        self.lock = threading.RLock()
+        self.meta = _Meta(FakeDynamoDBClient(self))
+        self.tables = {name: FakeTable(name, keys, latency, calls, self) for name, keys in self.KEYS.items()}
+
+    def Table(self, name):
+        return self.tables[name]
+
+class FakeStepFunctions:
+    def __init__(self, latency, calls):
+        self.latency = latency
+        self.calls = calls
+        self.executions = []
+
+    def start_execution(self, stateMachineArn, input):
+        time.sleep(self.latency.aws)
+        self.calls.record('stepfunctions', 'StartExecution')
+        self.executions.append(input)
+        return {'executionArn': f"{stateMachineArn}:execution-{len(self.executions)}"}
+
+class FakeSQS:
+    def __init__(self, latency, calls):
+        self.latency = latency
+        self.calls = calls
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody):
+        time.sleep(self.latency.aws)
+        self.calls.record('sqs', 'SendMessage')
+        self.messages.append(MessageBody)
+        return {'MessageId': str(len(self.messages))}
+
+class StandIns:
+    """One in-process stand-in per external service, sharing a latency profile and call log."""
+
+    def __init__(self, latency, parameters, team_members=(), owners=(), roles=None, rate_limits=None):
+        self.latency = latency
+        self.calls = CallLog()
+        self.github = FakeGitHub(latency, self.calls, team_members, owners, roles, rate_limits)
+        self.ssm = FakeSSM(latency, self.calls, parameters)
+        self.dynamodb = FakeDynamoDB(latency, self.calls)
+        self.step_functions = FakeStepFunctions(latency, self.calls)
+        self.sqs = FakeSQS(latency, self.calls)
+
+    def client(self, service, **_kwargs):
+        return {'ssm': self.ssm, 'stepfunctions': self.step_functions, 'sqs': self.sqs}[service]
+
+    def resource(self, service, **_kwargs):
+        return {'dynamodb': self.dynamodb}[service]
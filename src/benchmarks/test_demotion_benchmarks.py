@@ -0,0 +1,53 @@
+import json
+import pytest
+from common.store import STATUS_ELEVATED
+from conftest import ROUNDS, assert_within_budget, latency_budget_ms, load_payload, demotion_handler
+
+# Sequential (github, aws) round trips on the critical path. Cold starts also load
+# the SSM batch and exchange a JWT for an installation token. GraphQL lookups read
+# the role and the owners in one request instead of two. The statistics increments
+# after the demotion is recorded go out together, as one more round trip.
+EXPECTED = {
+    'rest': {
+        'cold': {'round_trips': (5, 3), 'calls': {'github': 6, 'ssm': 1, 'dynamodb': 3}},
+        'warm': {'round_trips': (4, 2), 'calls': {'github': 5, 'ssm': 0, 'dynamodb': 3}},
+    },
+    'graphql': {
+        'cold': {'round_trips': (4, 3), 'calls': {'github': 5, 'ssm': 1, 'dynamodb': 3}},
+        'warm': {'round_trips': (3, 2), 'calls': {'github': 4, 'ssm': 0, 'dynamodb': 3}},
+    },
+}
+
+@pytest.mark.parametrize('start', ['cold', 'warm'])
+@pytest.mark.parametrize('lookups', list(EXPECTED))
+def test_demotion_invocation(benchmark, stand_ins, monkeypatch, lookups, start):
+    event = json.loads(load_payload('demotion_event'))
+    benchmark.group = f"demotion {lookups}"
+    monkeypatch.setenv('GITHUB_GRAPHQL_LOOKUPS', str(lookups == 'graphql').lower())
+    demotion_handler.runtime_context.invalidate()
+
+    def setup():
+        if start == 'cold':
+            demotion_handler.runtime_context.invalidate()
+        # Put the user back to an elevated owner so every round performs the full demotion
+        stand_ins.github.roles[event['user']] = 'admin'
+        stand_ins.dynamodb.Table('GithubElevationRequests').put_item(Item={
+            'user': event['user'],
+            'requested_at': event['requested_at'],
+            'status': STATUS_ELEVATED
+        })
+        stand_ins.calls.clear()
+        return (dict(event), None), {}
+
+    if start == 'warm':
+        # One untimed invocation so even a single --benchmark-disable round runs warm
+        args, _ = setup()
+        demotion_handler.handler(*args)
+    response = benchmark.pedantic(demotion_handler.handler, setup=setup, rounds=ROUNDS, warmup_rounds=1)
+
+    assert response['statusCode'] == 200
+    assert stand_ins.github.roles[event['user']] == 'member'
+    expected = EXPECTED[lookups][start]
+    for service, count in expected['calls'].items():
+        assert stand_ins.calls.count(service) == count, f"{service} calls: {stand_ins.calls.calls}"
+    assert_within_budget(benchmark, latency_budget_ms(stand_ins.latency, *expected['round_trips'], cold=start == 'cold'))
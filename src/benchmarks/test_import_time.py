@@ -0,0 +1,16 @@
+import pytest
+from import_time import FUNCTIONS, import_handler, parse_importtime
+
+@pytest.mark.parametrize('function_name', FUNCTIONS)
+def test_handler_import_defers_heavy_modules(function_name):
+    modules, loaded = import_handler(function_name)
+    assert 'handler' in modules
+    assert loaded == []
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   utilities",
+        "import time:       300 |       1420 | handler",
+    ])
+    assert parse_importtime(stderr) == {'utilities': (120, 120), 'handler': (300, 1420)}
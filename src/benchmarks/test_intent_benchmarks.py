@@ -0,0 +1,51 @@
+import re
+import pytest
+from utilities import request_is_to_elevate_access, comment_contains_approval
+
+# The classifier against the per-call regex it replaced, on ordinary and 1 MB bodies
+
+def legacy_request_is_to_elevate_access(issue):
+    pattern = re.compile('|'.join(['request', 'elevate', 'elevation']), re.IGNORECASE)
+    return bool(pattern.search(issue.get('title', '')) or pattern.search(issue.get('body', '')))
+
+def legacy_comment_contains_approval(comment):
+    pattern = re.compile(r'approve|👍', re.IGNORECASE)
+    return bool(pattern.search(comment['body']))
+
+LOG_LINE = "2024-06-01T12:00:00Z build step finished with exit code 0\n"
+LARGE_BODY = LOG_LINE * (1024 * 1024 // len(LOG_LINE))
+ISSUES = {
+    'short issue': ({'title': 'Bug in pipeline', 'body': 'The build fails on main.'}, False),
+    'elevation issue': ({'title': 'Elevate me to owner', 'body': 'Need to rotate the org webhook secret.'}, True),
+    'large issue (1 MB)': ({'title': 'Flaky build', 'body': LARGE_BODY}, False),
+}
+COMMENTS = {
+    'approval comment': ({'body': 'Approve 👍'}, True),
+    'large comment (1 MB)': ({'body': LARGE_BODY}, False),
+}
+CLASSIFIERS = {
+    'classifier': (request_is_to_elevate_access, comment_contains_approval),
+    'legacy': (legacy_request_is_to_elevate_access, legacy_comment_contains_approval),
+}
+
+@pytest.mark.parametrize('implementation', list(CLASSIFIERS))
+@pytest.mark.parametrize('case', list(ISSUES))
+def test_elevation_intent(benchmark, case, implementation):
+    issue, expected = ISSUES[case]
+    benchmark.group = f"intent {case}"
+
+    result = benchmark(CLASSIFIERS[implementation][0], issue)
+
+    if implementation == 'classifier':
+        assert result is expected
+
+@pytest.mark.parametrize('implementation', list(CLASSIFIERS))
+@pytest.mark.parametrize('case', list(COMMENTS))
+def test_approval_intent(benchmark, case, implementation):
+    comment, expected = COMMENTS[case]
+    benchmark.group = f"intent {case}"
+
+    result = benchmark(CLASSIFIERS[implementation][1], comment)
+
+    if implementation == 'classifier':
+        assert result is expected
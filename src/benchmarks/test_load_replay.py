@@ -0,0 +1,53 @@
+import json
+import load_replay
+from stand_ins import CallLog, Latency, FakeGitHub, RateLimitProfile
+
+def test_synthetic_burst_opens_before_each_approval():
+    deliveries = load_replay.synthetic_deliveries(4, approval_lag=2)
+    events = [(delivery.github_event, json.loads(delivery.body)['issue']['number']) for delivery in deliveries]
+    assert events == [('issues', 1000), ('issues', 1001), ('issues', 1002), ('issue_comment', 1000),
+                      ('issues', 1003), ('issue_comment', 1001), ('issue_comment', 1002), ('issue_comment', 1003)]
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert load_replay.percentile(values, 0.5) == 50
+    assert load_replay.percentile(values, 0.99) == 99
+    assert load_replay.percentile(values, 1.0) == 100
+    assert load_replay.percentile([], 0.5) is None
+
+def test_replay_runs_one_container_per_thread():
+    report = load_replay.run(load_replay.synthetic_deliveries(6), concurrency=3, latency=Latency(0, 0))
+
+    assert report['status_codes'] == {'200': 12}
+    assert report['redeliveries_needed'] == 0
+    # The pool starts at most three threads, and each one loads the parameters once when it starts cold
+    assert 1 <= report['cold_starts'] <= 3
+    assert report['calls']['ssm'] == report['cold_starts']
+    # An approval can overtake its issue under concurrency, so count the elevations that happened
+    elevated = report['calls'].get('stepfunctions', 0)
+    assert 0 < elevated <= 6
+    assert report['statistics'] == {'requested': 6, 'elevated': elevated, 'active': elevated}
+
+def test_concurrent_replay_keeps_the_statistics_in_step():
+    # With AWS latency the statistics increments overlap, as shared counter items do in production
+    report = load_replay.run(load_replay.synthetic_deliveries(8, approval_lag=1), concurrency=8, latency=Latency(0, 5))
+
+    assert report['errors'] == {}
+    assert report['status_codes'] == {'200': 16}
+    elevated = report['calls'].get('stepfunctions', 0)
+    assert report['statistics'] == {'requested': 8, 'elevated': elevated, 'active': elevated}
+
+def test_replay_counts_deliveries_over_the_timeout():
+    report = load_replay.run(load_replay.synthetic_deliveries(2), concurrency=1, latency=Latency(0, 0), timeout_seconds=0)
+    assert report['timeouts'] == 4
+    assert report['redeliveries_needed'] == 4
+
+def test_stand_in_rations_github_requests():
+    github = FakeGitHub(Latency(0, 0), CallLog(), rate_limits=RateLimitProfile(quota=3, secondary_every=2, retry_after=7))
+    responses = [github.get('https://api.github.com/orgs/org/members') for _ in range(4)]
+
+    assert [response.status_code for response in responses] == [200, 403, 200, 403]
+    assert responses[0].headers['X-RateLimit-Remaining'] == '2'
+    assert responses[1].headers['Retry-After'] == '7'
+    assert responses[3].headers['X-RateLimit-Remaining'] == '0'
+    assert github.rate_limited == 2
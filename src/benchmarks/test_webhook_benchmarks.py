@@ -0,0 +1,87 @@
+import json
+import pytest
+from common.store import STATUS_PENDING, to_iso, utc_now
+from conftest import ROUNDS, WEBHOOK_SECRET, assert_within_budget, latency_budget_ms, load_payload, signed_event, webhook_handler
+
+# Sequential (github, aws[, overlapping pairs]) round trips on the critical path for each scenario.
+# Cold starts also load the SSM batch and exchange a JWT for an installation token.
+# Warm starts reuse both, and reuse the team membership seen by the previous round.
+# The statistics increments after a record write go out together, as one round trip.
+SCENARIOS = {
+    'issues_opened': {
+        'github_event': 'issues',
+        'cold': {'round_trips': (3, 4), 'calls': {'github': 3, 'ssm': 1, 'dynamodb': 5}},
+        'warm': {'round_trips': (1, 3), 'calls': {'github': 1, 'ssm': 0, 'dynamodb': 5}},
+    },
+    'issue_comment_approval': {
+        'github_event': 'issue_comment',
+        # The comment goes out alongside the demotion schedule
+        'cold': {'round_trips': (4, 6, 1), 'calls': {'github': 4, 'ssm': 1, 'dynamodb': 7, 'stepfunctions': 1}},
+        'warm': {'round_trips': (2, 5, 1), 'calls': {'github': 2, 'ssm': 0, 'dynamodb': 7, 'stepfunctions': 1}},
+    },
+    'issue_comment_other': {
+        'github_event': 'issue_comment',
+        'cold': {'round_trips': (3, 2), 'calls': {'github': 3, 'ssm': 1, 'dynamodb': 1}},
+        'warm': {'round_trips': (1, 1), 'calls': {'github': 1, 'ssm': 0, 'dynamodb': 1}},
+    },
+    'issue_comment_approval_async': {
+        # Async ingestion only verifies and queues; the worker does the approval later
+        'github_event': 'issue_comment',
+        'payload': 'issue_comment_approval',
+        'env': {'INGESTION_MODE': 'async', 'INGESTION_QUEUE_URL': 'https://sqs.eu-west-2.amazonaws.com/123456789012/bench'},
+        'status_code': 202,
+        'cold': {'round_trips': (0, 2), 'calls': {'github': 0, 'ssm': 1, 'dynamodb': 0, 'sqs': 1}},
+        'warm': {'round_trips': (0, 1), 'calls': {'github': 0, 'ssm': 0, 'dynamodb': 0, 'sqs': 1}},
+    },
+    'forged_signature': {
+        'github_event': 'issues',
+        'payload': 'issues_opened',
+        'secret': 'not-the-webhook-secret',
+        'status_code': 403,
+        'cold': {'round_trips': (0, 1), 'calls': {'github': 0, 'ssm': 1, 'dynamodb': 0}},
+        'warm': {'round_trips': (0, 0), 'calls': {'github': 0, 'ssm': 0, 'dynamodb': 0}},
+    },
+}
+
+def seed_pending_request(stand_ins, user):
+    # Approval only promotes a pending request, so each round gets a fresh one
+    now = utc_now()
+    stand_ins.dynamodb.Table('GithubElevationRequests').put_item(Item={
+        'user': user,
+        'requested_at': to_iso(now),
+        'status': STATUS_PENDING,
+        'issue_number': 42,
+        'repo': 'nhs-england-tools/github-permissions-elevation',
+        'status_time': int(now.timestamp())
+    })
+
+@pytest.mark.parametrize('start', ['cold', 'warm'])
+@pytest.mark.parametrize('scenario', list(SCENARIOS))
+def test_webhook_invocation(benchmark, stand_ins, monkeypatch, scenario, start):
+    config = SCENARIOS[scenario]
+    for name, value in config.get('env', {}).items():
+        monkeypatch.setenv(name, value)
+    body = load_payload(config.get('payload', scenario))
+    payload = json.loads(body)
+    benchmark.group = f"webhook {scenario}"
+
+    def setup():
+        if start == 'cold':
+            webhook_handler.runtime_context.invalidate()
+        if scenario == 'issue_comment_approval':
+            seed_pending_request(stand_ins, payload['issue']['user']['login'])
+        stand_ins.calls.clear()
+        event = signed_event(config['github_event'], body, config.get('secret', WEBHOOK_SECRET))
+        return (event, None), {}
+
+    if start == 'warm':
+        # One untimed invocation so even a single --benchmark-disable round runs warm
+        args, _ = setup()
+        webhook_handler.handler(*args)
+    response = benchmark.pedantic(webhook_handler.handler, setup=setup, rounds=ROUNDS, warmup_rounds=1)
+
+    assert response['statusCode'] == config.get('status_code', 200)
+    expected = config[start]
+    for service, count in expected['calls'].items():
+        assert stand_ins.calls.count(service) == count, f"{service} calls: {stand_ins.calls.calls}"
+    assert_within_budget(benchmark, latency_budget_ms(stand_ins.latency, *expected['round_trips'], cold=start == 'cold'))
@@ -0,0 +1,39 @@
+import json
+import uuid
+import pytest
+from conftest import ROUNDS, assert_within_budget, latency_budget_ms, load_payload, webhook_handler
+from worker import BatchWorker
+
+# A batch shares the warm token and lists the escalation team once, so GitHub
+# round trips grow by one comment per delivery rather than by a lookup as well.
+BATCH_SIZES = [1, 10, 25]
+
+def queued_comments(count):
+    payload = json.loads(load_payload('issue_comment_other'))
+    messages = []
+    for number in range(count):
+        payload['comment']['user']['login'] = 'approver' if number % 2 else f"commenter-{number}"
+        body = {'delivery_id': str(uuid.uuid4()), 'github_event': 'issue_comment', 'payload': json.dumps(payload)}
+        messages.append((f"message-{number}", body))
+    return messages
+
+@pytest.mark.parametrize('batch_size', BATCH_SIZES)
+def test_worker_batch(benchmark, stand_ins, batch_size):
+    benchmark.group = "worker batch"
+    manager = webhook_handler.runtime_context.get()
+
+    def setup():
+        # Fresh delivery ids and an empty membership cache so every round does the full work
+        manager.membership_cache.invalidate()
+        stand_ins.calls.clear()
+        return (queued_comments(batch_size),), {}
+
+    args, _ = setup()
+    BatchWorker(manager).run(*args)
+    failures = benchmark.pedantic(lambda messages: BatchWorker(manager).run(messages), setup=setup,
+                                  rounds=ROUNDS, warmup_rounds=1)
+
+    assert failures == []
+    assert stand_ins.calls.count('github') == batch_size + 1
+    assert stand_ins.calls.count('dynamodb') == batch_size
+    assert_within_budget(benchmark, latency_budget_ms(stand_ins.latency, batch_size + 1, batch_size))
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from common.logger import logger
+
+DEFAULT_MAX_WORKERS = 4
+
+class SideEffectGraph:
+    """Runs independent side effects concurrently while keeping the declared orderings."""
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.steps = {}
+
+    def add(self, name, func, *args, after=(), **kwargs):
+        # Dependencies must already be registered, which keeps the graph acyclic
+        unknown = [dependency for dependency in after if dependency not in self.steps]
+        if unknown:
+            raise ValueError(f"Step {name} depends on unknown steps: {unknown}")
+        self.steps[name] = (func, args, kwargs, tuple(after))
+        return self
+
+    def run(self):
+        results, errors, skipped = {}, {}, set()
+        pending = dict(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, (func, args, kwargs, after) in list(pending.items()):
+                    if any(dependency in errors or dependency in skipped for dependency in after):
+                        logger.warning("Skipping step because a step it depends on did not complete", step=name)
+                        skipped.add(name)
+                        del pending[name]
+                    elif all(dependency in results for dependency in after):
+                        running[executor.submit(func, *args, **kwargs)] = name
+                        del pending[name]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as err:
+                        logger.error("Step failed", step=name, error=str(err))
+                        errors[name] = err
+        if errors:
+            raise next(iter(errors.values()))
+        return results
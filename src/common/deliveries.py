@@ -0,0 +1,41 @@
+import time
+from common.cache import TTLCache
+from common.metrics import metrics
+
+DELIVERY_TABLE_NAME = 'GithubWebhookDeliveries'
+DELIVERY_TTL_SECONDS = 24 * 60 * 60
+RECENT_DELIVERY_CACHE_SIZE = 1024
+
+class DeliveryDeduplicator:
+    """Claims each X-GitHub-Delivery id once, in memory first and then with a conditional put."""
+
+    def __init__(self, dynamodb, table_name=DELIVERY_TABLE_NAME, ttl_seconds=DELIVERY_TTL_SECONDS, cache=None):
+        self.table = dynamodb.Table(table_name)
+        self.ttl_seconds = ttl_seconds
+        self.recent = cache or TTLCache(maxsize=RECENT_DELIVERY_CACHE_SIZE, ttl_seconds=ttl_seconds)
+
+    def claim(self, delivery_id):
+        if not delivery_id:
+            return True
+        if self.recent.get(delivery_id):
+            return False
+        received_at = int(time.time())
+        try:
+            with metrics.timed('dynamodb', 'PutItem'):
+                self.table.put_item(
+                    Item={'delivery_id': delivery_id, 'received_at': received_at, 'ttl': received_at + self.ttl_seconds},
+                    ConditionExpression="attribute_not_exists(delivery_id)"
+                )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            self.recent.set(delivery_id, True)
+            return False
+        self.recent.set(delivery_id, True)
+        return True
+
+    def release(self, delivery_id):
+        # Lets a later redelivery retry a delivery whose processing failed
+        if not delivery_id:
+            return
+        self.recent.invalidate(delivery_id)
+        with metrics.timed('dynamodb', 'DeleteItem'):
+            self.table.delete_item(Key={'delivery_id': delivery_id})
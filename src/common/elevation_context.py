@@ -0,0 +1,98 @@
+import os
+from common.logger import logger
+
+MEMBERS_PAGE_SIZE = 100
+TEAM_MATCHES = 10  # members(query:) matches logins and names by prefix, so a few candidates are read
+
+# Team membership for both users, the requester's org role and the issue state in one request.
+# membersWithRole cannot be filtered by login or role, so only its first page is read; anything it
+# cannot answer is left unknown for the caller to look up over REST.
+ELEVATION_CONTEXT_QUERY = """
+query ElevationContext($org: String!, $team: String!, $approver: String!, $requester: String!,
+                       $repoOwner: String!, $repoName: String!, $issueNumber: Int!,
+                       $withTeam: Boolean!, $withIssue: Boolean!) {
+  organization(login: $org) {
+    team(slug: $team) @include(if: $withTeam) {
+      approver: members(query: $approver, first: %(team_matches)d) { nodes { login } }
+      requester: members(query: $requester, first: %(team_matches)d) { nodes { login } }
+    }
+    membersWithRole(first: %(page_size)d) {
+      pageInfo { hasNextPage }
+      edges { role node { login } }
+    }
+  }
+  repository(owner: $repoOwner, name: $repoName) @include(if: $withIssue) {
+    issue(number: $issueNumber) { state }
+  }
+}
+""" % {'team_matches': TEAM_MATCHES, 'page_size': MEMBERS_PAGE_SIZE}
+
+def graphql_lookups_enabled():
+    return os.getenv('GITHUB_GRAPHQL_LOOKUPS', 'false').lower() == 'true'
+
+def _team_has_member(team, alias, login):
+    if not team or not login:
+        return None
+    nodes = (team.get(alias) or {}).get('nodes') or []
+    if any(node and node.get('login', '').lower() == login.lower() for node in nodes):
+        return True
+    # A full page of prefix matches may have left the exact login off it
+    return None if len(nodes) >= TEAM_MATCHES else False
+
+class ElevationContext:
+    """The reads behind the eligibility and last-owner decisions. None means not known from the batch."""
+
+    def __init__(self, approver_is_member=None, requester_is_member=None, requester_role=None,
+                 requester_role_known=False, owners=None, issue_state=None):
+        self.approver_is_member = approver_is_member
+        self.requester_is_member = requester_is_member
+        self.requester_role = requester_role
+        self.requester_role_known = requester_role_known
+        self.owners = owners
+        self.issue_state = issue_state
+
+    @classmethod
+    def from_response(cls, data, approver=None, requester=None):
+        organization = data.get('organization') or {}
+        team = organization.get('team')
+        members = organization.get('membersWithRole') or {}
+        complete = not (members.get('pageInfo') or {}).get('hasNextPage', True)
+        roles, owners = {}, []
+        for edge in members.get('edges') or []:
+            if not edge or not edge.get('node'):
+                continue
+            login, role = edge['node']['login'], (edge.get('role') or '').lower()
+            roles[login.lower()] = role
+            if role == 'admin':
+                owners.append(login)
+        requester_key = requester.lower() if requester else None
+        issue = ((data.get('repository') or {}).get('issue')) or {}
+        return cls(
+            approver_is_member=_team_has_member(team, 'approver', approver),
+            requester_is_member=_team_has_member(team, 'requester', requester),
+            requester_role=roles.get(requester_key),
+            requester_role_known=bool(requester_key) and (requester_key in roles or complete),
+            # Two owners already settle the last-owner check even from a partial page
+            owners=owners if complete or len(owners) >= 2 else None,
+            issue_state=issue.get('state', '').lower() or None
+        )
+
+def fetch_elevation_context(github, organization, team_slug=None, approver=None, requester=None,
+                            repository=None, issue_number=None):
+    repo_owner, _, repo_name = (repository or '').partition('/')
+    variables = {
+        'org': organization,
+        'team': team_slug or '',
+        'approver': approver or '',
+        'requester': requester or '',
+        'repoOwner': repo_owner,
+        'repoName': repo_name,
+        'issueNumber': int(issue_number or 0),
+        'withTeam': bool(team_slug),
+        'withIssue': bool(repo_name and issue_number)
+    }
+    data = github.graphql(ELEVATION_CONTEXT_QUERY, variables)
+    context = ElevationContext.from_response(data, approver=approver, requester=requester)
+    logger.debug("Fetched elevation context", organization=organization, approver=approver, requester=requester,
+                 requester_role=context.requester_role, issue_state=context.issue_state)
+    return context
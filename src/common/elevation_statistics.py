@@ -0,0 +1,223 @@
+from datetime import datetime, timezone
+from common.concurrency import SideEffectGraph
+from common.logger import logger
+from common.metrics import metrics
+from common.store import STATUS_CLOSED, STATUS_DEMOTED, STATUS_ELEVATED, to_epoch
+
+STATISTICS_TABLE_NAME = 'GithubElevationStatistics'
+TOTAL = 'total'
+# Upper bounds, in seconds, of the request-to-approval histogram; the last bucket is unbounded
+APPROVAL_BUCKETS = [60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400, 259200, 604800, None]
+
+# One item per aggregate, keyed by 'aggregate':
+#   total            requested, elevated, demoted, closed, active, approvals, approval_seconds, approval_le_*
+#   day#YYYY-MM-DD   requested, elevated, demoted, closed on that UTC day
+#   user#<login>     requested, elevated
+#   approver#<login> approved
+
+def day_key(moment):
+    return f"day#{moment.astimezone(timezone.utc).date().isoformat()}"
+
+def user_key(user):
+    return f"user#{user}"
+
+def approver_key(approver):
+    return f"approver#{approver}"
+
+APPROVAL_BUCKET_NAMES = [f"approval_le_{bound or 'inf'}" for bound in APPROVAL_BUCKETS]
+
+def bucket_name(seconds):
+    for bound, name in zip(APPROVAL_BUCKETS, APPROVAL_BUCKET_NAMES):
+        if bound is None or seconds <= bound:
+            return name
+
+def median_from_histogram(counts):
+    """Median approval time in seconds, interpolated within the histogram bucket that holds it."""
+    total = sum(counts.get(name, 0) for name in APPROVAL_BUCKET_NAMES)
+    if not total:
+        return None
+    seen, lower = 0, 0
+    for bound, name in zip(APPROVAL_BUCKETS, APPROVAL_BUCKET_NAMES):
+        count = counts.get(name, 0)
+        if count and seen + count >= total / 2:
+            # The unbounded bucket can only say the median is at least its lower bound
+            return lower if bound is None else lower + (bound - lower) * (total / 2 - seen) / count
+        seen, lower = seen + count, bound
+    return lower
+
+def _as_number(value):
+    return int(value) if value == int(value) else float(value)
+
+class StatisticsCounts:
+    """Counter deltas per aggregate, applied as ADD updates or accumulated in memory for a rebuild."""
+
+    def __init__(self):
+        self.aggregates = {}
+
+    def add(self, aggregate, **deltas):
+        counters = self.aggregates.setdefault(aggregate, {})
+        for name, delta in deltas.items():
+            counters[name] = counters.get(name, 0) + delta
+        return self
+
+    def request(self, user, requested_at):
+        return (self.add(TOTAL, requested=1)
+                .add(day_key(requested_at), requested=1)
+                .add(user_key(user), requested=1))
+
+    def elevation(self, user, approver, requested_at, elevated_at):
+        waited = max(0, int(elevated_at.timestamp()) - to_epoch(requested_at))
+        self.add(TOTAL, elevated=1, active=1, approvals=1, approval_seconds=waited, **{bucket_name(waited): 1})
+        self.add(day_key(elevated_at), elevated=1).add(user_key(user), elevated=1)
+        return self.add(approver_key(approver), approved=1) if approver else self
+
+    def negated(self):
+        for counters in self.aggregates.values():
+            for name in counters:
+                counters[name] = -counters[name]
+        return self
+
+    def demotion(self, demoted_at):
+        return self.add(TOTAL, demoted=1, active=-1).add(day_key(demoted_at), demoted=1)
+
+    def closure(self, closed_at):
+        return self.add(TOTAL, closed=1, active=-1).add(day_key(closed_at), closed=1)
+
+    def write(self, item):
+        # Replays one GithubElevationRequests item as the handlers would have counted it, so an
+        # ElevationExport can stream the table straight into a rebuild
+        requested_at = datetime.fromtimestamp(to_epoch(item['requested_at']), timezone.utc)
+        self.request(item['user'], requested_at)
+        if item.get('elevated_at'):
+            elevated_at = datetime.fromtimestamp(to_epoch(item['elevated_at']), timezone.utc)
+            self.elevation(item['user'], item.get('approver'), item['requested_at'], elevated_at)
+        if item.get('status') == STATUS_DEMOTED and item.get('demoted_at'):
+            self.demotion(datetime.fromtimestamp(to_epoch(item['demoted_at']), timezone.utc))
+        elif item.get('status') == STATUS_CLOSED and item.get('closed_at'):
+            self.closure(datetime.fromtimestamp(to_epoch(item['closed_at']), timezone.utc))
+        elif item.get('status') == STATUS_ELEVATED and not item.get('elevated_at'):
+            self.add(TOTAL, active=1)  # elevated before elevated_at was recorded
+        return self
+
+    def updates(self):
+        # UpdateItem arguments, one per aggregate; ADD creates missing items and counters
+        operations = []
+        for aggregate, counters in self.aggregates.items():
+            names = {f"#c{number}": name for number, name in enumerate(counters)}
+            values = {f":c{number}": delta for number, delta in enumerate(counters.values())}
+            operations.append({
+                'Key': {'aggregate': aggregate},
+                'UpdateExpression': "ADD " + ", ".join(f"{name} {value}" for name, value in zip(names, values)),
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': values
+            })
+        return operations
+
+class ElevationStatistics:
+    """Pre-aggregated elevation counts, incremented by the request store after each status change.
+
+    Every read is a single GetItem, however long the history in GithubElevationRequests.
+    The increments are best effort: a failed one is logged and counted, never raised, so
+    the shared aggregate items cannot fail a record write. --rebuild corrects any drift.
+    """
+
+    def __init__(self, dynamodb, table_name=STATISTICS_TABLE_NAME):
+        self.table = dynamodb.Table(table_name)
+
+    @property
+    def table_name(self):
+        return self.table.name
+
+    def record_request(self, user, requested_at):
+        self.apply(StatisticsCounts().request(user, requested_at))
+
+    def record_elevation(self, user, approver, requested_at, elevated_at):
+        self.apply(StatisticsCounts().elevation(user, approver, requested_at, elevated_at))
+
+    def record_elevation_reverted(self, user, approver, requested_at, elevated_at):
+        self.apply(StatisticsCounts().elevation(user, approver, requested_at, elevated_at).negated())
+
+    def record_demotion(self, demoted_at):
+        self.apply(StatisticsCounts().demotion(demoted_at))
+
+    def record_closure(self, closed_at):
+        self.apply(StatisticsCounts().closure(closed_at))
+
+    def apply(self, counts):
+        # Each aggregate is its own item, so the increments go out together
+        graph = SideEffectGraph()
+        for update in counts.updates():
+            graph.add(update['Key']['aggregate'], self._increment, update)
+        graph.run()
+
+    def _increment(self, update):
+        try:
+            with metrics.timed('dynamodb', 'UpdateItem'):
+                # The client, as resources are not safe to share between threads
+                self.table.meta.client.update_item(TableName=self.table_name, **update)
+        except Exception as err:
+            metrics.increment('statistics:UpdateFailed')
+            logger.warning("Failed to update elevation statistics", aggregate=update['Key']['aggregate'], error=str(err))
+
+    def get(self, aggregate):
+        with metrics.timed('dynamodb', 'GetItem'):
+            item = self.table.get_item(Key={'aggregate': aggregate}).get('Item') or {}
+        return {name: _as_number(value) for name, value in item.items() if name != 'aggregate'}
+
+    def totals(self):
+        return self.get(TOTAL)
+
+    def day(self, date):
+        return self.get(f"day#{date.isoformat()}")
+
+    def user(self, login):
+        return self.get(user_key(login))
+
+    def approver(self, login):
+        return self.get(approver_key(login))
+
+    def active_owners(self):
+        return self.totals().get('active', 0)
+
+    def summary(self):
+        totals = self.totals()
+        approvals = totals.get('approvals', 0)
+        return {
+            'requested': totals.get('requested', 0),
+            'elevated': totals.get('elevated', 0),
+            'demoted': totals.get('demoted', 0),
+            'closed': totals.get('closed', 0),
+            'active_owners': totals.get('active', 0),
+            'median_approval_seconds': median_from_histogram(totals),
+            'mean_approval_seconds': totals.get('approval_seconds', 0) / approvals if approvals else None
+        }
+
+    def rebuild(self, export):
+        """Overwrites each aggregate the records reproduce with counts recomputed by scanning GithubElevationRequests.
+
+        Records expire after a year, so aggregates only expired records fed, such as old days,
+        are left as they are, and totals rebuilt then count only the records still held.
+        Increments that land while the rebuild runs are overwritten, so run it when the
+        handlers are quiet, e.g. straight after deploying the statistics table.
+        """
+        counts = StatisticsCounts()
+        export.run(counts)
+        with self.table.batch_writer(overwrite_by_pkeys=['aggregate']) as batch:
+            for aggregate, counters in counts.aggregates.items():
+                batch.put_item(Item={'aggregate': aggregate, **counters})
+        return len(counts.aggregates)
+
+if __name__ == '__main__':
+    # python -m common.elevation_statistics            prints the current summary
+    # python -m common.elevation_statistics --rebuild  recomputes every aggregate from GithubElevationRequests
+    import json
+    import os
+    import sys
+    import boto3
+    from common.export import ElevationExport
+    from common.shared_functions import DEFAULT_REGION
+    dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION, endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL'))
+    statistics = ElevationStatistics(dynamodb)
+    if '--rebuild' in sys.argv[1:]:
+        print(f"Rebuilt {statistics.rebuild(ElevationExport(dynamodb))} aggregates")
+    print(json.dumps(statistics.summary(), indent=2))
@@ -0,0 +1,230 @@
+import csv
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from common.logger import logger
+from common.metrics import metrics
+from common.store import TABLE_NAME, to_iso
+
+DEFAULT_SEGMENTS = 4
+DEFAULT_PAGE_SIZE = 1000
+PUT_WAIT_SECONDS = 0.1
+FORMAT_JSONL = 'jsonl'
+FORMAT_CSV = 'csv'
+CSV_FIELDS = ['user', 'requested_at', 'status', 'repo', 'issue_number', 'approver', 'elevated_at', 'expires_at',
+              'demoted_at', 'closed_at', 'close_reason', 'requested_epoch', 'status_time']
+
+def to_plain(value):
+    # Deserialised DynamoDB numbers are all Decimals
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, set)):
+        return [to_plain(item) for item in value]
+    return value
+
+def to_bound(value):
+    # requested_at holds naive UTC ISO strings, which sort in time order
+    return to_iso(value) if isinstance(value, datetime) else value
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, item):
+        self.stream.write(json.dumps(to_plain(item), sort_keys=True) + '\n')
+
+class CsvWriter:
+    def __init__(self, stream, write_header=True):
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        self.write_header = write_header
+
+    def write(self, item):
+        if self.write_header:
+            self.writer.writeheader()
+            self.write_header = False
+        self.writer.writerow(to_plain(item))
+
+def create_writer(stream, output_format, write_header=True):
+    if output_format == FORMAT_JSONL:
+        return JsonLinesWriter(stream)
+    if output_format == FORMAT_CSV:
+        return CsvWriter(stream, write_header)
+    raise ValueError(f"Unknown export format {output_format}")
+
+class ExportCheckpoint:
+    """Where each scan segment has got to, saved once its page is written so an interrupted export can resume.
+
+    A crash between writing a page and saving the checkpoint repeats that one page on resume.
+    """
+
+    def __init__(self, total_segments, filters=None, path=None):
+        self.total_segments = total_segments
+        self.filters = filters or {}
+        self.path = path
+        self.segments = {segment: {'last_key': None, 'done': False, 'exported': 0} for segment in range(total_segments)}
+
+    @classmethod
+    def load(cls, path, total_segments, filters=None):
+        checkpoint = cls(total_segments, filters, path)
+        if not path or not os.path.exists(path):
+            return checkpoint
+        with open(path) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if saved['total_segments'] != total_segments or saved['filters'] != checkpoint.filters:
+            raise ValueError(f"Checkpoint {path} was written for a different export")
+        checkpoint.segments = {int(segment): state for segment, state in saved['segments'].items()}
+        return checkpoint
+
+    @property
+    def exported(self):
+        return sum(state['exported'] for state in self.segments.values())
+
+    @property
+    def started(self):
+        return any(state['exported'] or state['last_key'] or state['done'] for state in self.segments.values())
+
+    def pending_segments(self):
+        return [segment for segment, state in sorted(self.segments.items()) if not state['done']]
+
+    def advance(self, segment, last_key, count):
+        state = self.segments[segment]
+        state['last_key'] = to_plain(last_key)
+        state['done'] = last_key is None
+        state['exported'] += count
+
+    def save(self):
+        if not self.path:
+            return
+        partial = f"{self.path}.tmp"
+        with open(partial, 'w') as checkpoint_file:
+            json.dump({'total_segments': self.total_segments, 'filters': self.filters, 'segments': self.segments},
+                      checkpoint_file)
+        os.replace(partial, self.path)
+
+class ElevationExport:
+    """Streams GithubElevationRequests out with a parallel segmented scan.
+
+    Each segment is scanned on its own thread and hands pages to the caller's thread,
+    which does all the writing. At most two pages per segment wait in memory at once.
+    """
+
+    def __init__(self, dynamodb, table_name=TABLE_NAME, segments=DEFAULT_SEGMENTS, page_size=DEFAULT_PAGE_SIZE):
+        # Clients are thread safe where resources are not; the resource's client still converts attribute types
+        self.client = dynamodb.meta.client
+        self.table_name = table_name
+        self.segments = segments
+        self.page_size = page_size
+
+    def filters(self, start=None, end=None):
+        return {'start': to_bound(start), 'end': to_bound(end)}
+
+    def scan_arguments(self, start=None, end=None):
+        start, end = to_bound(start), to_bound(end)
+        if start is not None and end is not None:
+            expression, values = "requested_at BETWEEN :start AND :end", {':start': start, ':end': end}
+        elif start is not None:
+            expression, values = "requested_at >= :start", {':start': start}
+        elif end is not None:
+            expression, values = "requested_at <= :end", {':end': end}
+        else:
+            return {}
+        return {'FilterExpression': expression,
+                'ExpressionAttributeValues': values}
+
+    def run(self, writer, start=None, end=None, checkpoint=None, flush=None):
+        """Writes every matching item and returns the total exported, including earlier runs of the checkpoint."""
+        checkpoint = checkpoint or ExportCheckpoint(self.segments, self.filters(start, end))
+        segments = checkpoint.pending_segments()
+        if not segments:
+            return checkpoint.exported
+        arguments = self.scan_arguments(start, end)
+        pages, stop = queue.Queue(maxsize=2 * len(segments)), threading.Event()
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            futures = [executor.submit(self._scan_segment, segment, checkpoint.segments[segment]['last_key'],
+                                       arguments, pages, stop) for segment in segments]
+            try:
+                finished = 0
+                while finished < len(segments):
+                    segment, items, detail = pages.get()
+                    if items is None:
+                        finished += 1
+                        if detail is not None:
+                            break  # the segment failed; its error is raised below
+                        continue
+                    for item in items:
+                        writer.write(item)
+                    if flush:
+                        flush()
+                    checkpoint.advance(segment, detail, len(items))
+                    checkpoint.save()
+            finally:
+                stop.set()
+        for future in futures:
+            future.result()
+        logger.info("Export finished", exported=checkpoint.exported, segments=checkpoint.total_segments)
+        return checkpoint.exported
+
+    def _scan_segment(self, segment, last_key, arguments, pages, stop):
+        error = None
+        try:
+            while not stop.is_set():
+                kwargs = dict(arguments, TableName=self.table_name, Segment=segment, TotalSegments=self.segments,
+                              Limit=self.page_size)
+                if last_key:
+                    kwargs['ExclusiveStartKey'] = last_key
+                with metrics.timed('dynamodb', 'Scan'):
+                    response = self.client.scan(**kwargs)
+                last_key = response.get('LastEvaluatedKey')
+                self._put(pages, (segment, response.get('Items', []), last_key), stop)
+                if not last_key:
+                    return
+        except Exception as err:
+            logger.error("Export segment failed", segment=segment, error=str(err))
+            error = err
+            raise
+        finally:
+            # An end marker carrying the error stops the writer early
+            self._put(pages, (segment, None, error), stop)
+
+    def _put(self, pages, entry, stop):
+        # The writer stops taking pages once it fails, so never block for good
+        while not stop.is_set():
+            try:
+                pages.put(entry, timeout=PUT_WAIT_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+def export(dynamodb, path, output_format=FORMAT_JSONL, start=None, end=None, checkpoint_path=None,
+           segments=DEFAULT_SEGMENTS, page_size=DEFAULT_PAGE_SIZE, table_name=TABLE_NAME):
+    exporter = ElevationExport(dynamodb, table_name, segments, page_size)
+    checkpoint = ExportCheckpoint.load(checkpoint_path, segments, exporter.filters(start, end))
+    # A resumed export appends to what the earlier run wrote
+    resuming = checkpoint.started
+    with open(path, 'a' if resuming else 'w', newline='') as output:
+        writer = create_writer(output, output_format, write_header=not resuming)
+        return exporter.run(writer, start, end, checkpoint, flush=output.flush)
+
+if __name__ == '__main__':
+    # Audit export: python -m common.export elevations.jsonl [--format csv] [--start ISO] [--end ISO] [--checkpoint FILE]
+    import argparse
+    import boto3
+    from common.shared_functions import DEFAULT_REGION
+    parser = argparse.ArgumentParser(description="Export GithubElevationRequests for audit")
+    parser.add_argument('output')
+    parser.add_argument('--format', choices=[FORMAT_JSONL, FORMAT_CSV], default=FORMAT_JSONL)
+    parser.add_argument('--start', help='earliest requested_at to include, e.g. 2024-01-01T00:00:00')
+    parser.add_argument('--end', help='latest requested_at to include')
+    parser.add_argument('--checkpoint', help='resume from, and record progress in, this file')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args()
+    dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION, endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL'))
+    exported = export(dynamodb, args.output, args.format, args.start, args.end, args.checkpoint, args.segments, args.page_size)
+    print(f"Exported {exported} records to {args.output}")
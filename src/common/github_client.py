@@ -0,0 +1,183 @@
+import time
+from common.cache import TTLCache
+from common.logger import logger
+from common.metrics import metrics
+from common.rate_limits import RateLimitTracker, MAX_RETRIES, MAX_BACKOFF_SECONDS, backoff_delay, is_secondary_rate_limit, reset_at, retry_after_seconds
+
+GITHUB_API_URL = "https://api.github.com"
+GRAPHQL_PATH = "/graphql"
+DEFAULT_HEADERS = {"Accept": "application/vnd.github.v3+json"}
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+POOL_MAXSIZE = 10
+# GitHub validates every conditional request, so entries only need bounding by size
+ETAG_CACHE_SIZE = 512
+ETAG_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Path segments kept in metric operation names; everything else is an org, user, repo or id
+OPERATION_SEGMENTS = {'app', 'installations', 'access_tokens', 'orgs', 'teams', 'memberships', 'members',
+                      'repos', 'issues', 'comments', 'graphql'}
+
+_shared_session = None
+_shared_rate_limits = None
+_shared_etags = None
+
+def create_session(pool_maxsize=POOL_MAXSIZE):
+    # requests is imported with the first session, not when a handler module loads
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+def operation_name(method, url):
+    path = url.split("://", 1)[-1].split("?", 1)[0]
+    segments = [segment for segment in path.split("/")[1:] if segment in OPERATION_SEGMENTS]
+    return ".".join([method.lower()] + segments)
+
+def send(session, method, url, **kwargs):
+    # Every GitHub call goes through here so it is timed and counted by status
+    with metrics.timed("github", operation_name(method, url)) as call:
+        response = getattr(session, method.lower())(url, **kwargs)
+        call.status = response.status_code
+    return response
+
+def get_shared_session():
+    # One keep-alive pool per container, reused by every warm invocation
+    global _shared_session
+    if _shared_session is None:
+        _shared_session = create_session()
+    return _shared_session
+
+def get_shared_rate_limits():
+    # Quota records outlive any one manager, so a rebuilt one still knows an installation is exhausted
+    global _shared_rate_limits
+    if _shared_rate_limits is None:
+        _shared_rate_limits = RateLimitTracker()
+    return _shared_rate_limits
+
+def get_shared_etags():
+    global _shared_etags
+    if _shared_etags is None:
+        _shared_etags = TTLCache(maxsize=ETAG_CACHE_SIZE, ttl_seconds=ETAG_CACHE_TTL_SECONDS)
+    return _shared_etags
+
+def _cache_key(installation, url, params):
+    return (installation, url, tuple(sorted(params.items())) if isinstance(params, dict) else params)
+
+class GitHubClient:
+    def __init__(self, auth_headers_provider, session=None, timeout=DEFAULT_TIMEOUT, installation_provider=None,
+                 rate_limits=None, etags=None, max_retries=MAX_RETRIES, sleep=time.sleep):
+        self.auth_headers_provider = auth_headers_provider
+        self._session = session
+        self.timeout = timeout
+        self.installation_provider = installation_provider or (lambda: None)
+        # A client on the container's shared session also shares its quota records and ETags
+        self.rate_limits = rate_limits or (get_shared_rate_limits() if session is None else RateLimitTracker())
+        self.etags = etags or (get_shared_etags() if session is None else TTLCache(maxsize=ETAG_CACHE_SIZE, ttl_seconds=ETAG_CACHE_TTL_SECONDS))
+        self.max_retries = max_retries
+        self.sleep = sleep
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = get_shared_session()
+        return self._session
+
+    def _url(self, path):
+        return path if path.startswith("https://") else f"{GITHUB_API_URL}{path}"
+
+    def request(self, method, path, **kwargs):
+        url = self._url(path)
+        installation = self.installation_provider()
+        self.rate_limits.check(installation)
+        # Reads are sent with If-None-Match; a 304 does not count against the primary limit
+        cache_key = _cache_key(installation, url, kwargs.get("params")) if method == "GET" else None
+        cached = self.etags.get(cache_key) if cache_key else None
+        for attempt in range(self.max_retries + 1):
+            headers = self.auth_headers_provider()
+            if cached:
+                headers = {**headers, "If-None-Match": cached[0]}
+            response = send(self.session, method, url, headers=headers, timeout=self.timeout, **kwargs)
+            self.rate_limits.update(installation, response)
+            if cached and response.status_code == 304:
+                metrics.increment("github:NotModified")
+                return cached[1]
+            if self.rate_limits.is_primary_exhausted(response):
+                self.rate_limits.exhausted(installation, reset_at(response))
+            if not is_secondary_rate_limit(response):
+                break
+            metrics.increment("github:SecondaryRateLimited")
+            retry_after = retry_after_seconds(response)
+            delay = backoff_delay(attempt, retry_after)
+            if attempt == self.max_retries or delay > MAX_BACKOFF_SECONDS:
+                logger.error("GitHub secondary rate limit, giving up", url=url, status=response.status_code, retry_after=retry_after)
+                break
+            logger.warning("GitHub secondary rate limit, backing off", url=url, status=response.status_code, delay=round(delay, 3))
+            self.sleep(delay)
+        if cache_key and response.status_code == 200:
+            etag = response.headers.get("ETag")
+            if isinstance(etag, str):
+                self.etags.set(cache_key, (etag, response))
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def graphql(self, query, variables=None):
+        response = self.post(GRAPHQL_PATH, json={"query": query, "variables": variables or {}})
+        response.raise_for_status()
+        body = response.json()
+        # A missing team or issue comes back as an error next to partial data
+        if body.get("errors"):
+            logger.warning("GraphQL query returned errors", errors=[error.get("message") for error in body["errors"]])
+        return body.get("data") or {}
+
+    def iter_pages(self, path, params=None):
+        # Follows the Link header one page at a time so callers can stop early
+        response = self.get(path, params=params)
+        while True:
+            response.raise_for_status()
+            yield response.json()
+            next_url = response.links.get("next", {}).get("url")
+            if not next_url:
+                return
+            response = self.get(next_url)
+
+    def post_comment(self, repository, issue_number, comment_body):
+        import requests
+        logger.debug("Posting comment", repository=repository, issue_number=issue_number, body=comment_body)
+        try:
+            response = self.post(f"/repos/{repository}/issues/{issue_number}/comments", json={"body": comment_body})
+            response.raise_for_status()
+            logger.info("Comment posted", repository=repository, issue_number=issue_number, status=response.status_code)
+            return response
+        except requests.exceptions.HTTPError as http_err:
+            logger.error("HTTP error occurred", repository=repository, issue_number=issue_number, error=str(http_err))
+        except Exception as err:
+            logger.error("Other error occurred", repository=repository, issue_number=issue_number, error=str(err))
+        return None
+
+    def close_issue(self, repository, issue_number):
+        response = self.patch(f"/repos/{repository}/issues/{issue_number}", json={"state": "closed"})
+        logger.info("Issue closed", repository=repository, issue_number=issue_number, status=response.status_code)
+        return response
+
+    def get_org_membership_role(self, organization, user):
+        response = self.get(f"/orgs/{organization}/memberships/{user}")
+        logger.debug("Fetched org membership", organization=organization, user=user, status=response.status_code)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get('role')
+
+    def set_org_membership_role(self, organization, user, role):
+        return self.put(f"/orgs/{organization}/memberships/{user}", json={"role": role})
@@ -0,0 +1,63 @@
+import json
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+DEFAULT_LEVEL = 'INFO'
+
+class StructuredLogger:
+    """Writes one JSON object per log line, filtered by LOG_LEVEL.
+
+    A LOG_SAMPLE_RATE fraction of invocations is logged at DEBUG regardless of
+    LOG_LEVEL, so detail is available without paying for it on every event.
+    """
+
+    def __init__(self, level=None, sample_rate=None, stream=None, sampler=random.random):
+        level = (level or os.getenv('LOG_LEVEL') or DEFAULT_LEVEL).upper()
+        self.level = LEVELS.get(level, LEVELS[DEFAULT_LEVEL])
+        self.sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '0') if sample_rate is None else sample_rate)
+        self.stream = stream
+        self.sampler = sampler
+        self.context = {}
+        self._effective_level = self.level
+
+    def start_invocation(self, context=None, **fields):
+        self.context = dict(fields)
+        request_id = getattr(context, 'aws_request_id', None)
+        if request_id:
+            self.context['request_id'] = request_id
+        sampled = self.sample_rate > 0 and self.sampler() < self.sample_rate
+        self._effective_level = LEVELS['DEBUG'] if sampled else self.level
+        if sampled:
+            self.context['sampled'] = True
+
+    def is_enabled(self, level):
+        return LEVELS[level] >= self._effective_level
+
+    def debug(self, message, **fields):
+        self._log('DEBUG', message, fields)
+
+    def info(self, message, **fields):
+        self._log('INFO', message, fields)
+
+    def warning(self, message, **fields):
+        self._log('WARNING', message, fields)
+
+    def error(self, message, **fields):
+        self._log('ERROR', message, fields)
+
+    def _log(self, level, message, fields):
+        if not self.is_enabled(level):
+            return
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'level': level,
+            'message': message,
+            **self.context,
+            **fields
+        }
+        print(json.dumps(record, default=str), file=self.stream or sys.stdout)
+
+logger = StructuredLogger()
@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_NAMESPACE = 'GitHubPermissionsElevation'
+
+def error_status(err):
+    # botocore errors carry the AWS error code, requests errors the HTTP status
+    response = getattr(err, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code') or type(err).__name__
+    status_code = getattr(response, 'status_code', None)
+    return status_code or type(err).__name__
+
+class OutboundCall:
+    def __init__(self):
+        self.status = None
+
+class InvocationMetrics:
+    """Times and counts outbound calls during one invocation and emits them as a single EMF line."""
+
+    def __init__(self, namespace=None, clock=time.perf_counter, stream=None):
+        self.namespace = namespace or os.getenv('METRICS_NAMESPACE', DEFAULT_NAMESPACE)
+        self.clock = clock
+        self.stream = stream
+        self.cold_start = True
+        self._calls = {}
+        self._values = {}
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    def start_invocation(self):
+        # Calls made during INIT, e.g. the prewarm, are reported with the first invocation
+        if not self.cold_start:
+            with self._lock:
+                self._calls = {}
+                self._values = {}
+        self._started_at = self.clock()
+
+    def record(self, service, operation, status, duration_ms):
+        key = (service, operation, str(status))
+        with self._lock:
+            count, total_ms, max_ms = self._calls.get(key, (0, 0.0, 0.0))
+            self._calls[key] = (count + 1, total_ms + duration_ms, max(max_ms, duration_ms))
+
+    def increment(self, name, value=1, unit='Count'):
+        with self._lock:
+            current, _ = self._values.get(name, (0, unit))
+            self._values[name] = (current + value, unit)
+
+    def set_value(self, name, value, unit='Count'):
+        # Last value wins, e.g. the most recently reported remaining quota
+        with self._lock:
+            self._values[name] = (value, unit)
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    @contextmanager
+    def timed(self, service, operation):
+        call = OutboundCall()
+        started_at = self.clock()
+        try:
+            yield call
+        except Exception as err:
+            call.status = error_status(err)
+            raise
+        finally:
+            self.record(service, operation, call.status or 'OK', (self.clock() - started_at) * 1000)
+
+    def calls(self):
+        with self._lock:
+            return dict(self._calls)
+
+    def to_emf(self, function_name, handler_duration_ms, timestamp_ms=None):
+        values = {'ColdStart': 1 if self.cold_start else 0, 'HandlerDuration': round(handler_duration_ms, 3)}
+        definitions = [{'Name': 'ColdStart', 'Unit': 'Count'}, {'Name': 'HandlerDuration', 'Unit': 'Milliseconds'}]
+        for name, (value, unit) in sorted(self.values().items()):
+            values[name] = value
+            definitions.append({'Name': name, 'Unit': unit})
+        outbound = []
+        for (service, operation, status), (count, total_ms, max_ms) in sorted(self.calls().items()):
+            name = f"{service}:{operation}:{status}"
+            values[f"{name}:Count"] = count
+            values[f"{name}:Duration"] = round(total_ms, 3)
+            definitions.append({'Name': f"{name}:Count", 'Unit': 'Count'})
+            definitions.append({'Name': f"{name}:Duration", 'Unit': 'Milliseconds'})
+            outbound.append({'service': service, 'operation': operation, 'status': status, 'count': count,
+                             'duration_ms': round(total_ms, 3), 'max_ms': round(max_ms, 3)})
+        return {
+            '_aws': {
+                'Timestamp': timestamp_ms or int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['Function']],
+                    'Metrics': definitions
+                }]
+            },
+            'Function': function_name,
+            **values,
+            'OutboundCalls': outbound
+        }
+
+    def flush(self, function_name):
+        started_at = self._started_at if self._started_at is not None else self.clock()
+        document = self.to_emf(function_name, (self.clock() - started_at) * 1000)
+        print(json.dumps(document), file=self.stream or sys.stdout)
+        self.cold_start = False
+        self.start_invocation()
+        return document
+
+metrics = InvocationMetrics()
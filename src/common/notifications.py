@@ -0,0 +1,35 @@
+import threading
+from common.concurrency import SideEffectGraph
+
+class NotificationBuffer:
+    """Collects issue comments during an invocation and posts one combined comment per issue."""
+
+    def __init__(self, github_client):
+        self.github = github_client
+        self._messages = {}
+        self._issues_to_close = set()
+        self._lock = threading.Lock()
+
+    def add(self, repository, issue_number, message):
+        with self._lock:
+            self._messages.setdefault((repository, issue_number), []).append(message)
+
+    def close_issue(self, repository, issue_number):
+        with self._lock:
+            self._messages.setdefault((repository, issue_number), [])
+            self._issues_to_close.add((repository, issue_number))
+
+    def pending(self, repository, issue_number):
+        return list(self._messages.get((repository, issue_number), []))
+
+    def flush(self):
+        with self._lock:
+            messages, self._messages = self._messages, {}
+            issues_to_close, self._issues_to_close = self._issues_to_close, set()
+        graph = SideEffectGraph()
+        for (repository, issue_number), issue_messages in messages.items():
+            if issue_messages:
+                graph.add(f"comment {repository}#{issue_number}", self.github.post_comment, repository, issue_number, "\n\n".join(issue_messages))
+            if (repository, issue_number) in issues_to_close:
+                graph.add(f"close {repository}#{issue_number}", self.github.close_issue, repository, issue_number)
+        return graph.run()
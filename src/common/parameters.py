@@ -0,0 +1,84 @@
+import threading
+import time
+from common.logger import logger
+from common.metrics import metrics
+
+DEFAULT_PARAMETER_TTL_SECONDS = 5 * 60
+MAX_NAMES_PER_REQUEST = 10  # SSM GetParameters limit
+
+class ParameterLoader:
+    """Loads a fixed set of SSM parameters in batched calls and keeps them cached by Version."""
+
+    def __init__(self, ssm_client, names, ttl_seconds=DEFAULT_PARAMETER_TTL_SECONDS, clock=time.monotonic):
+        self.ssm_client = ssm_client
+        self.names = list(dict.fromkeys(names))
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._parameters = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self, name):
+        if self._loaded_at is None:
+            self.refresh()
+        elif self.is_stale():
+            self.refresh_in_background()
+        return self._parameters[name]['Value']
+
+    def get_all(self):
+        return {name: self.get(name) for name in self.names}
+
+    def version(self, name):
+        parameter = self._parameters.get(name)
+        return parameter['Version'] if parameter else None
+
+    def is_stale(self):
+        return self._loaded_at is None or self.clock() - self._loaded_at >= self.ttl_seconds
+
+    def refresh(self):
+        fetched = self._fetch()
+        changed = set()
+        for name, parameter in fetched.items():
+            current = self._parameters.get(name)
+            if current is None or current['Version'] != parameter['Version']:
+                self._parameters[name] = parameter
+                changed.add(name)
+        self._loaded_at = self.clock()
+        return changed
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._thread
+            self._thread = threading.Thread(target=self._background_refresh, daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def _background_refresh(self):
+        try:
+            changed = self.refresh()
+            if changed:
+                logger.info("Refreshed SSM parameters", parameters=sorted(changed))
+        except Exception as err:
+            # Keep serving the cached values and try again after another TTL
+            self._loaded_at = self.clock()
+            logger.warning("Background parameter refresh failed, keeping cached values", error=str(err))
+
+    def _fetch(self):
+        parameters = {}
+        for start in range(0, len(self.names), MAX_NAMES_PER_REQUEST):
+            with metrics.timed('ssm', 'GetParameters'):
+                response = self.ssm_client.get_parameters(
+                    Names=self.names[start:start + MAX_NAMES_PER_REQUEST],
+                    WithDecryption=True
+                )
+            invalid = response.get('InvalidParameters', [])
+            if invalid:
+                raise KeyError(f"SSM parameters not found: {', '.join(invalid)}")
+            for parameter in response['Parameters']:
+                parameters[parameter['Name']] = {
+                    'Value': parameter['Value'],
+                    'Version': parameter['Version']
+                }
+        return parameters
@@ -0,0 +1,136 @@
+import abc
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from common.metrics import metrics
+
+MAX_RECEIVE_MESSAGES = 10  # SQS ReceiveMessage limit
+MEMORY_QUEUE_URL = 'memory://'
+FILE_QUEUE_PREFIX = 'file://'
+
+class QueuedMessage:
+    def __init__(self, receipt, body):
+        self.receipt = receipt
+        self.body = body
+
+class DeliveryQueue(abc.ABC):
+    """Where verified webhook deliveries wait for the worker. Bodies are JSON-serialisable dicts."""
+
+    @abc.abstractmethod
+    def send(self, body):
+        pass
+
+    @abc.abstractmethod
+    def receive(self, max_messages=MAX_RECEIVE_MESSAGES):
+        pass
+
+    @abc.abstractmethod
+    def delete(self, receipt):
+        pass
+
+    def release(self, receipt):
+        # SQS makes a received message visible again once its visibility timeout expires
+        pass
+
+class InMemoryQueue(DeliveryQueue):
+    def __init__(self):
+        self._messages = deque()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def send(self, body):
+        # Round-tripped through JSON so tests see exactly what SQS would carry
+        with self._lock:
+            self._messages.append(json.dumps(body))
+
+    def receive(self, max_messages=MAX_RECEIVE_MESSAGES):
+        received = []
+        with self._lock:
+            while self._messages and len(received) < max_messages:
+                receipt = uuid.uuid4().hex
+                self._in_flight[receipt] = self._messages.popleft()
+                received.append(QueuedMessage(receipt, json.loads(self._in_flight[receipt])))
+        return received
+
+    def delete(self, receipt):
+        with self._lock:
+            self._in_flight.pop(receipt, None)
+
+    def release(self, receipt):
+        # Puts an unprocessed message back, as an expired SQS visibility timeout would
+        with self._lock:
+            body = self._in_flight.pop(receipt, None)
+            if body is not None:
+                self._messages.appendleft(body)
+
+    def __len__(self):
+        return len(self._messages) + len(self._in_flight)
+
+class LocalFileQueue(DeliveryQueue):
+    """One JSON file per message in a directory, for local runs and replaying captured deliveries."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, body):
+        # Time-prefixed names keep receive() in arrival order; the rename makes the write atomic
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}.json"
+        partial = os.path.join(self.directory, f".{name}.tmp")
+        with open(partial, 'w') as message_file:
+            json.dump(body, message_file)
+        os.replace(partial, os.path.join(self.directory, name))
+
+    def receive(self, max_messages=MAX_RECEIVE_MESSAGES):
+        received = []
+        for name in sorted(os.listdir(self.directory)):
+            if len(received) == max_messages:
+                break
+            if not name.endswith('.json'):
+                continue
+            in_flight = os.path.join(self.directory, f"{name}.inflight")
+            try:
+                os.rename(os.path.join(self.directory, name), in_flight)
+            except FileNotFoundError:
+                continue  # taken by another worker
+            with open(in_flight) as message_file:
+                received.append(QueuedMessage(in_flight, json.load(message_file)))
+        return received
+
+    def delete(self, receipt):
+        try:
+            os.remove(receipt)
+        except FileNotFoundError:
+            pass
+
+    def release(self, receipt):
+        os.replace(receipt, receipt[:-len('.inflight')])
+
+class SqsQueue(DeliveryQueue):
+    def __init__(self, sqs_client, queue_url):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+
+    def send(self, body):
+        with metrics.timed('sqs', 'SendMessage'):
+            self.sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))
+
+    def receive(self, max_messages=MAX_RECEIVE_MESSAGES):
+        with metrics.timed('sqs', 'ReceiveMessage'):
+            response = self.sqs_client.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=max_messages)
+        return [QueuedMessage(message['ReceiptHandle'], json.loads(message['Body'])) for message in response.get('Messages', [])]
+
+    def delete(self, receipt):
+        with metrics.timed('sqs', 'DeleteMessage'):
+            self.sqs_client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+def create_queue(queue_url, region_name=None):
+    if queue_url == MEMORY_QUEUE_URL:
+        return InMemoryQueue()
+    if queue_url.startswith(FILE_QUEUE_PREFIX):
+        return LocalFileQueue(queue_url[len(FILE_QUEUE_PREFIX):])
+    import boto3
+    return SqsQueue(boto3.client('sqs', region_name=region_name), queue_url)
@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from common.logger import logger
+from common.metrics import metrics
+
+MAX_RETRIES = 3
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 5.0  # Lambdas time out after 30 seconds
+SECONDARY_LIMIT_MESSAGE = 'secondary rate limit'
+
+class RateLimitExceeded(Exception):
+    """The installation has no primary quota left until reset_at (epoch seconds)."""
+
+    def __init__(self, installation, reset_at):
+        super().__init__(f"GitHub rate limit exhausted for installation {installation} until {reset_at}")
+        self.installation = installation
+        self.reset_at = reset_at
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    if not isinstance(value, (str, int)):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def is_secondary_rate_limit(response):
+    if response.status_code == 429:
+        return True
+    if response.status_code != 403:
+        return False
+    if response.headers.get('Retry-After') is not None:
+        return True
+    try:
+        message = response.json().get('message', '')
+    except Exception:
+        return False
+    return isinstance(message, str) and SECONDARY_LIMIT_MESSAGE in message.lower()
+
+def retry_after_seconds(response):
+    return _header_int(response.headers, 'Retry-After')
+
+def reset_at(response):
+    return _header_int(response.headers, 'X-RateLimit-Reset')
+
+def backoff_delay(attempt, retry_after=None, base=BASE_BACKOFF_SECONDS, cap=MAX_BACKOFF_SECONDS, rand=random.random):
+    # Retry-After is authoritative; otherwise exponential backoff with full jitter
+    if retry_after is not None:
+        return retry_after
+    return rand() * min(cap, base * 2 ** attempt)
+
+class RateLimitTracker:
+    """Remembers the primary quota GitHub last reported for each installation."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._quotas = {}
+        self._lock = threading.Lock()
+
+    def update(self, installation, response):
+        headers = response.headers
+        remaining = _header_int(headers, 'X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        quota = {
+            'remaining': remaining,
+            'limit': _header_int(headers, 'X-RateLimit-Limit'),
+            'reset_at': _header_int(headers, 'X-RateLimit-Reset')
+        }
+        with self._lock:
+            self._quotas[installation] = quota
+        metrics.set_value('github:RateLimitRemaining', remaining)
+
+    def remaining(self, installation):
+        quota = self._quotas.get(installation)
+        return quota['remaining'] if quota else None
+
+    def check(self, installation):
+        # No point spending a request that GitHub will reject until the window resets
+        quota = self._quotas.get(installation)
+        if not quota or quota['remaining'] > 0:
+            return
+        if quota['reset_at'] is not None and self.clock() >= quota['reset_at']:
+            with self._lock:
+                self._quotas.pop(installation, None)
+            return
+        self.exhausted(installation, quota['reset_at'])
+
+    def exhausted(self, installation, reset_at):
+        metrics.increment('github:RateLimitExhausted')
+        logger.error("GitHub rate limit exhausted", installation=installation, reset_at=reset_at)
+        raise RateLimitExceeded(installation, reset_at)
+
+    def is_primary_exhausted(self, response):
+        return response.status_code in (403, 429) and _header_int(response.headers, 'X-RateLimit-Remaining') == 0
@@ -0,0 +1,67 @@
+import os
+import time
+from common.logger import logger
+
+DEFAULT_CONTEXT_TTL_SECONDS = 30 * 60
+
+def running_in_lambda():
+    return bool(os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+
+def keeps_warm_state(err):
+    """Rate limits and GitHub's answers say nothing about the warm state, which holds the quota and token records.
+
+    Anything else, such as a failed parameter load or a rejected token (401), may come from stale
+    configuration or credentials, so the state is rebuilt.
+    """
+    from common.rate_limits import RateLimitExceeded
+    if isinstance(err, RateLimitExceeded):
+        return True
+    status = getattr(getattr(err, 'response', None), 'status_code', None)
+    return isinstance(status, int) and status != 401
+
+class RuntimeContext:
+    """Holds an object built once per Lambda container and reused by warm invocations."""
+
+    def __init__(self, factory, ttl_seconds=DEFAULT_CONTEXT_TTL_SECONDS, clock=time.monotonic):
+        self.factory = factory
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._value = None
+        self._built_at = None
+
+    def get(self):
+        if self._value is None or self.is_expired():
+            self.refresh()
+        return self._value
+
+    def is_expired(self):
+        if self._built_at is None:
+            return True
+        return self.clock() - self._built_at >= self.ttl_seconds
+
+    def refresh(self):
+        self._value = self.factory()
+        self._built_at = self.clock()
+        return self._value
+
+    def invalidate(self):
+        self._value = None
+        self._built_at = None
+
+    def invalidate_after(self, err):
+        if keeps_warm_state(err):
+            logger.info("Keeping warm state after error", error=str(err))
+            return False
+        self.invalidate()
+        return True
+
+    def prewarm(self):
+        # Build during the INIT phase so the first invocation is already warm.
+        # A failure here must not break the container; get() will retry.
+        if not running_in_lambda():
+            return
+        try:
+            self.refresh()
+        except Exception as err:
+            logger.warning("Prewarm failed, will retry on first invocation", error=str(err))
+            self.invalidate()
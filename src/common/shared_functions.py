@@ -1,34 +1,119 @@
-import jwt
+import threading
 import time
-import requests
+from datetime import datetime
+from common.github_client import GITHUB_API_URL, DEFAULT_TIMEOUT, get_shared_session, send
 
 DEFAULT_REGION = 'eu-west-2'
 ESCALATION_TEAM_NAME = 'can-escalate-to-become-an-owner'
 ELEVATION_BOT = 'elevatemetoowner[bot]'
 
+JWT_LIFETIME_SECONDS = 10 * 60
+JWT_REFRESH_MARGIN_SECONDS = 60
+INSTALLATION_TOKEN_LIFETIME_SECONDS = 60 * 60
+INSTALLATION_TOKEN_REFRESH_MARGIN_SECONDS = 5 * 60
+
+def parse_github_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+def get_event_installation_id(payload):
+    return (payload.get('installation') or {}).get('id')
+
 class GitHubAuth:
-    def __init__(self, private_key, app_id, installation_id):
+    """Pool of installation tokens for one GitHub App, minted on demand and kept until near expiry.
+
+    installation_id is the fallback for callers that do not name an installation.
+    """
+
+    def __init__(self, private_key, app_id, installation_id, session=None):
         self.private_key = private_key
         self.app_id = app_id
         self.installation_id = installation_id
+        self.session = session or get_shared_session()
+        self._signing_key = None
+        self._jwt = None
+        self._jwt_expires_at = 0
+        self._tokens = {}
+        self._installations = {}
+        self._lock = threading.Lock()
+
+    def _get_signing_key(self):
+        if self._signing_key is None:
+            # cryptography is only loaded once a token actually has to be minted
+            from cryptography.hazmat.primitives.serialization import load_pem_private_key
+            key = self.private_key.encode('utf-8') if isinstance(self.private_key, str) else self.private_key
+            self._signing_key = load_pem_private_key(key, password=None)
+        return self._signing_key
 
     def generate_jwt(self):
         now = int(time.time())
+        if self._jwt and now < self._jwt_expires_at - JWT_REFRESH_MARGIN_SECONDS:
+            return self._jwt
+        import jwt
         payload = {
             "iat": now,
-            "exp": now + (10 * 60),  # JWT expires in 10 minutes
+            "exp": now + JWT_LIFETIME_SECONDS,
             "iss": self.app_id
         }
-        return jwt.encode(payload, self.private_key, algorithm="RS256")
+        self._jwt = jwt.encode(payload, self._get_signing_key(), algorithm="RS256")
+        self._jwt_expires_at = payload["exp"]
+        return self._jwt
 
-    def get_access_token(self):
-        jwt_token = self.generate_jwt()
-        headers = {
-            "Authorization": f"Bearer {jwt_token}",
+    def _app_headers(self):
+        return {
+            "Authorization": f"Bearer {self.generate_jwt()}",
             "Accept": "application/vnd.github.v3+json"
         }
-        response = requests.post(
-            f"https://api.github.com/app/installations/{self.installation_id}/access_tokens",
-            headers=headers
+
+    def _cached_token(self, installation_id):
+        cached = self._tokens.get(installation_id)
+        if cached and time.time() < cached[1] - INSTALLATION_TOKEN_REFRESH_MARGIN_SECONDS:
+            return cached[0]
+        return None
+
+    def get_access_token(self, installation_id=None):
+        # Ids arrive as ints from payloads and as strings from SSM
+        installation_id = str(installation_id or self.installation_id)
+        token = self._cached_token(installation_id)
+        if token:
+            return token
+        with self._lock:
+            # Another thread may have minted it while this one waited
+            return self._cached_token(installation_id) or self._create_access_token(installation_id)
+
+    def _create_access_token(self, installation_id):
+        headers = self._app_headers()
+        requested_at = time.time()
+        response = send(
+            self.session,
+            "POST",
+            f"{GITHUB_API_URL}/app/installations/{installation_id}/access_tokens",
+            headers=headers,
+            timeout=DEFAULT_TIMEOUT
         )
-        return response.json()["token"]
+        response.raise_for_status()
+        body = response.json()
+        expires_at = body.get("expires_at")
+        if isinstance(expires_at, str):
+            expires_at = parse_github_timestamp(expires_at)
+        else:
+            expires_at = requested_at + INSTALLATION_TOKEN_LIFETIME_SECONDS
+        self._tokens[installation_id] = (body["token"], expires_at)
+        return body["token"]
+
+    def invalidate_access_token(self, installation_id=None):
+        self._tokens.pop(str(installation_id or self.installation_id), None)
+
+    def get_installation_id(self, organization):
+        # For callers such as the sweeper that only know the organization
+        key = organization.lower()
+        if key not in self._installations:
+            response = send(
+                self.session,
+                "GET",
+                f"{GITHUB_API_URL}/orgs/{organization}/installation",
+                headers=self._app_headers(),
+                timeout=DEFAULT_TIMEOUT
+            )
+            response.raise_for_status()
+            self._installations[key] = str(response.json()["id"])
+        return self._installations[key]
@@ -0,0 +1,255 @@
+import time
+from datetime import datetime, timezone
+from common.logger import logger
+from common.metrics import metrics
+
+TABLE_NAME = 'GithubElevationRequests'
+STATUS_INDEX_NAME = 'status-index'
+
+STATUS_PENDING = 'pending'
+STATUS_ELEVATED = 'elevated'
+STATUS_DEMOTED = 'demoted'
+STATUS_CLOSED = 'closed'
+
+CLOSE_REASON_LEGACY = 'legacy'
+
+RECORD_TTL_SECONDS = 365 * 24 * 60 * 60
+LATEST_REQUEST_PROJECTION = "#user, requested_at, #status, issue_number, repo"
+
+# status_time is the index sort key and holds the epoch second that matters for
+# the record's current status: when it was requested (pending), when the
+# elevation expires (elevated), when the user was demoted (demoted) or when an
+# elevation was closed without a demotion, e.g. for the last owner (closed).
+
+def now_epoch():
+    return int(time.time())
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+def to_iso(value):
+    # Keeps the naive ISO format already used by the requested_at range key
+    return value.replace(tzinfo=None).isoformat()
+
+def to_epoch(value):
+    # Older records hold naive datetime.now().isoformat() strings written in UTC
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def status_time_for(item, elevation_duration):
+    status = item.get('status')
+    if status == STATUS_PENDING and item.get('requested_at'):
+        return to_epoch(item['requested_at'])
+    if status == STATUS_ELEVATED and item.get('elevated_at'):
+        return to_epoch(item['elevated_at']) + elevation_duration
+    if status == STATUS_DEMOTED and item.get('demoted_at'):
+        return to_epoch(item['demoted_at'])
+    if status == STATUS_CLOSED and item.get('closed_at'):
+        return to_epoch(item['closed_at'])
+    return None
+
+class ElevationRequestStore:
+    """Elevation request records. With statistics, each write that succeeds also increments the aggregates."""
+
+    def __init__(self, dynamodb, table_name=TABLE_NAME, statistics=None):
+        self.table = dynamodb.Table(table_name)
+        self.statistics = statistics
+
+    def get_latest_request(self, user):
+        from boto3.dynamodb.conditions import Key
+        with metrics.timed('dynamodb', 'Query'):
+            response = self.table.query(
+                KeyConditionExpression=Key('user').eq(user),
+                ScanIndexForward=False,
+                Limit=1,
+                ProjectionExpression=LATEST_REQUEST_PROJECTION,
+                ExpressionAttributeNames={'#user': 'user', '#status': 'status'}
+            )
+        items = response.get('Items', [])
+        return items[0] if items else None
+
+    def create_request(self, user, repository, issue_number, now=None):
+        now = now or utc_now()
+        epoch = int(now.timestamp())
+        item = {
+            'user': user,
+            'issue_number': issue_number,
+            'repo': repository,
+            'status': STATUS_PENDING,
+            'requested_at': to_iso(now),
+            'requested_epoch': epoch,
+            'status_time': epoch,
+            'ttl': epoch + RECORD_TTL_SECONDS
+        }
+        with metrics.timed('dynamodb', 'PutItem'):
+            self.table.put_item(Item=item, ConditionExpression="attribute_not_exists(requested_at)")
+        if self.statistics:
+            self.statistics.record_request(user, now)
+        return item
+
+    def mark_elevated(self, user, requested_at, elevation_duration, now=None, approver=None):
+        now = now or utc_now()
+        expires_at = int(now.timestamp()) + elevation_duration
+        expression, values = "elevated_at = :t, expires_at = :e, status_time = :e", {':t': to_iso(now), ':e': expires_at}
+        if approver:
+            expression, values = f"{expression}, approver = :a", dict(values, **{':a': approver})
+        if not self._transition(user, requested_at, STATUS_PENDING, STATUS_ELEVATED, expression, values):
+            return False
+        if self.statistics:
+            self.statistics.record_elevation(user, approver, requested_at, now)
+        return True
+
+    def mark_demoted(self, user, requested_at, now=None):
+        now = now or utc_now()
+        if not self._transition(user, requested_at, STATUS_ELEVATED, STATUS_DEMOTED,
+                                "demoted_at = :t, status_time = :e", {':t': to_iso(now), ':e': int(now.timestamp())}):
+            return False
+        if self.statistics:
+            self.statistics.record_demotion(now)
+        return True
+
+    def mark_closed(self, user, requested_at, reason, now=None):
+        # Ends an elevation that is not demoted, e.g. the user is no longer an owner, so it leaves the expired list
+        now = now or utc_now()
+        if not self._transition(user, requested_at, STATUS_ELEVATED, STATUS_CLOSED,
+                                "closed_at = :t, close_reason = :r, status_time = :e",
+                                {':t': to_iso(now), ':r': reason, ':e': int(now.timestamp())}):
+            return False
+        if self.statistics:
+            self.statistics.record_closure(now)
+        return True
+
+    def revert_elevation(self, user, requested_at):
+        # Puts back an elevation whose demotion could not be scheduled, so another approval can retry it
+        old = self._transition(user, requested_at, STATUS_ELEVATED, STATUS_PENDING,
+                               "status_time = :e REMOVE elevated_at, expires_at, approver",
+                               {':e': to_epoch(requested_at)}, return_old=True)
+        if old is False:
+            return False
+        if self.statistics and old.get('elevated_at'):
+            elevated_at = datetime.fromtimestamp(to_epoch(old['elevated_at']), timezone.utc)
+            self.statistics.record_elevation_reverted(user, old.get('approver'), requested_at, elevated_at)
+        return True
+
+    def _transition(self, user, requested_at, from_status, to_status, expression, values, return_old=False):
+        # One conditional write on the full key; no read beforehand
+        update = {
+            'Key': {'user': user, 'requested_at': requested_at},
+            'UpdateExpression': f"set #status = :to_status, {expression}",
+            'ConditionExpression': "#status = :from_status",
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': {':from_status': from_status, ':to_status': to_status, **values}
+        }
+        if return_old:
+            update['ReturnValues'] = 'UPDATED_OLD'
+        try:
+            with metrics.timed('dynamodb', 'UpdateItem'):
+                response = self.table.update_item(**update)
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info("Request is not in the expected status, not changing it", user=user,
+                        requested_at=requested_at, expected_status=from_status, new_status=to_status)
+            return False
+        return response.get('Attributes', {}) if return_old else True
+
+    def query_by_status(self, status, start=None, end=None, limit=None, exclusive_start_key=None):
+        from boto3.dynamodb.conditions import Key
+        condition = Key('status').eq(status)
+        if start is not None and end is not None:
+            condition = condition & Key('status_time').between(start, end)
+        elif start is not None:
+            condition = condition & Key('status_time').gte(start)
+        elif end is not None:
+            condition = condition & Key('status_time').lte(end)
+        kwargs = {'IndexName': STATUS_INDEX_NAME, 'KeyConditionExpression': condition}
+        if limit:
+            kwargs['Limit'] = limit
+        if exclusive_start_key:
+            kwargs['ExclusiveStartKey'] = exclusive_start_key
+        with metrics.timed('dynamodb', 'Query'):
+            response = self.table.query(**kwargs)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+
+    def iter_by_status(self, status, start=None, end=None, page_size=None):
+        last_key = None
+        while True:
+            items, last_key = self.query_by_status(status, start, end, page_size, last_key)
+            yield from items
+            if not last_key:
+                return
+
+    def list_pending(self, start=None, end=None, limit=None, exclusive_start_key=None):
+        return self.query_by_status(STATUS_PENDING, start, end, limit, exclusive_start_key)
+
+    def list_active(self, now=None, limit=None, exclusive_start_key=None):
+        now = now_epoch() if now is None else now
+        return self.query_by_status(STATUS_ELEVATED, now + 1, None, limit, exclusive_start_key)
+
+    def list_expired(self, before=None, limit=None, exclusive_start_key=None):
+        before = now_epoch() if before is None else before
+        return self.query_by_status(STATUS_ELEVATED, None, before, limit, exclusive_start_key)
+
+    def iter_expired(self, before=None, page_size=None):
+        before = now_epoch() if before is None else before
+        return self.iter_by_status(STATUS_ELEVATED, None, before, page_size)
+
+    def backfill(self, elevation_duration, now=None):
+        # Adds the numeric attributes to records written before they existed
+        from boto3.dynamodb.conditions import Attr
+        now = now_epoch() if now is None else now
+        updated = 0
+        scan_kwargs = {'FilterExpression': Attr('status_time').not_exists()}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response.get('Items', []):
+                if self._backfill_item(item, elevation_duration, now):
+                    updated += 1
+            if 'LastEvaluatedKey' not in response:
+                return updated
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _backfill_item(self, item, elevation_duration, now):
+        status_time = status_time_for(item, elevation_duration)
+        if status_time is None:
+            logger.warning("Skipping record, cannot derive status_time", user=item.get('user'), requested_at=item.get('requested_at'))
+            return False
+        values = {':status_time': status_time, ':requested_epoch': to_epoch(item['requested_at'])}
+        expression = "set status_time = :status_time, requested_epoch = :requested_epoch"
+        names = None
+        if item.get('elevated_at'):
+            values[':expires_at'] = to_epoch(item['elevated_at']) + elevation_duration
+            expression += ", expires_at = :expires_at"
+        if item.get('status') == STATUS_ELEVATED and status_time <= now:
+            # The old demotion never recorded itself, so every past elevation still reads as
+            # elevated. Indexing them as expired would have the sweeper act on the whole history.
+            values.update({':status_time': now, ':closed': STATUS_CLOSED, ':closed_at': to_iso(datetime.fromtimestamp(now, timezone.utc)),
+                           ':reason': CLOSE_REASON_LEGACY})
+            expression += ", #status = :closed, closed_at = :closed_at, close_reason = :reason"
+            names = {'#status': 'status'}
+        update = {
+            'Key': {'user': item['user'], 'requested_at': item['requested_at']},
+            'UpdateExpression': expression,
+            'ConditionExpression': "attribute_not_exists(status_time)",
+            'ExpressionAttributeValues': values
+        }
+        if names:
+            update['ExpressionAttributeNames'] = names
+        try:
+            self.table.update_item(**update)
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+if __name__ == '__main__':
+    # Migration for existing tables: python -m common.store --backfill [elevation_duration]
+    import sys
+    import boto3
+    import os
+    from common.shared_functions import DEFAULT_REGION
+    if '--backfill' not in sys.argv:
+        sys.exit("usage: python -m common.store --backfill [elevation_duration]")
+    arguments = [argument for argument in sys.argv[1:] if argument != '--backfill']
+    duration = int(arguments[0]) if arguments else int(os.getenv('ELEVATION_DURATION', '300'))
+    dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION, endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL'))
+    print(f"Backfilled {ElevationRequestStore(dynamodb).backfill(duration)} records")
@@ -0,0 +1,45 @@
+import pytest
+from unittest.mock import MagicMock
+from common.cache import TTLCache
+
+@pytest.fixture
+def clock():
+    return MagicMock(return_value=1000.0)
+
+def test_get_returns_default_for_missing_key(clock):
+    cache = TTLCache(clock=clock)
+    assert cache.get('missing') is None
+    assert cache.get('missing', 'default') == 'default'
+
+def test_false_values_are_cached(clock):
+    cache = TTLCache(clock=clock)
+    cache.set('key', False)
+    assert cache.get('key') is False
+
+def test_entries_expire(clock):
+    cache = TTLCache(ttl_seconds=60, clock=clock)
+    cache.set('key', 'value')
+    clock.return_value = 1059.0
+    assert cache.get('key') == 'value'
+    clock.return_value = 1060.0
+    assert cache.get('key') is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+def test_invalidate(clock):
+    cache = TTLCache(clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.invalidate('a')
+    assert cache.get('a') is None
+    cache.invalidate()
+    assert len(cache) == 0
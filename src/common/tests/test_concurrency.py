@@ -0,0 +1,61 @@
+import pytest
+import threading
+import time
+from common.concurrency import SideEffectGraph
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = SideEffectGraph()
+    graph.add('first', barrier.wait)
+    graph.add('second', barrier.wait)
+
+    results = graph.run()
+
+    assert set(results) == {'first', 'second'}
+
+def test_dependent_steps_run_in_order():
+    calls = []
+
+    def record(name, delay=0):
+        time.sleep(delay)
+        calls.append(name)
+        return name
+
+    graph = SideEffectGraph()
+    graph.add('promote', record, 'promote', delay=0.05)
+    graph.add('comment', record, 'comment')
+    graph.add('schedule', record, 'schedule', after=['promote'])
+
+    results = graph.run()
+
+    assert results == {'promote': 'promote', 'comment': 'comment', 'schedule': 'schedule'}
+    assert calls.index('promote') < calls.index('schedule')
+    assert calls[0] == 'comment'
+
+def test_failed_step_skips_dependants_and_is_raised(capfd):
+    calls = []
+
+    def fail():
+        raise RuntimeError("promotion failed")
+
+    graph = SideEffectGraph()
+    graph.add('promote', fail)
+    graph.add('comment', calls.append, 'comment')
+    graph.add('schedule', calls.append, 'schedule', after=['promote'])
+    graph.add('notify', calls.append, 'notify', after=['schedule'])
+
+    with pytest.raises(RuntimeError, match="promotion failed"):
+        graph.run()
+
+    assert calls == ['comment']
+    output = capfd.readouterr().out
+    assert '"step": "promote", "error": "promotion failed"' in output
+    assert '"step": "notify"' in output
+
+def test_unknown_dependency_is_rejected():
+    graph = SideEffectGraph()
+    with pytest.raises(ValueError):
+        graph.add('schedule', print, after=['promote'])
+
+def test_empty_graph():
+    assert SideEffectGraph().run() == {}
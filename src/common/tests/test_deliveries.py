@@ -0,0 +1,53 @@
+import boto3
+import pytest
+from unittest.mock import patch
+from moto import mock_aws
+from common.deliveries import DeliveryDeduplicator, DELIVERY_TABLE_NAME
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        resource = boto3.resource('dynamodb', region_name='eu-west-2')
+        resource.create_table(
+            TableName=DELIVERY_TABLE_NAME,
+            KeySchema=[{'AttributeName': 'delivery_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'delivery_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        yield resource
+
+def test_claim_accepts_first_delivery_and_rejects_repeat(dynamodb):
+    deduplicator = DeliveryDeduplicator(dynamodb)
+    assert deduplicator.claim('delivery-1')
+    assert not deduplicator.claim('delivery-1')
+    assert deduplicator.claim('delivery-2')
+
+def test_claim_sees_deliveries_claimed_by_other_containers(dynamodb):
+    assert DeliveryDeduplicator(dynamodb).claim('delivery-1')
+    assert not DeliveryDeduplicator(dynamodb).claim('delivery-1')
+
+def test_claim_stores_ttl(dynamodb):
+    deduplicator = DeliveryDeduplicator(dynamodb, ttl_seconds=60)
+    with patch('time.time', return_value=1000):
+        deduplicator.claim('delivery-1')
+    item = deduplicator.table.get_item(Key={'delivery_id': 'delivery-1'})['Item']
+    assert item['received_at'] == 1000
+    assert item['ttl'] == 1060
+
+def test_repeat_in_same_container_skips_dynamodb(dynamodb):
+    deduplicator = DeliveryDeduplicator(dynamodb)
+    deduplicator.claim('delivery-1')
+    with patch.object(deduplicator.table, 'put_item') as mock_put:
+        assert not deduplicator.claim('delivery-1')
+    mock_put.assert_not_called()
+
+def test_release_allows_redelivery(dynamodb):
+    deduplicator = DeliveryDeduplicator(dynamodb)
+    deduplicator.claim('delivery-1')
+    deduplicator.release('delivery-1')
+    assert deduplicator.claim('delivery-1')
+
+def test_missing_delivery_id_is_always_processed(dynamodb):
+    deduplicator = DeliveryDeduplicator(dynamodb)
+    assert deduplicator.claim(None)
+    assert deduplicator.claim(None)
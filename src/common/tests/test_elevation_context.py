@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+from common.elevation_context import TEAM_MATCHES, ElevationContext, fetch_elevation_context
+
+def members(*edges, has_next_page=False):
+    return {
+        'pageInfo': {'hasNextPage': has_next_page},
+        'edges': [{'role': role, 'node': {'login': login}} for login, role in edges]
+    }
+
+def response(team=None, members_with_role=None, issue_state='OPEN'):
+    organization = {'membersWithRole': members_with_role or members()}
+    if team is not None:
+        organization['team'] = team
+    return {'organization': organization, 'repository': {'issue': {'state': issue_state}}}
+
+def team(approver_logins=(), requester_logins=()):
+    return {
+        'approver': {'nodes': [{'login': login} for login in approver_logins]},
+        'requester': {'nodes': [{'login': login} for login in requester_logins]}
+    }
+
+def test_team_membership_requires_an_exact_login_match():
+    data = response(team=team(approver_logins=['Approver'], requester_logins=['requestor-2']))
+    context = ElevationContext.from_response(data, approver='approver', requester='requestor')
+    assert context.approver_is_member is True
+    assert context.requester_is_member is False
+
+def test_full_page_of_prefix_matches_leaves_membership_unknown():
+    logins = [f"requestor-{number}" for number in range(TEAM_MATCHES)]
+    data = response(team=team(approver_logins=logins[:-1] + ['approver'], requester_logins=logins))
+    context = ElevationContext.from_response(data, approver='approver', requester='requestor')
+    assert context.approver_is_member is True
+    assert context.requester_is_member is None
+
+def test_missing_team_leaves_membership_unknown():
+    context = ElevationContext.from_response(response(), approver='approver', requester='requestor')
+    assert context.approver_is_member is None
+    assert context.requester_is_member is None
+
+def test_complete_member_page_answers_role_and_owners():
+    data = response(members_with_role=members(('requestor', 'ADMIN'), ('other', 'MEMBER')), issue_state='CLOSED')
+    context = ElevationContext.from_response(data, requester='requestor')
+    assert context.requester_role == 'admin'
+    assert context.requester_role_known is True
+    assert context.owners == ['requestor']
+    assert context.issue_state == 'closed'
+
+def test_complete_member_page_without_requester_means_not_a_member():
+    context = ElevationContext.from_response(response(members_with_role=members(('other', 'ADMIN'))), requester='requestor')
+    assert context.requester_role is None
+    assert context.requester_role_known is True
+
+def test_partial_member_page_leaves_unanswered_checks_unknown():
+    data = response(members_with_role=members(('requestor', 'ADMIN'), has_next_page=True))
+    context = ElevationContext.from_response(data, requester='requestor')
+    assert context.requester_role == 'admin'
+    assert context.owners is None
+
+    data = response(members_with_role=members(('owner-1', 'ADMIN'), ('owner-2', 'ADMIN'), has_next_page=True))
+    context = ElevationContext.from_response(data, requester='requestor')
+    assert context.requester_role_known is False
+    assert context.owners == ['owner-1', 'owner-2']
+
+def test_fetch_elevation_context_sends_one_query():
+    github = MagicMock()
+    github.graphql.return_value = response(team=team(approver_logins=['approver']))
+    context = fetch_elevation_context(github, 'org', 'elevators', approver='approver', requester='requestor',
+                                      repository='org/repo', issue_number=7)
+    github.graphql.assert_called_once()
+    variables = github.graphql.call_args[0][1]
+    assert variables['repoOwner'] == 'org' and variables['repoName'] == 'repo' and variables['issueNumber'] == 7
+    assert variables['withTeam'] and variables['withIssue']
+    assert context.approver_is_member is True
+
+def test_fetch_elevation_context_skips_team_and_issue_when_not_asked():
+    github = MagicMock()
+    github.graphql.return_value = response()
+    fetch_elevation_context(github, 'org', requester='requestor')
+    variables = github.graphql.call_args[0][1]
+    assert not variables['withTeam'] and not variables['withIssue']
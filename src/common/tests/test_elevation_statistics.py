@@ -0,0 +1,123 @@
+import boto3
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from moto import mock_aws
+from common.elevation_statistics import ElevationStatistics, StatisticsCounts, median_from_histogram, bucket_name
+from common.export import ElevationExport
+from common.store import ElevationRequestStore, to_iso
+from common.tests.test_store import create_table
+
+NOW = datetime(2024, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+NOW_EPOCH = int(NOW.timestamp())
+
+def create_statistics_table(dynamodb):
+    return dynamodb.create_table(
+        TableName='GithubElevationStatistics',
+        KeySchema=[{'AttributeName': 'aggregate', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'aggregate', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        resource = boto3.resource('dynamodb', region_name='eu-west-2')
+        create_table(resource)
+        create_statistics_table(resource)
+        yield resource
+
+@pytest.fixture
+def statistics(dynamodb):
+    return ElevationStatistics(dynamodb)
+
+@pytest.fixture
+def store(dynamodb, statistics):
+    return ElevationRequestStore(dynamodb, statistics=statistics)
+
+def elevate(store, user, approver, waited, now=NOW):
+    requested = store.create_request(user, 'org/repo', 1, now=now - timedelta(seconds=waited))
+    assert store.mark_elevated(user, requested['requested_at'], 300, now=now, approver=approver)
+    return requested['requested_at']
+
+def test_status_changes_update_the_aggregates(store, statistics):
+    requested_at = elevate(store, 'alice', 'bob', 120)
+    elevate(store, 'carol', 'bob', 600)
+    assert store.mark_demoted('alice', requested_at, now=NOW + timedelta(days=1))
+
+    assert statistics.totals() == {'requested': 2, 'elevated': 2, 'demoted': 1, 'active': 1, 'approvals': 2,
+                                   'approval_seconds': 720, bucket_name(120): 1, bucket_name(600): 1}
+    assert statistics.day(date(2024, 6, 1)) == {'requested': 2, 'elevated': 2}
+    assert statistics.day(date(2024, 6, 2)) == {'demoted': 1}
+    assert statistics.user('alice') == {'requested': 1, 'elevated': 1}
+    assert statistics.approver('bob') == {'approved': 2}
+    assert statistics.active_owners() == 1
+    assert store.table.get_item(Key={'user': 'alice', 'requested_at': requested_at})['Item']['approver'] == 'bob'
+
+def test_rejected_transition_counts_nothing(store, statistics):
+    requested = store.create_request('alice', 'org/repo', 1, now=NOW)
+    assert store.mark_demoted('alice', requested['requested_at'], now=NOW) is False
+    assert store.mark_elevated('alice', requested['requested_at'], 300, now=NOW, approver='bob')
+    assert store.mark_elevated('alice', requested['requested_at'], 300, now=NOW, approver='bob') is False
+
+    assert statistics.totals()['elevated'] == 1
+    assert 'demoted' not in statistics.totals()
+
+def test_reverted_elevation_is_uncounted(store, statistics):
+    requested_at = elevate(store, 'alice', 'bob', 120)
+    assert store.revert_elevation('alice', requested_at)
+
+    totals = statistics.totals()
+    assert (totals['requested'], totals['elevated'], totals['active'], totals['approvals']) == (1, 0, 0, 0)
+    assert statistics.user('alice') == {'requested': 1, 'elevated': 0}
+    assert statistics.approver('bob') == {'approved': 0}
+
+def test_failed_statistics_update_does_not_fail_the_record_write(dynamodb):
+    store = ElevationRequestStore(dynamodb, statistics=ElevationStatistics(dynamodb, table_name='MissingStatistics'))
+    requested = store.create_request('alice', 'org/repo', 1, now=NOW)
+    assert store.mark_elevated('alice', requested['requested_at'], 300, now=NOW, approver='bob')
+
+    assert store.table.get_item(Key={'user': 'alice', 'requested_at': requested['requested_at']})['Item']['status'] == 'elevated'
+
+def test_closed_elevation_is_no_longer_active(store, statistics):
+    requested_at = elevate(store, 'alice', 'bob', 120)
+    assert store.mark_closed('alice', requested_at, 'last_owner', now=NOW)
+    assert store.mark_closed('alice', requested_at, 'last_owner', now=NOW) is False
+
+    assert statistics.totals()['closed'] == 1
+    assert statistics.active_owners() == 0
+    assert store.list_expired(before=NOW_EPOCH + 3600)[0] == []
+
+def test_summary_reports_the_median_approval_time(store, statistics):
+    for number, waited in enumerate([30, 45, 200, 250, 4000]):
+        elevate(store, f"user-{number}", 'bob', waited)
+
+    summary = statistics.summary()
+    assert summary['active_owners'] == 5
+    assert 60 < summary['median_approval_seconds'] <= 300
+    assert summary['mean_approval_seconds'] == 905
+
+def test_median_from_histogram():
+    assert median_from_histogram({}) is None
+    assert median_from_histogram({bucket_name(30): 2}) == 30
+    assert median_from_histogram({bucket_name(10 ** 7): 1}) == 604800
+
+def test_rebuild_matches_the_incremental_counts(dynamodb, store, statistics):
+    requested_at = elevate(store, 'alice', 'bob', 120)
+    elevate(store, 'carol', 'dave', 7200)
+    store.mark_demoted('alice', requested_at, now=NOW + timedelta(hours=1))
+    store.create_request('erin', 'org/repo', 3, now=NOW)
+    incremental = {aggregate: statistics.get(aggregate) for aggregate in ('total', 'day#2024-06-01', 'user#alice', 'approver#dave')}
+    # An aggregate fed only by records that have since expired
+    statistics.table.put_item(Item={'aggregate': 'day#2023-01-01', 'requested': 4})
+    statistics.table.put_item(Item={'aggregate': 'total', 'requested': 99})
+
+    assert statistics.rebuild(ElevationExport(dynamodb, segments=1)) == 7
+
+    assert {aggregate: statistics.get(aggregate) for aggregate in incremental} == incremental
+    assert statistics.day(date(2023, 1, 1)) == {'requested': 4}
+
+def test_rebuild_counts_records_written_before_statistics():
+    counts = StatisticsCounts().write({'user': 'alice', 'requested_at': to_iso(NOW), 'status': 'elevated',
+                                       'elevated_at': to_iso(NOW + timedelta(minutes=2))})
+    assert counts.aggregates['total']['active'] == 1
+    assert 'approver#None' not in counts.aggregates
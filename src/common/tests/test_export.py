@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import boto3
+import pytest
+from datetime import datetime
+from moto import mock_aws
+from unittest.mock import patch
+from common.export import CSV_FIELDS, ElevationExport, ExportCheckpoint, JsonLinesWriter, create_writer, export
+from common.tests.test_store import create_table
+
+def put_requests(dynamodb, count):
+    table = dynamodb.Table('GithubElevationRequests')
+    for number in range(count):
+        table.put_item(Item={'user': f"user-{number % 7}", 'requested_at': f"2024-06-{number % 28 + 1:02d}T12:00:{number % 60:02d}",
+                             'status': 'demoted', 'repo': 'org/repo', 'issue_number': number, 'status_time': 1717243200 + number})
+
+class SegmentedScan:
+    """moto ignores Segment and TotalSegments, so each segment keeps only its share of every page."""
+
+    def __init__(self, client, fail_after=None):
+        self.client = client
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def scan(self, Segment, TotalSegments, **kwargs):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise Exception("connection reset")
+        response = self.client.scan(**kwargs)
+        return dict(response, Items=[item for item in response['Items'] if int(item['user'].split('-')[1]) % TotalSegments == Segment])
+
+def exporter(dynamodb, *args, fail_after=None, **kwargs):
+    export = ElevationExport(dynamodb, *args, **kwargs)
+    export.client = SegmentedScan(export.client, fail_after)
+    return export
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        resource = boto3.resource('dynamodb', region_name='eu-west-2')
+        create_table(resource)
+        yield resource
+
+def exported_lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_export_streams_every_item_once_across_segments(dynamodb):
+    put_requests(dynamodb, 60)
+    stream = io.StringIO()
+
+    assert exporter(dynamodb, segments=3, page_size=7).run(JsonLinesWriter(stream)) == 60
+
+    items = exported_lines(stream)
+    assert len({(item['user'], item['requested_at']) for item in items}) == 60
+    assert all(isinstance(item['issue_number'], int) for item in items)
+
+def test_export_filters_by_requested_at(dynamodb):
+    put_requests(dynamodb, 28)
+    stream = io.StringIO()
+
+    exported = exporter(dynamodb, segments=2).run(JsonLinesWriter(stream), start=datetime(2024, 6, 10), end='2024-06-12T23:59:59')
+
+    assert exported == 3
+    assert sorted(item['requested_at'][:10] for item in exported_lines(stream)) == ['2024-06-10', '2024-06-11', '2024-06-12']
+
+def test_csv_export_writes_the_audit_columns(dynamodb):
+    put_requests(dynamodb, 3)
+    stream = io.StringIO()
+
+    exporter(dynamodb, segments=2).run(create_writer(stream, 'csv'))
+
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert list(rows[0]) == CSV_FIELDS
+    assert sorted(row['issue_number'] for row in rows) == ['0', '1', '2']
+
+def test_export_resumes_from_its_checkpoint(dynamodb, tmp_path):
+    put_requests(dynamodb, 40)
+    output, checkpoint_path = tmp_path / 'export.jsonl', str(tmp_path / 'export.checkpoint')
+    with patch('common.export.ElevationExport', side_effect=lambda *args: exporter(*args, fail_after=3)), \
+        pytest.raises(Exception, match="connection reset"):
+        export(dynamodb, str(output), checkpoint_path=checkpoint_path, segments=2, page_size=5)
+    assert 0 < ExportCheckpoint.load(checkpoint_path, 2, {'start': None, 'end': None}).exported < 40
+
+    with patch('common.export.ElevationExport', side_effect=exporter):
+        assert export(dynamodb, str(output), checkpoint_path=checkpoint_path, segments=2, page_size=5) == 40
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(lines) == 40
+    assert len({(item['user'], item['requested_at']) for item in lines}) == 40
+
+def test_checkpoint_for_another_export_is_rejected(tmp_path):
+    path = str(tmp_path / 'export.checkpoint')
+    ExportCheckpoint(2, {'start': None, 'end': None}, path).save()
+    with pytest.raises(ValueError):
+        ExportCheckpoint.load(path, 4, {'start': None, 'end': None})
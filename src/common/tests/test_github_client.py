@@ -0,0 +1,162 @@
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from common import github_client
+from common.github_client import GitHubClient, create_session, get_shared_session, DEFAULT_TIMEOUT
+from common.rate_limits import RateLimitExceeded
+
+AUTH_HEADERS = {"Authorization": "Bearer token"}
+
+@pytest.fixture
+def client():
+    return GitHubClient(lambda: AUTH_HEADERS, session=MagicMock())
+
+def test_create_session_sets_pool_and_default_headers():
+    session = create_session(pool_maxsize=4)
+    adapter = session.get_adapter("https://api.github.com")
+    assert adapter._pool_maxsize == 4
+    assert session.headers["Accept"] == "application/vnd.github.v3+json"
+
+def test_shared_session_is_reused(monkeypatch):
+    monkeypatch.setattr(github_client, '_shared_session', None)
+    assert get_shared_session() is get_shared_session()
+    assert GitHubClient(lambda: AUTH_HEADERS).session is get_shared_session()
+
+def test_clients_on_the_shared_session_share_quota_and_etags(monkeypatch):
+    monkeypatch.setattr(github_client, '_shared_rate_limits', None)
+    monkeypatch.setattr(github_client, '_shared_etags', None)
+    first, second = GitHubClient(lambda: AUTH_HEADERS), GitHubClient(lambda: AUTH_HEADERS)
+    assert first.rate_limits is second.rate_limits
+    assert first.etags is second.etags
+    assert GitHubClient(lambda: AUTH_HEADERS, session=MagicMock()).rate_limits is not first.rate_limits
+
+def test_get_prefixes_api_url_and_sends_auth_and_timeout(client):
+    client.get("/orgs/org/teams/team")
+    client.session.get.assert_called_once_with(
+        "https://api.github.com/orgs/org/teams/team",
+        headers=AUTH_HEADERS,
+        timeout=DEFAULT_TIMEOUT
+    )
+
+def test_auth_headers_are_read_per_request():
+    headers = {"Authorization": "Bearer first"}
+    client = GitHubClient(lambda: headers, session=MagicMock())
+    client.get("/one")
+    headers = {"Authorization": "Bearer second"}
+    client.get("/two")
+    assert client.session.get.call_args_list[1][1]['headers'] == {"Authorization": "Bearer second"}
+
+def test_post_comment(client):
+    client.session.post.return_value.status_code = 201
+    response = client.post_comment("org/repo", 1, "Test comment")
+    assert response is client.session.post.return_value
+    client.session.post.assert_called_once_with(
+        "https://api.github.com/repos/org/repo/issues/1/comments",
+        headers=AUTH_HEADERS,
+        timeout=DEFAULT_TIMEOUT,
+        json={"body": "Test comment"}
+    )
+
+def test_post_comment_http_error(client, capfd):
+    client.session.post.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError("Not Found")
+    assert client.post_comment("org/repo", 1, "Test comment") is None
+    out = capfd.readouterr().out
+    assert '"message": "HTTP error occurred"' in out and '"error": "Not Found"' in out
+
+def test_post_comment_connection_error(client, capfd):
+    client.session.post.side_effect = requests.exceptions.ConnectionError("reset")
+    assert client.post_comment("org/repo", 1, "Test comment") is None
+    out = capfd.readouterr().out
+    assert '"message": "Other error occurred"' in out and '"error": "reset"' in out
+
+def test_close_issue(client):
+    client.close_issue("org/repo", 1)
+    client.session.patch.assert_called_once_with(
+        "https://api.github.com/repos/org/repo/issues/1",
+        headers=AUTH_HEADERS,
+        timeout=DEFAULT_TIMEOUT,
+        json={"state": "closed"}
+    )
+
+def test_set_org_membership_role(client):
+    client.set_org_membership_role("org", "user", "member")
+    client.session.put.assert_called_once_with(
+        "https://api.github.com/orgs/org/memberships/user",
+        headers=AUTH_HEADERS,
+        timeout=DEFAULT_TIMEOUT,
+        json={"role": "member"}
+    )
+
+def test_session_is_created_on_first_use():
+    with patch('common.github_client.get_shared_session') as mock_get_shared_session:
+        client = GitHubClient(lambda: AUTH_HEADERS)
+        mock_get_shared_session.assert_not_called()
+        assert client.session is mock_get_shared_session.return_value
+        assert client.session is mock_get_shared_session.return_value
+        mock_get_shared_session.assert_called_once()
+
+def github_response(status_code=200, headers=None, body=None):
+    resp = MagicMock(status_code=status_code, headers=headers or {})
+    resp.json.return_value = body or {}
+    return resp
+
+def test_get_revalidates_cached_etag_and_returns_cached_response_on_304():
+    session = MagicMock()
+    first = github_response(headers={"ETag": '"abc"'}, body={"state": "active"})
+    session.get.side_effect = [first, github_response(304)]
+    client = GitHubClient(lambda: AUTH_HEADERS, session=session)
+    client.get("/orgs/org/teams/team/memberships/user")
+    with patch('common.github_client.metrics') as mock_metrics:
+        assert client.get("/orgs/org/teams/team/memberships/user") is first
+    assert session.get.call_args_list[1][1]['headers'] == {**AUTH_HEADERS, "If-None-Match": '"abc"'}
+    mock_metrics.increment.assert_called_once_with("github:NotModified")
+
+def test_etags_are_cached_per_installation():
+    session = MagicMock()
+    session.get.return_value = github_response(headers={"ETag": '"abc"'})
+    installation = {"id": "1"}
+    client = GitHubClient(lambda: AUTH_HEADERS, session=session, installation_provider=lambda: installation["id"])
+    client.get("/orgs/org/members")
+    installation["id"] = "2"
+    client.get("/orgs/org/members")
+    assert session.get.call_args_list[1][1]['headers'] == AUTH_HEADERS
+
+def test_secondary_rate_limit_backs_off_and_retries():
+    session = MagicMock()
+    session.post.side_effect = [github_response(403, headers={"Retry-After": "2"}), github_response(201)]
+    sleep = MagicMock()
+    client = GitHubClient(lambda: AUTH_HEADERS, session=session, sleep=sleep)
+    assert client.post("/repos/org/repo/issues/1/comments", json={"body": "hi"}).status_code == 201
+    sleep.assert_called_once_with(2)
+    assert session.post.call_count == 2
+
+def test_secondary_rate_limit_gives_up_when_retry_after_is_too_long():
+    session = MagicMock()
+    session.get.return_value = github_response(429, headers={"Retry-After": "60"})
+    sleep = MagicMock()
+    client = GitHubClient(lambda: AUTH_HEADERS, session=session, sleep=sleep)
+    assert client.get("/orgs/org/members").status_code == 429
+    sleep.assert_not_called()
+
+def test_secondary_rate_limit_stops_after_max_retries():
+    session = MagicMock()
+    session.get.return_value = github_response(429)
+    client = GitHubClient(lambda: AUTH_HEADERS, session=session, max_retries=2, sleep=MagicMock())
+    client.get("/orgs/org/members")
+    assert session.get.call_count == 3
+
+def test_exhausted_primary_limit_raises_and_short_circuits_later_calls():
+    session = MagicMock()
+    session.get.return_value = github_response(403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4102444800"})
+    client = GitHubClient(lambda: AUTH_HEADERS, session=session, installation_provider=lambda: "123")
+    with pytest.raises(RateLimitExceeded):
+        client.get("/orgs/org/members")
+    with pytest.raises(RateLimitExceeded):
+        client.get("/orgs/org/members")
+    assert session.get.call_count == 1
+
+def test_graphql_posts_query_and_returns_data(client):
+    client.session.post.return_value = github_response(body={"data": {"organization": None}, "errors": [{"message": "no team"}]})
+    assert client.graphql("query { viewer { login } }", {"org": "org"}) == {"organization": None}
+    assert client.session.post.call_args[0][0] == "https://api.github.com/graphql"
+    assert client.session.post.call_args[1]['json'] == {"query": "query { viewer { login } }", "variables": {"org": "org"}}
@@ -0,0 +1,42 @@
+import io
+import json
+from unittest.mock import MagicMock
+from common.logger import StructuredLogger
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_logs_structured_fields_at_or_above_level():
+    stream = io.StringIO()
+    logger = StructuredLogger(level='INFO', sample_rate=0, stream=stream)
+    logger.start_invocation(MagicMock(aws_request_id='request-1'), function='webhook')
+    logger.debug("hidden")
+    logger.info("Promoted user to owner", user='octocat', status=200)
+
+    records = lines(stream)
+    assert len(records) == 1
+    assert records[0]['level'] == 'INFO'
+    assert records[0]['message'] == "Promoted user to owner"
+    assert records[0]['user'] == 'octocat'
+    assert records[0]['request_id'] == 'request-1'
+    assert records[0]['function'] == 'webhook'
+
+def test_sampled_invocations_log_debug():
+    stream = io.StringIO()
+    sampler = MagicMock(return_value=0.01)
+    logger = StructuredLogger(level='WARNING', sample_rate=0.05, stream=stream, sampler=sampler)
+    logger.start_invocation()
+    logger.debug("detail")
+    sampler.return_value = 0.5
+    logger.start_invocation()
+    logger.debug("detail")
+    logger.info("summary")
+
+    records = lines(stream)
+    assert [record['message'] for record in records] == ["detail"]
+    assert records[0]['sampled'] is True
+
+def test_unknown_level_falls_back_to_info():
+    logger = StructuredLogger(level='LOUD', sample_rate=0)
+    assert logger.is_enabled('INFO')
+    assert not logger.is_enabled('DEBUG')
@@ -0,0 +1,89 @@
+import io
+import json
+import pytest
+import requests
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from common.metrics import InvocationMetrics, error_status
+from common.github_client import operation_name
+
+@pytest.fixture
+def clock():
+    return MagicMock(return_value=10.0)
+
+def test_timed_records_count_duration_and_status(clock):
+    metrics = InvocationMetrics(clock=clock)
+    for _ in range(2):
+        with metrics.timed('github', 'get.orgs.memberships') as call:
+            clock.return_value += 0.25
+            call.status = 200
+    assert metrics.calls() == {('github', 'get.orgs.memberships', '200'): (2, 500.0, 250.0)}
+
+def test_timed_records_error_code_and_reraises(clock):
+    metrics = InvocationMetrics(clock=clock)
+    error = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+    with pytest.raises(ClientError):
+        with metrics.timed('dynamodb', 'PutItem'):
+            raise error
+    assert ('dynamodb', 'PutItem', 'ConditionalCheckFailedException') in metrics.calls()
+
+def test_error_status():
+    response = MagicMock(status_code=502)
+    assert error_status(requests.exceptions.HTTPError("bad gateway", response=response)) == 502
+    assert error_status(requests.exceptions.ConnectionError("reset")) == 'ConnectionError'
+
+def test_flush_emits_one_emf_line_and_resets(clock):
+    stream = io.StringIO()
+    metrics = InvocationMetrics(namespace='Test', clock=clock, stream=stream)
+    metrics.start_invocation()
+    with metrics.timed('ssm', 'GetParameters'):
+        clock.return_value += 0.1
+    clock.return_value += 0.2
+    metrics.flush('webhook')
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    document = json.loads(lines[0])
+    directive = document['_aws']['CloudWatchMetrics'][0]
+    assert directive['Namespace'] == 'Test'
+    assert directive['Dimensions'] == [['Function']]
+    assert {'Name': 'ssm:GetParameters:OK:Count', 'Unit': 'Count'} in directive['Metrics']
+    assert document['Function'] == 'webhook'
+    assert document['ColdStart'] == 1
+    assert document['HandlerDuration'] == pytest.approx(300.0)
+    assert document['ssm:GetParameters:OK:Count'] == 1
+    assert document['ssm:GetParameters:OK:Duration'] == pytest.approx(100.0)
+    assert metrics.calls() == {}
+
+    metrics.flush('webhook')
+    assert json.loads(stream.getvalue().splitlines()[1])['ColdStart'] == 0
+
+def test_init_phase_calls_are_reported_with_the_first_invocation(clock):
+    metrics = InvocationMetrics(clock=clock, stream=io.StringIO())
+    with metrics.timed('ssm', 'GetParameters'):
+        pass
+    metrics.start_invocation()
+    assert metrics.flush('webhook')['ssm:GetParameters:OK:Count'] == 1
+
+    with metrics.timed('ssm', 'GetParameters'):
+        pass
+    metrics.start_invocation()
+    assert 'ssm:GetParameters:OK:Count' not in metrics.flush('webhook')
+
+def test_counters_and_gauges_are_emitted_and_reset(clock):
+    metrics = InvocationMetrics(clock=clock, stream=io.StringIO())
+    metrics.increment('github:NotModified')
+    metrics.increment('github:NotModified')
+    metrics.set_value('github:RateLimitRemaining', 4999)
+    metrics.set_value('github:RateLimitRemaining', 4998)
+    document = metrics.flush('webhook')
+    assert document['github:NotModified'] == 2
+    assert document['github:RateLimitRemaining'] == 4998
+    assert {'Name': 'github:NotModified', 'Unit': 'Count'} in document['_aws']['CloudWatchMetrics'][0]['Metrics']
+    assert metrics.values() == {}
+
+def test_operation_name_drops_identifiers():
+    assert operation_name("PUT", "https://api.github.com/orgs/my-org/memberships/user") == "put.orgs.memberships"
+    assert operation_name("GET", "https://api.github.com/orgs/my-org/teams/team/memberships/user") == "get.orgs.teams.memberships"
+    assert operation_name("POST", "https://api.github.com/repos/org/repo/issues/1/comments") == "post.repos.issues.comments"
+    assert operation_name("GET", "https://api.github.com/orgs/my-org/members?page=2") == "get.orgs.members"
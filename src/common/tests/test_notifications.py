@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+from common.notifications import NotificationBuffer
+
+def test_messages_are_combined_per_issue():
+    github = MagicMock()
+    buffer = NotificationBuffer(github)
+    buffer.add('org/repo', 1, 'first')
+    buffer.add('org/repo', 2, 'other issue')
+    buffer.add('org/repo', 1, 'second')
+
+    buffer.flush()
+
+    assert github.post_comment.call_count == 2
+    github.post_comment.assert_any_call('org/repo', 1, 'first\n\nsecond')
+    github.post_comment.assert_any_call('org/repo', 2, 'other issue')
+    github.close_issue.assert_not_called()
+
+def test_flush_closes_marked_issues():
+    github = MagicMock()
+    buffer = NotificationBuffer(github)
+    buffer.add('org/repo', 1, 'done')
+    buffer.close_issue('org/repo', 1)
+    buffer.close_issue('org/repo', 2)
+
+    buffer.flush()
+
+    github.post_comment.assert_called_once_with('org/repo', 1, 'done')
+    assert github.close_issue.call_count == 2
+
+def test_flush_empties_buffer():
+    github = MagicMock()
+    buffer = NotificationBuffer(github)
+    buffer.add('org/repo', 1, 'message')
+    assert buffer.pending('org/repo', 1) == ['message']
+
+    buffer.flush()
+    buffer.flush()
+
+    github.post_comment.assert_called_once()
+    assert buffer.pending('org/repo', 1) == []
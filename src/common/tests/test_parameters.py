@@ -0,0 +1,105 @@
+import pytest
+import threading
+from unittest.mock import MagicMock
+from common.parameters import ParameterLoader
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def ssm_response(values, version=1, invalid=None):
+    return {
+        'Parameters': [{'Name': name, 'Value': value, 'Version': version} for name, value in values.items()],
+        'InvalidParameters': invalid or []
+    }
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_get_loads_all_names_in_one_call(clock):
+    ssm_client = MagicMock()
+    ssm_client.get_parameters.return_value = ssm_response({'/a': 'one', '/b': 'two'})
+    loader = ParameterLoader(ssm_client, ['/a', '/b'], clock=clock)
+
+    assert loader.get('/a') == 'one'
+    assert loader.get('/b') == 'two'
+    ssm_client.get_parameters.assert_called_once_with(Names=['/a', '/b'], WithDecryption=True)
+
+def test_names_are_chunked_by_ten(clock):
+    names = [f"/p{i}" for i in range(12)]
+    ssm_client = MagicMock()
+    ssm_client.get_parameters.side_effect = [
+        ssm_response({name: name for name in names[:10]}),
+        ssm_response({name: name for name in names[10:]}),
+    ]
+    loader = ParameterLoader(ssm_client, names, clock=clock)
+
+    assert loader.get_all() == {name: name for name in names}
+    assert ssm_client.get_parameters.call_count == 2
+
+def test_missing_parameters_raise(clock):
+    ssm_client = MagicMock()
+    ssm_client.get_parameters.return_value = ssm_response({'/a': 'one'}, invalid=['/b'])
+    loader = ParameterLoader(ssm_client, ['/a', '/b'], clock=clock)
+
+    with pytest.raises(KeyError):
+        loader.get('/a')
+
+def test_refresh_only_replaces_changed_versions(clock):
+    ssm_client = MagicMock()
+    ssm_client.get_parameters.side_effect = [
+        ssm_response({'/a': 'one', '/b': 'two'}),
+        {'Parameters': [
+            {'Name': '/a', 'Value': 'one', 'Version': 1},
+            {'Name': '/b', 'Value': 'rotated', 'Version': 2},
+        ]},
+    ]
+    loader = ParameterLoader(ssm_client, ['/a', '/b'], clock=clock)
+    loader.refresh()
+
+    assert loader.refresh() == {'/b'}
+    assert loader.get('/b') == 'rotated'
+    assert loader.version('/b') == 2
+
+def test_stale_values_are_served_while_refreshing_in_background(clock):
+    release = threading.Event()
+
+    responses = [ssm_response({'/a': 'one'}), ssm_response({'/a': 'two'}, version=2)]
+
+    def get_parameters(**_kwargs):
+        if len(responses) == 1:
+            release.wait(timeout=5)
+        return responses.pop(0)
+
+    ssm_client = MagicMock()
+    ssm_client.get_parameters.side_effect = get_parameters
+    loader = ParameterLoader(ssm_client, ['/a'], ttl_seconds=60, clock=clock)
+    loader.get('/a')
+
+    clock.now += 30
+    assert loader.get('/a') == 'one'
+    assert ssm_client.get_parameters.call_count == 1
+
+    clock.now += 30
+    assert loader.get('/a') == 'one'
+    assert loader.get('/a') == 'one'
+    release.set()
+    loader._thread.join()
+    assert loader.get('/a') == 'two'
+    assert ssm_client.get_parameters.call_count == 2
+
+def test_background_refresh_failure_keeps_cached_values(clock, capfd):
+    ssm_client = MagicMock()
+    ssm_client.get_parameters.side_effect = [ssm_response({'/a': 'one'}), Exception("throttled")]
+    loader = ParameterLoader(ssm_client, ['/a'], ttl_seconds=60, clock=clock)
+    loader.get('/a')
+
+    clock.now += 60
+    loader.refresh_in_background().join()
+
+    assert loader.get('/a') == 'one'
+    assert "Background parameter refresh failed" in capfd.readouterr().out
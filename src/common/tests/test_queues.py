@@ -0,0 +1,55 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from common.queues import DeliveryQueue, InMemoryQueue, LocalFileQueue, SqsQueue, create_queue
+
+@pytest.fixture(params=['memory', 'file'])
+def queue(request, tmp_path):
+    return InMemoryQueue() if request.param == 'memory' else LocalFileQueue(str(tmp_path / 'queue'))
+
+def test_messages_are_received_in_order_and_batched(queue):
+    for number in range(12):
+        queue.send({'number': number})
+    first = queue.receive()
+    assert [message.body['number'] for message in first] == list(range(10))
+    assert [message.body['number'] for message in queue.receive()] == [10, 11]
+    assert queue.receive() == []
+
+def test_received_messages_are_not_redelivered_until_released(queue):
+    queue.send({'number': 1})
+    message = queue.receive()[0]
+    assert queue.receive() == []
+    queue.release(message.receipt)
+    assert queue.receive()[0].body == {'number': 1}
+
+def test_deleted_messages_are_gone(queue):
+    queue.send({'number': 1})
+    queue.delete(queue.receive()[0].receipt)
+    assert queue.receive() == []
+
+def test_local_file_queue_survives_reopening(tmp_path):
+    LocalFileQueue(str(tmp_path)).send({'number': 1})
+    assert LocalFileQueue(str(tmp_path)).receive()[0].body == {'number': 1}
+
+def test_sqs_queue_sends_json_bodies():
+    sqs_client = MagicMock()
+    sqs_client.receive_message.return_value = {'Messages': [{'ReceiptHandle': 'r-1', 'Body': '{"number": 1}'}]}
+    queue = SqsQueue(sqs_client, 'https://sqs.example/queue')
+    queue.send({'number': 1})
+    assert json.loads(sqs_client.send_message.call_args[1]['MessageBody']) == {'number': 1}
+    message = queue.receive()[0]
+    assert (message.receipt, message.body) == ('r-1', {'number': 1})
+    queue.delete('r-1')
+    sqs_client.delete_message.assert_called_once_with(QueueUrl='https://sqs.example/queue', ReceiptHandle='r-1')
+
+def test_create_queue_picks_implementation_from_url(tmp_path):
+    assert isinstance(create_queue('memory://'), InMemoryQueue)
+    assert isinstance(create_queue(f"file://{tmp_path}"), LocalFileQueue)
+
+def test_delivery_queue_requires_send_receive_and_delete():
+    class SendOnly(DeliveryQueue):
+        def send(self, body):
+            pass
+
+    with pytest.raises(TypeError):
+        SendOnly()
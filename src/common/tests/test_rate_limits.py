@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from common.rate_limits import RateLimitTracker, RateLimitExceeded, backoff_delay, is_secondary_rate_limit
+
+def response(status_code=200, headers=None, body=None):
+    resp = MagicMock(status_code=status_code, headers=headers or {})
+    resp.json.return_value = body or {}
+    return resp
+
+def quota(remaining, reset_at=2000, limit=5000):
+    return {'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Limit': str(limit), 'X-RateLimit-Reset': str(reset_at)}
+
+@pytest.mark.parametrize("status_code, headers, body, expected", [
+    (429, {}, {}, True),
+    (403, {'Retry-After': '3'}, {}, True),
+    (403, {}, {'message': 'You have exceeded a secondary rate limit.'}, True),
+    (403, {}, {'message': 'Resource not accessible by integration'}, False),
+    (500, {}, {}, False),
+])
+def test_is_secondary_rate_limit(status_code, headers, body, expected):
+    assert is_secondary_rate_limit(response(status_code, headers, body)) is expected
+
+def test_backoff_delay_prefers_retry_after():
+    assert backoff_delay(0, retry_after=7) == 7
+
+def test_backoff_delay_is_jittered_and_capped():
+    assert backoff_delay(1, rand=lambda: 0.5) == 1.0
+    assert backoff_delay(10, rand=lambda: 1.0) == 5.0
+
+def test_update_records_remaining_quota():
+    tracker = RateLimitTracker()
+    with patch('common.rate_limits.metrics') as mock_metrics:
+        tracker.update('123', response(headers=quota(42)))
+    assert tracker.remaining('123') == 42
+    mock_metrics.set_value.assert_called_once_with('github:RateLimitRemaining', 42)
+
+def test_update_ignores_responses_without_quota_headers():
+    tracker = RateLimitTracker()
+    tracker.update('123', response())
+    assert tracker.remaining('123') is None
+
+def test_check_raises_when_exhausted_before_reset():
+    tracker = RateLimitTracker(clock=lambda: 1000)
+    tracker.update('123', response(headers=quota(0, reset_at=2000)))
+    with patch('common.rate_limits.metrics') as mock_metrics, pytest.raises(RateLimitExceeded) as exc:
+        tracker.check('123')
+    assert exc.value.reset_at == 2000
+    mock_metrics.increment.assert_called_once_with('github:RateLimitExhausted')
+
+def test_check_forgets_quota_after_reset():
+    tracker = RateLimitTracker(clock=lambda: 3000)
+    tracker.update('123', response(headers=quota(0, reset_at=2000)))
+    tracker.check('123')
+    assert tracker.remaining('123') is None
+
+def test_installations_are_tracked_separately():
+    tracker = RateLimitTracker(clock=lambda: 1000)
+    tracker.update('123', response(headers=quota(0)))
+    tracker.check('456')
@@ -0,0 +1,88 @@
+import pytest
+from unittest.mock import MagicMock, patch
+import requests
+from common.runtime import RuntimeContext, keeps_warm_state
+from common.rate_limits import RateLimitExceeded
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_get_builds_once_while_fresh(clock):
+    factory = MagicMock(side_effect=[object(), object()])
+    context = RuntimeContext(factory, ttl_seconds=60, clock=clock)
+
+    first = context.get()
+    clock.now += 59
+    second = context.get()
+
+    assert first is second
+    factory.assert_called_once()
+
+def test_get_rebuilds_after_ttl(clock):
+    factory = MagicMock(side_effect=['first', 'second'])
+    context = RuntimeContext(factory, ttl_seconds=60, clock=clock)
+
+    assert context.get() == 'first'
+    clock.now += 60
+    assert context.get() == 'second'
+    assert factory.call_count == 2
+
+def test_invalidate_forces_rebuild(clock):
+    factory = MagicMock(side_effect=['first', 'second'])
+    context = RuntimeContext(factory, ttl_seconds=60, clock=clock)
+
+    context.get()
+    context.invalidate()
+
+    assert context.is_expired()
+    assert context.get() == 'second'
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code} Error", response=response)
+
+@pytest.mark.parametrize("err, kept", [
+    (RateLimitExceeded('4001', 1717243200), True),
+    (http_error(502), True),
+    (http_error(401), False),
+    (KeyError('private_key'), False),
+])
+def test_invalidate_after_keeps_state_for_errors_it_does_not_cause(clock, err, kept):
+    context = RuntimeContext(MagicMock(return_value='value'), clock=clock)
+    context.get()
+
+    assert keeps_warm_state(err) == kept
+    assert context.invalidate_after(err) == (not kept)
+    assert context.is_expired() == (not kept)
+
+def test_prewarm_outside_lambda_does_nothing(clock):
+    factory = MagicMock()
+    context = RuntimeContext(factory, clock=clock)
+    with patch.dict('os.environ', {}, clear=True):
+        context.prewarm()
+    factory.assert_not_called()
+
+def test_prewarm_in_lambda_builds(clock):
+    factory = MagicMock(return_value='value')
+    context = RuntimeContext(factory, clock=clock)
+    with patch.dict('os.environ', {'AWS_LAMBDA_FUNCTION_NAME': 'fn'}):
+        context.prewarm()
+    assert context.get() == 'value'
+    factory.assert_called_once()
+
+def test_prewarm_failure_is_swallowed(clock, capfd):
+    factory = MagicMock(side_effect=[Exception("boom"), 'value'])
+    context = RuntimeContext(factory, clock=clock)
+    with patch.dict('os.environ', {'AWS_LAMBDA_FUNCTION_NAME': 'fn'}):
+        context.prewarm()
+    assert "Prewarm failed" in capfd.readouterr().out
+    assert context.get() == 'value'
@@ -1,7 +1,9 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from unittest.mock import patch, MagicMock
-from common.shared_functions import GitHubAuth
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from common.github_client import DEFAULT_TIMEOUT
+from common.shared_functions import GitHubAuth, parse_github_timestamp, get_event_installation_id
 
 @pytest.fixture
 def github_auth():
@@ -14,7 +16,8 @@ def test_init(github_auth):
 
 @pytest.mark.parametrize("current_time", [1600000000])
 def test_generate_jwt(github_auth, current_time):
-    with patch('time.time', return_value=current_time):
+    with patch('time.time', return_value=current_time), \
+        patch.object(GitHubAuth, '_get_signing_key', return_value="parsed_key"):
         with patch('jwt.encode', return_value="mocked_jwt_token") as mock_jwt_encode:
             jwt_token = github_auth.generate_jwt()
 
@@ -29,7 +32,7 @@ def test_generate_jwt(github_auth, current_time):
 
 def test_get_access_token(github_auth):
     with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"):
-        with patch('requests.post') as mock_post:
+        with patch.object(github_auth.session, 'post') as mock_post:
             mock_response = MagicMock()
             mock_response.json.return_value = {"token": "mocked_access_token"}
             mock_post.return_value = mock_response
@@ -42,3 +45,115 @@ def test_get_access_token(github_auth):
             assert args[0] == f"https://api.github.com/app/installations/{github_auth.installation_id}/access_tokens"
             assert kwargs['headers']["Authorization"] == "Bearer mocked_jwt_token"
             assert kwargs['headers']["Accept"] == "application/vnd.github.v3+json"
+            assert kwargs['timeout'] == DEFAULT_TIMEOUT
+
+def token_response(token, expires_at=None):
+    mock_response = MagicMock()
+    body = {"token": token}
+    if expires_at:
+        body["expires_at"] = expires_at
+    mock_response.json.return_value = body
+    return mock_response
+
+def test_parse_github_timestamp():
+    assert parse_github_timestamp("2020-09-13T12:26:40Z") == 1600000000
+
+def test_get_access_token_is_cached_until_near_expiry(github_auth):
+    # 2020-09-13T13:26:40Z is 1600003600, an hour after 1600000000
+    with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"), \
+        patch.object(github_auth.session, 'post') as mock_post, \
+        patch('time.time') as mock_time:
+        mock_post.side_effect = [
+            token_response("first_token", "2020-09-13T13:26:40Z"),
+            token_response("second_token", "2020-09-13T14:26:40Z"),
+        ]
+
+        mock_time.return_value = 1600000000
+        assert github_auth.get_access_token() == "first_token"
+
+        mock_time.return_value = 1600000000 + 54 * 60
+        assert github_auth.get_access_token() == "first_token"
+        assert mock_post.call_count == 1
+
+        mock_time.return_value = 1600000000 + 55 * 60
+        assert github_auth.get_access_token() == "second_token"
+        assert mock_post.call_count == 2
+
+def test_get_access_token_without_expires_at_assumes_one_hour(github_auth):
+    with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"), \
+        patch.object(github_auth.session, 'post', side_effect=[token_response("first_token"), token_response("second_token")]) as mock_post, \
+        patch('time.time') as mock_time:
+        mock_time.return_value = 1600000000
+        github_auth.get_access_token()
+        mock_time.return_value = 1600000000 + 50 * 60
+        assert github_auth.get_access_token() == "first_token"
+        mock_time.return_value = 1600000000 + 56 * 60
+        assert github_auth.get_access_token() == "second_token"
+        assert mock_post.call_count == 2
+
+def test_get_access_token_is_cached_per_installation(github_auth):
+    with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"), \
+        patch.object(github_auth.session, 'post', side_effect=[token_response("default_token"), token_response("other_token")]) as mock_post:
+        assert github_auth.get_access_token() == "default_token"
+        assert github_auth.get_access_token("11111") == "other_token"
+        assert github_auth.get_access_token() == "default_token"
+        assert github_auth.get_access_token("11111") == "other_token"
+        assert mock_post.call_count == 2
+        assert mock_post.call_args_list[1][0][0] == "https://api.github.com/app/installations/11111/access_tokens"
+
+def test_get_access_token_treats_int_and_str_ids_alike(github_auth):
+    with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"), \
+        patch.object(github_auth.session, 'post', side_effect=[token_response("payload_token")]) as mock_post:
+        assert github_auth.get_access_token(11111) == "payload_token"
+        assert github_auth.get_access_token("11111") == "payload_token"
+        assert mock_post.call_count == 1
+
+def test_get_installation_id_is_looked_up_once_per_organization(github_auth):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"id": 22222}
+    with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"), \
+        patch.object(github_auth.session, 'get', return_value=response) as mock_get:
+        assert github_auth.get_installation_id("Org") == "22222"
+        assert github_auth.get_installation_id("org") == "22222"
+        mock_get.assert_called_once()
+        assert mock_get.call_args[0][0] == "https://api.github.com/orgs/Org/installation"
+        assert mock_get.call_args[1]['headers']['Authorization'] == "Bearer mocked_jwt_token"
+
+def test_get_event_installation_id():
+    assert get_event_installation_id({'installation': {'id': 33333}}) == 33333
+    assert get_event_installation_id({}) is None
+
+def test_invalidate_access_token(github_auth):
+    with patch.object(GitHubAuth, 'generate_jwt', return_value="mocked_jwt_token"), \
+        patch.object(github_auth.session, 'post', side_effect=[token_response("first_token"), token_response("second_token")]):
+        github_auth.get_access_token()
+        github_auth.invalidate_access_token()
+        assert github_auth.get_access_token() == "second_token"
+
+def test_generate_jwt_is_reused_until_near_expiry(github_auth):
+    with patch.object(GitHubAuth, '_get_signing_key', return_value="parsed_key"), \
+        patch('jwt.encode', side_effect=["first_jwt", "second_jwt"]) as mock_jwt_encode, \
+        patch('time.time') as mock_time:
+        mock_time.return_value = 1600000000
+        assert github_auth.generate_jwt() == "first_jwt"
+        mock_time.return_value = 1600000000 + 8 * 60
+        assert github_auth.generate_jwt() == "first_jwt"
+        mock_time.return_value = 1600000000 + 9 * 60
+        assert github_auth.generate_jwt() == "second_jwt"
+        assert mock_jwt_encode.call_count == 2
+
+def test_private_key_is_parsed_once():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode('utf-8')
+    auth = GitHubAuth(pem, "12345", "67890")
+    with patch('cryptography.hazmat.primitives.serialization.load_pem_private_key', wraps=serialization.load_pem_private_key) as mock_load, \
+        patch('time.time') as mock_time:
+        mock_time.return_value = 1600000000
+        auth.generate_jwt()
+        mock_time.return_value = 1600000000 + 20 * 60
+        auth.generate_jwt()
+        mock_load.assert_called_once()
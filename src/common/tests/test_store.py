@@ -0,0 +1,148 @@
+import boto3
+import pytest
+from moto import mock_aws
+from datetime import datetime, timezone
+from common.store import ElevationRequestStore, STATUS_INDEX_NAME, RECORD_TTL_SECONDS, to_epoch, status_time_for
+
+NOW = datetime(2020, 9, 13, 12, 26, 40, tzinfo=timezone.utc)
+
+def create_table(dynamodb):
+    return dynamodb.create_table(
+        TableName='GithubElevationRequests',
+        KeySchema=[{'AttributeName': 'user', 'KeyType': 'HASH'}, {'AttributeName': 'requested_at', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'user', 'AttributeType': 'S'},
+            {'AttributeName': 'requested_at', 'AttributeType': 'S'},
+            {'AttributeName': 'status', 'AttributeType': 'S'},
+            {'AttributeName': 'status_time', 'AttributeType': 'N'},
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': STATUS_INDEX_NAME,
+            'KeySchema': [{'AttributeName': 'status', 'KeyType': 'HASH'}, {'AttributeName': 'status_time', 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+@pytest.fixture
+def store():
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='eu-west-2')
+        create_table(dynamodb)
+        yield ElevationRequestStore(dynamodb)
+
+def put(store, user, status, status_time, requested_at='2024-06-01T12:00:00'):
+    store.table.put_item(Item={'user': user, 'requested_at': requested_at, 'status': status, 'status_time': status_time})
+
+def test_to_epoch_treats_naive_strings_as_utc():
+    assert to_epoch('2020-09-13T12:26:40') == 1600000000
+    assert to_epoch('2020-09-13T13:26:40+01:00') == 1600000000
+
+def test_status_time_for_legacy_records():
+    assert status_time_for({'status': 'pending', 'requested_at': '2020-09-13T12:26:40'}, 300) == 1600000000
+    assert status_time_for({'status': 'elevated', 'elevated_at': '2020-09-13T12:26:40'}, 300) == 1600000300
+    assert status_time_for({'status': 'demoted', 'demoted_at': '2020-09-13T12:26:40'}, 300) == 1600000000
+    assert status_time_for({'status': 'elevated'}, 300) is None
+
+def test_list_active_and_expired(store):
+    put(store, 'expired', 'elevated', 1000)
+    put(store, 'boundary', 'elevated', 2000)
+    put(store, 'active', 'elevated', 3000)
+    put(store, 'pending', 'pending', 1500)
+
+    active, _ = store.list_active(now=2000)
+    expired, _ = store.list_expired(before=2000)
+
+    assert [item['user'] for item in active] == ['active']
+    assert sorted(item['user'] for item in expired) == ['boundary', 'expired']
+
+def test_list_pending_by_time_range(store):
+    for index, status_time in enumerate([100, 200, 300]):
+        put(store, f"user-{index}", 'pending', status_time)
+
+    items, _ = store.list_pending(start=150, end=300)
+
+    assert [item['user'] for item in items] == ['user-1', 'user-2']
+
+def test_query_by_status_paginates(store):
+    for index in range(5):
+        put(store, f"user-{index}", 'elevated', index)
+
+    first_page, last_key = store.list_expired(before=10, limit=2)
+    assert len(first_page) == 2 and last_key
+    assert len(list(store.iter_expired(before=10, page_size=2))) == 5
+
+def test_backfill_adds_numeric_attributes_once(store):
+    store.table.put_item(Item={'user': 'legacy', 'requested_at': '2020-09-13T12:20:00', 'elevated_at': '2020-09-13T12:26:40', 'status': 'elevated'})
+    store.table.put_item(Item={'user': 'unknown', 'requested_at': '2020-09-13T12:20:00', 'status': 'elevated'})
+
+    assert store.backfill(300, now=1600000000) == 1
+    assert store.backfill(300, now=1600000000) == 0
+
+    item = store.table.get_item(Key={'user': 'legacy', 'requested_at': '2020-09-13T12:20:00'})['Item']
+    assert item['expires_at'] == 1600000300
+    assert item['status_time'] == 1600000300
+    assert item['requested_epoch'] == 1599999600
+    assert [item['user'] for item in store.list_expired(before=1600000300)[0]] == ['legacy']
+
+def test_backfill_closes_legacy_elevations_that_have_expired(store):
+    # The baseline demotion never updated the record, so a demoted user still reads as elevated
+    store.table.put_item(Item={'user': 'legacy', 'requested_at': '2020-09-13T12:20:00', 'issue_number': 1,
+                               'repo': 'org/repo', 'elevated_at': '2020-09-13T12:26:40', 'status': 'elevated'})
+
+    assert store.backfill(300, now=1600003600) == 1
+
+    item = store.table.get_item(Key={'user': 'legacy', 'requested_at': '2020-09-13T12:20:00'})['Item']
+    assert (item['status'], item['close_reason'], item['closed_at']) == ('closed', 'legacy', '2020-09-13T13:26:40')
+    assert item['status_time'] == 1600003600
+    assert item['expires_at'] == 1600000300
+    assert list(store.iter_expired(before=1600003600)) == []
+
+def test_create_request_sets_numeric_attributes_and_ttl(store):
+    item = store.create_request('user', 'org/repo', 1, now=NOW)
+    stored = store.table.get_item(Key={'user': 'user', 'requested_at': '2020-09-13T12:26:40'})['Item']
+    assert stored == item
+    assert stored['status'] == 'pending'
+    assert stored['status_time'] == 1600000000
+    assert stored['ttl'] == 1600000000 + RECORD_TTL_SECONDS
+
+def test_get_latest_request_reads_one_projected_item(store):
+    store.table.put_item(Item={'user': 'user', 'requested_at': '2024-01-01T00:00:00', 'status': 'demoted', 'big': 'x' * 100})
+    store.table.put_item(Item={'user': 'user', 'requested_at': '2024-02-01T00:00:00', 'status': 'pending', 'big': 'x' * 100})
+
+    latest = store.get_latest_request('user')
+
+    assert latest['requested_at'] == '2024-02-01T00:00:00'
+    assert 'big' not in latest
+    assert store.get_latest_request('nobody') is None
+
+def test_transitions_are_conditional(store):
+    item = store.create_request('user', 'org/repo', 1, now=NOW)
+
+    assert store.mark_demoted('user', item['requested_at']) == False
+    assert store.mark_elevated('user', item['requested_at'], 300, now=NOW) == True
+    assert store.mark_elevated('user', item['requested_at'], 300, now=NOW) == False
+
+    stored = store.table.get_item(Key={'user': 'user', 'requested_at': item['requested_at']})['Item']
+    assert stored['status'] == 'elevated'
+    assert stored['expires_at'] == 1600000300
+
+    assert store.mark_demoted('user', item['requested_at']) == True
+    stored = store.table.get_item(Key={'user': 'user', 'requested_at': item['requested_at']})['Item']
+    assert stored['status'] == 'demoted'
+
+def test_revert_elevation_makes_the_request_pending_again(store):
+    item = store.create_request('user', 'org/repo', 1, now=NOW)
+    assert store.revert_elevation('user', item['requested_at']) == False
+    store.mark_elevated('user', item['requested_at'], 300, now=NOW, approver='approver')
+
+    assert store.revert_elevation('user', item['requested_at']) == True
+
+    stored = store.table.get_item(Key={'user': 'user', 'requested_at': item['requested_at']})['Item']
+    assert stored['status'] == 'pending'
+    assert stored['status_time'] == item['status_time']
+    assert not {'elevated_at', 'expires_at', 'approver'} & set(stored)
+    assert store.mark_elevated('user', item['requested_at'], 300, now=NOW) == True
+
+def test_transition_on_missing_record_fails(store):
+    assert store.mark_elevated('nobody', '2020-01-01T00:00:00', 300) == False
@@ -1,127 +1,212 @@
 import json
-import boto3
-import requests
-from datetime import datetime
+import itertools
 from common.shared_functions import GitHubAuth, DEFAULT_REGION
+from common.runtime import RuntimeContext
+from common.parameters import ParameterLoader
+from common.github_client import GitHubClient
+from common.notifications import NotificationBuffer
+from common.store import ElevationRequestStore, STATUS_ELEVATED
+from common.elevation_statistics import ElevationStatistics
+from common.elevation_context import fetch_elevation_context, graphql_lookups_enabled
+from common.logger import logger
+from common.metrics import metrics
 import os
 
+FUNCTION_NAME = 'github_permission_manager_demotion'
+
+def get_parameter_names(workspace):
+    return {
+        'app_id': f"/github_permission_manager_webhook/${workspace}_app_id",
+        'private_key': f"/github_permission_manager_webhook/${workspace}_private_key",
+        'installation_id': f"/github_permission_manager_webhook/${workspace}_installation_id",
+    }
+
 def is_last_org_owner(all_owners, user):
     if len(all_owners) == 1 and user in all_owners:
         return True
     return False
 
 class GitHubPermissionRemover:
-    def __init__(self, requests_module=requests):
+    def __init__(self, session=None):
         self.dynamodb = None
+        self.store = None
         self.ssm_client = None
+        self.parameter_loader = None
         self.app_id = None
         self.private_key = None
+        self.default_installation_id = None
         self.installation_id = None
         self.auth_headers = None
-        self.requests = requests_module
+        self.github_auth = None
+        self.github = GitHubClient(lambda: self.auth_headers, session=session, installation_provider=lambda: self.installation_id)
+        self.notifications = NotificationBuffer(self.github)
+        self.use_graphql_lookups = graphql_lookups_enabled()
 
     def initialise_aws_clients(self):
-        self.dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION)
+        import boto3
+        self.dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION, endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL'))
+        self.store = ElevationRequestStore(self.dynamodb, statistics=ElevationStatistics(self.dynamodb))
         self.ssm_client = boto3.client('ssm', region_name=DEFAULT_REGION)
 
-    def get_all_parameters(self):
-        workspace = os.getenv('WORKSPACE')
-        self.app_id = self.get_ssm_parameter(f"/github_permission_manager_webhook/${workspace}_app_id")
-        self.private_key = self.get_ssm_parameter(f"/github_permission_manager_webhook/${workspace}_private_key")
-        self.installation_id = self.get_ssm_parameter(f"/github_permission_manager_webhook/${workspace}_installation_id")
+    def get_all_parameters(self, installation_id=None):
+        names = get_parameter_names(os.getenv('WORKSPACE'))
+        if self.parameter_loader is None:
+            self.parameter_loader = ParameterLoader(self.ssm_client, names.values())
+        credentials = (self.app_id, self.private_key, self.default_installation_id)
+        self.app_id = self.get_ssm_parameter(names['app_id'])
+        self.private_key = self.get_ssm_parameter(names['private_key'])
+        self.default_installation_id = self.get_ssm_parameter(names['installation_id'])
+        if credentials != (self.app_id, self.private_key, self.default_installation_id):
+            self.github_auth = None
+        self.use_installation(installation_id)
+
+    def use_installation(self, installation_id=None):
+        # The installation named by the event; the SSM one only when there is none
+        self.installation_id = str(installation_id) if installation_id else self.default_installation_id
         self.auth_headers = self.get_token_to_access_github()
 
+    def use_organization(self, organization):
+        # The sweeper only knows the organization, so its installation is looked up once
+        try:
+            installation_id = self.github_auth.get_installation_id(organization)
+        except Exception as err:
+            logger.warning("Could not find the App installation, using the default", organization=organization, error=str(err))
+            installation_id = None
+        self.use_installation(installation_id)
+
     def get_token_to_access_github(self):
-        github_auth = GitHubAuth(self.private_key, self.app_id, self.installation_id)
-        access_token = github_auth.get_access_token()
+        if self.github_auth is None:
+            self.github_auth = GitHubAuth(self.private_key, self.app_id, self.default_installation_id, session=self.github.session)
+        access_token = self.github_auth.get_access_token(self.installation_id)
         return {
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/vnd.github.v3+json"
         }
 
     def get_ssm_parameter(self, parameter_name):
-        parameter = self.ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-        return parameter['Parameter']['Value']
+        return self.parameter_loader.get(parameter_name)
 
     def close_issue(self, repository, issue_number):
-        response = self.requests.patch(
-            f"https://api.github.com/repos/{repository}/issues/{issue_number}",
-            headers=self.auth_headers,
-            json={"state": "closed"}
-        )
-        print(f"Issue closed: {response.status_code}")
+        self.github.close_issue(repository, issue_number)
 
     def post_comment_on_issue(self, repository, issue_number, comment_body):
-        data = {
-            "body": comment_body
-        }
-        response = requests.post(
-            f"https://api.github.com/repos/{repository}/issues/{issue_number}/comments",
-            headers=self.auth_headers,
-            json=data
-        )
-        print(f"Comment posted: {response.status_code}")
-
-    def get_all_org_owners(self, organization):
-        response = requests.get(
-            f"https://api.github.com/orgs/{organization}/members?role=admin",
-            headers=self.auth_headers
-        )
-        print(f"Request to get org owners: {response.status_code}")
-        org_owners = [owner['login'] for owner in response.json()]
-        return org_owners
+        self.github.post_comment(repository, issue_number, comment_body)
+
+    def get_org_membership_role(self, organization, user):
+        return self.github.get_org_membership_role(organization, user)
+
+    def get_elevation_context(self, organization, user):
+        # Optional: one GraphQL read for the role and owner checks; REST remains the fallback
+        if not self.use_graphql_lookups:
+            return None
+        try:
+            return fetch_elevation_context(self.github, organization, requester=user)
+        except Exception as err:
+            logger.warning("Elevation context lookup failed, using REST", error=str(err))
+            return None
+
+    def iter_org_owners(self, organization, per_page=100):
+        pages = self.github.iter_pages(f"/orgs/{organization}/members", params={"role": "admin", "per_page": per_page})
+        for page in pages:
+            for owner in page:
+                yield owner['login']
+
+    def get_org_owners(self, organization, limit=None):
+        per_page = min(limit, 100) if limit else 100
+        return list(itertools.islice(self.iter_org_owners(organization, per_page=per_page), limit))
 
 
     def make_member_on_github(self, organization, user):
-        data = {
-            "role": "member"
-        }
-        response = requests.put(
-            f"https://api.github.com/orgs/{organization}/memberships/{user}",
-            headers=self.auth_headers,
-            json=data
-        )
-        print(f"Comment posted: {response.status_code}")
+        response = self.github.set_org_membership_role(organization, user, "member")
+        logger.info("Demoted user to member", organization=organization, user=user, status=response.status_code)
+        # A failed PUT must not be recorded as a demotion
+        response.raise_for_status()
+        return response
+
+    def mark_user_demoted(self, user, requested_at=None):
+        requested_at = requested_at or self._latest_elevated_request(user)
+        return bool(requested_at) and self.store.mark_demoted(user, requested_at)
+
+    def close_user_request(self, user, requested_at, reason):
+        # Ends an elevation that is not demoted so it is not picked up again
+        requested_at = requested_at or self._latest_elevated_request(user)
+        return bool(requested_at) and self.store.mark_closed(user, requested_at, reason)
+
+    def _latest_elevated_request(self, user):
+        # Executions scheduled before requested_at was passed along
+        latest_request = self.store.get_latest_request(user)
+        if not latest_request or latest_request.get('status') != STATUS_ELEVATED:
+            logger.warning("No elevated request found", user=user)
+            return None
+        return latest_request['requested_at']
 
     def demote_user_lambda(self, event, _context):
-        self.initialise_aws_clients()
-        self.get_all_parameters()
-        organization = event.get('organization')
-        user = event.get('user')
+        self.get_all_parameters(event.get('installation_id'))
+        self.notifications = NotificationBuffer(self.github)
         repository = event.get('repository')
         issue_number = event.get('issue_number')
-        org_owners = self.get_all_org_owners(organization)
-        if user not in org_owners:
-            print(f"{user} is not an owner of {organization}")
-            self.post_comment_on_issue(repository, issue_number, "User is not an owner of the organization")
-            self.close_issue(repository, issue_number)
+        try:
+            self._demote_user(event, repository, issue_number)
+        except Exception:
+            # The user may still be an owner, so the issue stays open as the visible record of it
+            self._flush_notifications()
+            raise
+        # One combined comment and the close go out together once the outcome is settled
+        self.notifications.close_issue(repository, issue_number)
+        self.notifications.flush()
+
+    def _flush_notifications(self):
+        try:
+            self.notifications.flush()
+        except Exception as err:
+            logger.error("Failed to post demotion comments", error=str(err))
+
+    def _demote_user(self, event, repository, issue_number):
+        organization = event.get('organization')
+        user = event.get('user')
+        context = self.get_elevation_context(organization, user)
+        if context and context.requester_role_known:
+            role = context.requester_role
+        else:
+            role = self.get_org_membership_role(organization, user)
+        if role != 'admin':
+            logger.info("User is not an owner of the organization", organization=organization, user=user)
+            self.notifications.add(repository, issue_number, "User is not an owner of the organization")
+            self.close_user_request(user, event.get('requested_at'), 'not_owner')
             return
 
-        if is_last_org_owner(org_owners, user):
-            self.post_comment_on_issue(repository, issue_number, "User is the last owner - therefore will not be demoted")
-            self.close_issue(repository, issue_number)
+        # Two owners are enough to know the user is not the last one
+        owners = context.owners if context and context.owners is not None else self.get_org_owners(organization, limit=2)
+        if is_last_org_owner(owners, user):
+            self.notifications.add(repository, issue_number, "User is the last owner - therefore will not be demoted")
+            self.close_user_request(user, event.get('requested_at'), 'last_owner')
             return
 
-        self.post_comment_on_issue(repository, issue_number, "User is currently an owner - demotion to member in progress")
+        self.notifications.add(repository, issue_number, "User is currently an owner - demotion to member in progress")
         self.make_member_on_github(organization, user)
-        self.post_comment_on_issue(repository, issue_number, "User has been demoted")
-        self.close_issue(repository, issue_number)
+        self.mark_user_demoted(user, event.get('requested_at'))
+        self.notifications.add(repository, issue_number, "User has been demoted")
 
-        table = self.dynamodb.Table('GithubElevationRequests')
+def build_permission_remover():
+    github_permission_remover = GitHubPermissionRemover()
+    github_permission_remover.initialise_aws_clients()
+    github_permission_remover.get_all_parameters()
+    return github_permission_remover
 
-        table.update_item(
-            Key={'user': user},
-            UpdateExpression="set #status = :s, demoted_at = :t",
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':s': 'demoted',
-                ':t': datetime.now().isoformat()
-            }
-        )
+runtime_context = RuntimeContext(build_permission_remover)
+runtime_context.prewarm()
 
 def handler(event, context):
-    github_permission_remover = GitHubPermissionRemover()
-    github_permission_remover.demote_user_lambda(event, context)
+    metrics.start_invocation()
+    logger.start_invocation(context, function=FUNCTION_NAME)
+    try:
+        github_permission_remover = runtime_context.get()
+        github_permission_remover.demote_user_lambda(event, context)
+    except Exception as err:
+        runtime_context.invalidate_after(err)
+        raise
+    finally:
+        metrics.flush(FUNCTION_NAME)
 
     return {
         'statusCode': 200,
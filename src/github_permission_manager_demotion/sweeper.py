@@ -0,0 +1,141 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from common.notifications import NotificationBuffer
+from common.store import now_epoch
+from common.concurrency import DEFAULT_MAX_WORKERS
+from common.logger import logger
+from common.metrics import metrics
+from handler import runtime_context
+
+FUNCTION_NAME = 'github_permission_manager_sweeper'
+
+def get_organization(record):
+    return record['repo'].split('/')[0]
+
+def build_result(record, result):
+    return {'user': record['user'], 'requested_at': record['requested_at'], 'result': result}
+
+def plan_demotions(records, owners):
+    # Demote every expired owner in the org, but never the last remaining owner
+    to_demote, results = [], []
+    remaining_owners = set(owners)
+    demoting = set()
+    for record in records:
+        user = record['user']
+        if user in demoting:
+            to_demote.append(record)
+        elif user not in remaining_owners:
+            results.append(build_result(record, 'not_owner'))
+        elif remaining_owners == {user}:
+            results.append(build_result(record, 'last_owner'))
+        else:
+            remaining_owners.discard(user)
+            demoting.add(user)
+            to_demote.append(record)
+    return to_demote, results
+
+class ExpiredElevationSweeper:
+    """Demotes every elevation whose expires_at has passed in one batched pass."""
+
+    def __init__(self, remover, max_workers=DEFAULT_MAX_WORKERS):
+        self.remover = remover
+        self.max_workers = max_workers
+
+    def find_expired(self, now):
+        return self.remover.store.iter_expired(before=now)
+
+    def sweep(self, now=None, dry_run=False):
+        now = now_epoch() if now is None else now
+        by_org = {}
+        for record in self.find_expired(now):
+            by_org.setdefault(get_organization(record), []).append(record)
+        if not by_org:
+            return []
+
+        self.remover.get_all_parameters()
+        results = []
+        for organization, records in by_org.items():
+            try:
+                results.extend(self._sweep_organization(organization, records, dry_run))
+            except Exception as err:
+                # One org the App cannot reach must not hold back the orgs after it
+                logger.error("Failed to sweep organization", organization=organization, error=str(err))
+                results.extend(build_result(record, 'failed') for record in records)
+        return results
+
+    def _sweep_organization(self, organization, records, dry_run):
+        # One installation token and one owner snapshot per org; its comments go out
+        # before the next org's token replaces it
+        self.remover.use_organization(organization)
+        self.remover.notifications = NotificationBuffer(self.remover.github)
+        owners = self.remover.get_org_owners(organization)
+        to_demote, results = plan_demotions(records, owners)
+        if dry_run:
+            return results + [build_result(record, 'would_demote') for record in to_demote]
+
+        members = list(dict.fromkeys((organization, record['user']) for record in to_demote))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = dict(zip(members, executor.map(self._demote, members)))
+        for record in to_demote:
+            results.append(self._record_result(record, responses[(organization, record['user'])]))
+        self._close_undemoted(results)
+        self._notify(records, results)
+        self.remover.notifications.flush()
+        return results
+
+    def _demote(self, member):
+        organization, user = member
+        try:
+            return self.remover.make_member_on_github(organization, user)
+        except Exception as err:
+            logger.error("Failed to demote user", organization=organization, user=user, error=str(err))
+            return None
+
+    def _record_result(self, record, response):
+        if response is None or not response.ok:
+            return build_result(record, 'failed')
+        # DynamoDB updates stay on this thread; boto3 resources are not thread safe
+        self.remover.mark_user_demoted(record['user'], record['requested_at'])
+        return build_result(record, 'demoted')
+
+    def _close_undemoted(self, results):
+        # Leaving these elevated would repeat their comment and close on every sweep
+        for result in results:
+            if result['result'] in ('not_owner', 'last_owner'):
+                self.remover.close_user_request(result['user'], result['requested_at'], result['result'])
+
+    def _notify(self, records, results):
+        messages = {
+            'demoted': "User has been demoted",
+            'not_owner': "User is not an owner of the organization",
+            'last_owner': "User is the last owner - therefore will not be demoted",
+        }
+        outcome = {(result['user'], result['requested_at']): result['result'] for result in results}
+        for record in records:
+            message = messages.get(outcome.get((record['user'], record['requested_at'])))
+            if message:
+                self.remover.notifications.add(record['repo'], record['issue_number'], message)
+                self.remover.notifications.close_issue(record['repo'], record['issue_number'])
+
+def handler(event, context):
+    metrics.start_invocation()
+    logger.start_invocation(context, function=FUNCTION_NAME)
+    try:
+        # The remover prewarmed at import serves every warm sweep
+        sweeper = ExpiredElevationSweeper(runtime_context.get())
+        results = sweeper.sweep(dry_run=bool((event or {}).get('dry_run')))
+    except Exception as err:
+        runtime_context.invalidate_after(err)
+        raise
+    finally:
+        metrics.flush(FUNCTION_NAME)
+    logger.info("Sweep finished", results=results)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'results': results})
+    }
+
+if __name__ == '__main__':
+    # Local run, e.g. DYNAMODB_ENDPOINT_URL=http://localhost:8000 python sweeper.py --dry-run
+    import sys
+    handler({'dry_run': '--dry-run' in sys.argv}, None)
@@ -1,5 +1,9 @@
 import pytest
+from unittest.mock import patch, MagicMock
+from github_permission_manager_demotion import handler as handler_module
 from github_permission_manager_demotion.handler import is_last_org_owner
+from common.elevation_context import ElevationContext
+from common.rate_limits import RateLimitExceeded
 
 def test_is_last_org_owner():
     all_owners = ['test-user']
@@ -45,3 +49,190 @@ def test_list_org_owners_is_multiple_users():
     all_owners = ['test-user', 'another-user']
     user = 'another-user'
     assert is_last_org_owner(all_owners, user) == False
+
+def test_handler_reuses_remover_across_invocations():
+    with patch.object(handler_module.runtime_context, 'factory') as mock_factory:
+        handler_module.runtime_context.invalidate()
+        handler_module.handler({'user': 'test-user'}, None)
+        handler_module.handler({'user': 'test-user'}, None)
+        mock_factory.assert_called_once()
+        assert mock_factory.return_value.demote_user_lambda.call_count == 2
+    handler_module.runtime_context.invalidate()
+
+def test_get_parameter_names_keep_existing_prefixes():
+    assert handler_module.get_parameter_names('dev') == {
+        'app_id': '/github_permission_manager_webhook/$dev_app_id',
+        'private_key': '/github_permission_manager_webhook/$dev_private_key',
+        'installation_id': '/github_permission_manager_webhook/$dev_installation_id',
+    }
+
+def mock_response(status_code=200, json_data=None, next_url=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_data
+    response.links = {'next': {'url': next_url}} if next_url else {}
+    return response
+
+@pytest.fixture
+def github_permission_remover():
+    remover = handler_module.GitHubPermissionRemover(session=MagicMock())
+    remover.dynamodb = MagicMock()
+    remover.store = MagicMock()
+    return remover
+
+@pytest.mark.parametrize("status_code, json_data, expected", [
+    (200, {'role': 'admin', 'state': 'active'}, 'admin'),
+    (200, {'role': 'member', 'state': 'active'}, 'member'),
+    (404, None, None),
+])
+def test_get_org_membership_role(github_permission_remover, status_code, json_data, expected):
+    mock_get = github_permission_remover.github.session.get
+    mock_get.return_value = mock_response(status_code, json_data)
+
+    assert github_permission_remover.get_org_membership_role('org', 'test-user') == expected
+    assert mock_get.call_args[0][0] == 'https://api.github.com/orgs/org/memberships/test-user'
+
+def test_get_org_owners_stops_after_limit(github_permission_remover):
+    mock_get = github_permission_remover.github.session.get
+    mock_get.side_effect = [
+        mock_response(json_data=[{'login': 'owner-1'}, {'login': 'owner-2'}], next_url='https://api.github.com/next'),
+        mock_response(json_data=[{'login': 'owner-3'}]),
+    ]
+
+    assert github_permission_remover.get_org_owners('org', limit=2) == ['owner-1', 'owner-2']
+    mock_get.assert_called_once()
+    assert mock_get.call_args[1]['params'] == {'role': 'admin', 'per_page': 2}
+
+def test_get_org_owners_follows_pages(github_permission_remover):
+    mock_get = github_permission_remover.github.session.get
+    mock_get.side_effect = [
+        mock_response(json_data=[{'login': 'owner-1'}], next_url='https://api.github.com/next'),
+        mock_response(json_data=[{'login': 'owner-2'}]),
+    ]
+
+    assert github_permission_remover.get_org_owners('org') == ['owner-1', 'owner-2']
+    assert mock_get.call_args_list[1][0][0] == 'https://api.github.com/next'
+
+def demotion_event():
+    return {'organization': 'org', 'user': 'test-user', 'repository': 'org/repo', 'issue_number': 1, 'requested_at': '2024-06-01T12:00:00'}
+
+def test_demote_user_lambda_demotes_owner(github_permission_remover):
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(github_permission_remover, 'get_org_membership_role', return_value='admin'), \
+        patch.object(github_permission_remover, 'get_org_owners', return_value=['test-user', 'another-user']) as mock_owners, \
+        patch.object(github_permission_remover, 'make_member_on_github') as mock_demote:
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+        mock_owners.assert_called_once_with('org', limit=2)
+        mock_demote.assert_called_once_with('org', 'test-user')
+        github_permission_remover.store.mark_demoted.assert_called_once_with('test-user', '2024-06-01T12:00:00')
+
+        session = github_permission_remover.github.session
+        session.post.assert_called_once()
+        assert session.post.call_args[1]['json'] == {
+            "body": "User is currently an owner - demotion to member in progress\n\nUser has been demoted"
+        }
+        session.patch.assert_called_once()
+        assert session.patch.call_args[1]['json'] == {"state": "closed"}
+
+def test_demote_user_lambda_skips_last_owner(github_permission_remover):
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(github_permission_remover, 'get_org_membership_role', return_value='admin'), \
+        patch.object(github_permission_remover, 'get_org_owners', return_value=['test-user']), \
+        patch.object(github_permission_remover, 'make_member_on_github') as mock_demote:
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+        mock_demote.assert_not_called()
+        session = github_permission_remover.github.session
+        assert session.post.call_args[1]['json'] == {"body": "User is the last owner - therefore will not be demoted"}
+        session.patch.assert_called_once()
+        github_permission_remover.store.mark_closed.assert_called_once_with('test-user', '2024-06-01T12:00:00', 'last_owner')
+
+def test_demote_user_lambda_skips_non_owner(github_permission_remover):
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(github_permission_remover, 'get_org_membership_role', return_value='member'), \
+        patch.object(github_permission_remover, 'get_org_owners') as mock_owners, \
+        patch.object(github_permission_remover, 'make_member_on_github') as mock_demote, \
+        patch.object(github_permission_remover, 'post_comment_on_issue'), \
+        patch.object(github_permission_remover, 'close_issue'):
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+        mock_owners.assert_not_called()
+        mock_demote.assert_not_called()
+        github_permission_remover.store.mark_closed.assert_called_once_with('test-user', '2024-06-01T12:00:00', 'not_owner')
+
+def test_demote_user_lambda_uses_graphql_context(github_permission_remover):
+    github_permission_remover.use_graphql_lookups = True
+    context = ElevationContext(requester_role='admin', requester_role_known=True, owners=['test-user', 'another-user'])
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(handler_module, 'fetch_elevation_context', return_value=context) as mock_fetch, \
+        patch.object(github_permission_remover, 'get_org_membership_role') as mock_role, \
+        patch.object(github_permission_remover, 'get_org_owners') as mock_owners, \
+        patch.object(github_permission_remover, 'make_member_on_github') as mock_demote:
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+        mock_fetch.assert_called_once_with(github_permission_remover.github, 'org', requester='test-user')
+        mock_role.assert_not_called()
+        mock_owners.assert_not_called()
+        mock_demote.assert_called_once_with('org', 'test-user')
+
+def test_demote_user_lambda_falls_back_to_rest_for_unknowns(github_permission_remover):
+    github_permission_remover.use_graphql_lookups = True
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(handler_module, 'fetch_elevation_context', return_value=ElevationContext()), \
+        patch.object(github_permission_remover, 'get_org_membership_role', return_value='admin') as mock_role, \
+        patch.object(github_permission_remover, 'get_org_owners', return_value=['test-user']) as mock_owners, \
+        patch.object(github_permission_remover, 'make_member_on_github') as mock_demote:
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+        mock_role.assert_called_once_with('org', 'test-user')
+        mock_owners.assert_called_once_with('org', limit=2)
+        mock_demote.assert_not_called()
+
+def test_demote_user_lambda_uses_the_installation_from_the_event(github_permission_remover):
+    event = dict(demotion_event(), installation_id=44444)
+    with patch.object(github_permission_remover, 'get_all_parameters') as mock_parameters, \
+        patch.object(github_permission_remover, 'get_org_membership_role', return_value='member'):
+        github_permission_remover.demote_user_lambda(event, None)
+    mock_parameters.assert_called_once_with(44444)
+
+def test_use_organization_falls_back_to_default_installation(github_permission_remover):
+    github_permission_remover.default_installation_id = '4001'
+    github_permission_remover.github_auth = MagicMock()
+    github_permission_remover.github_auth.get_installation_id.side_effect = [Exception("404"), '55555']
+    github_permission_remover.github_auth.get_access_token.side_effect = lambda installation_id: f"token-{installation_id}"
+
+    github_permission_remover.use_organization('unknown-org')
+    assert github_permission_remover.installation_id == '4001'
+
+    github_permission_remover.use_organization('other-org')
+    assert github_permission_remover.installation_id == '55555'
+    assert github_permission_remover.auth_headers['Authorization'] == "Bearer token-55555"
+
+def test_mark_user_demoted_without_requested_at_uses_latest_elevated_request(github_permission_remover):
+    github_permission_remover.store.get_latest_request.return_value = {'requested_at': 'then', 'status': 'elevated'}
+    github_permission_remover.mark_user_demoted('test-user')
+    github_permission_remover.store.mark_demoted.assert_called_once_with('test-user', 'then')
+
+def test_mark_user_demoted_without_elevated_request(github_permission_remover):
+    github_permission_remover.store.get_latest_request.return_value = {'requested_at': 'then', 'status': 'demoted'}
+    assert github_permission_remover.mark_user_demoted('test-user') == False
+    github_permission_remover.store.mark_demoted.assert_not_called()
+
+@pytest.mark.parametrize('failure', [Exception("502 Bad Gateway"), RateLimitExceeded('4001', 1717243200)])
+def test_demote_user_lambda_leaves_issue_open_when_demotion_fails(github_permission_remover, failure):
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(github_permission_remover, 'get_org_membership_role', side_effect=failure), \
+        pytest.raises(type(failure)):
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+    session = github_permission_remover.github.session
+    session.patch.assert_not_called()
+    github_permission_remover.store.mark_demoted.assert_not_called()
+
+def test_demote_user_lambda_posts_progress_without_closing_when_put_fails(github_permission_remover):
+    github_permission_remover.github.session.put.return_value = mock_response(502)
+    github_permission_remover.github.session.put.return_value.raise_for_status.side_effect = Exception("502 Bad Gateway")
+    with patch.object(github_permission_remover, 'get_all_parameters'), \
+        patch.object(github_permission_remover, 'get_org_membership_role', return_value='admin'), \
+        patch.object(github_permission_remover, 'get_org_owners', return_value=['test-user', 'another-user']), \
+        pytest.raises(Exception, match="502"):
+        github_permission_remover.demote_user_lambda(demotion_event(), None)
+    session = github_permission_remover.github.session
+    assert session.post.call_args[1]['json'] == {"body": "User is currently an owner - demotion to member in progress"}
+    session.patch.assert_not_called()
+    github_permission_remover.store.mark_demoted.assert_not_called()
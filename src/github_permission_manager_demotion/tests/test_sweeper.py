@@ -0,0 +1,174 @@
+import boto3
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from moto import mock_aws
+from github_permission_manager_demotion import sweeper as sweeper_module
+from github_permission_manager_demotion.sweeper import ExpiredElevationSweeper, plan_demotions
+from common.store import ElevationRequestStore
+from handler import GitHubPermissionRemover
+
+NOW = datetime(2024, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+NOW_EPOCH = int(NOW.timestamp())
+ELEVATION_DURATION = 300
+
+def record(user, repo='org/repo', issue_number=1, minutes_ago=10, status='elevated'):
+    elevated_at = NOW - timedelta(minutes=minutes_ago)
+    expires_at = int(elevated_at.timestamp()) + ELEVATION_DURATION
+    return {
+        'user': user,
+        'requested_at': (elevated_at - timedelta(minutes=1)).replace(tzinfo=None).isoformat(),
+        'elevated_at': elevated_at.replace(tzinfo=None).isoformat(),
+        'expires_at': expires_at,
+        'status_time': expires_at,
+        'repo': repo,
+        'issue_number': issue_number,
+        'status': status,
+    }
+
+@pytest.fixture
+def table():
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='eu-west-2')
+        table = dynamodb.create_table(
+            TableName='GithubElevationRequests',
+            KeySchema=[{'AttributeName': 'user', 'KeyType': 'HASH'}, {'AttributeName': 'requested_at', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'user', 'AttributeType': 'S'},
+                {'AttributeName': 'requested_at', 'AttributeType': 'S'},
+                {'AttributeName': 'status', 'AttributeType': 'S'},
+                {'AttributeName': 'status_time', 'AttributeType': 'N'},
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'status-index',
+                'KeySchema': [{'AttributeName': 'status', 'KeyType': 'HASH'}, {'AttributeName': 'status_time', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        yield table
+
+@pytest.fixture
+def remover(table):
+    remover = GitHubPermissionRemover(session=MagicMock())
+    remover.dynamodb = boto3.resource('dynamodb', region_name='eu-west-2')
+    remover.store = ElevationRequestStore(remover.dynamodb)
+    remover.get_all_parameters = MagicMock()
+    remover.use_organization = MagicMock()
+    remover.get_org_owners = MagicMock(return_value=['alice', 'bob', 'carol'])
+    remover.github.session.put.return_value.ok = True
+    return remover
+
+def test_plan_demotions_keeps_last_owner():
+    to_demote, results = plan_demotions([record('alice'), record('bob'), record('dave')], ['alice', 'bob'])
+    assert [r['user'] for r in to_demote] == ['alice']
+    assert [(r['user'], r['result']) for r in results] == [('bob', 'last_owner'), ('dave', 'not_owner')]
+
+def test_find_expired_only_returns_elevated_records_past_duration(table, remover):
+    table.put_item(Item=record('alice', minutes_ago=10))
+    table.put_item(Item=record('bob', minutes_ago=1))
+    table.put_item(Item=record('carol', minutes_ago=10, status='demoted'))
+    sweeper = ExpiredElevationSweeper(remover)
+
+    assert [item['user'] for item in sweeper.find_expired(NOW_EPOCH)] == ['alice']
+
+def test_sweep_demotes_in_one_pass_with_one_token_and_owner_snapshot(table, remover):
+    table.put_item(Item=record('alice', issue_number=1))
+    table.put_item(Item=record('bob', issue_number=2))
+    sweeper = ExpiredElevationSweeper(remover)
+
+    results = sweeper.sweep(now=NOW_EPOCH)
+
+    assert sorted((r['user'], r['result']) for r in results) == [('alice', 'demoted'), ('bob', 'demoted')]
+    remover.get_all_parameters.assert_called_once()
+    remover.get_org_owners.assert_called_once_with('org')
+    assert remover.github.session.put.call_count == 2
+    assert remover.github.session.post.call_count == 2
+    assert remover.github.session.patch.call_count == 2
+    statuses = {item['user']: item['status'] for item in table.scan()['Items']}
+    assert statuses == {'alice': 'demoted', 'bob': 'demoted'}
+
+def test_sweep_failed_demotion_stays_elevated(table, remover):
+    table.put_item(Item=record('alice'))
+    remover.github.session.put.return_value.ok = False
+    sweeper = ExpiredElevationSweeper(remover)
+
+    results = sweeper.sweep(now=NOW_EPOCH)
+
+    assert [r['result'] for r in results] == ['failed']
+    assert table.scan()['Items'][0]['status'] == 'elevated'
+    remover.github.session.patch.assert_not_called()
+
+def test_sweep_dry_run_makes_no_changes(table, remover):
+    table.put_item(Item=record('alice'))
+    sweeper = ExpiredElevationSweeper(remover)
+
+    results = sweeper.sweep(now=NOW_EPOCH, dry_run=True)
+
+    assert [r['result'] for r in results] == ['would_demote']
+    remover.github.session.put.assert_not_called()
+    remover.github.session.post.assert_not_called()
+
+def test_sweep_with_nothing_expired_does_no_github_work(table, remover):
+    sweeper = ExpiredElevationSweeper(remover)
+    assert sweeper.sweep(now=NOW_EPOCH) == []
+    remover.get_all_parameters.assert_not_called()
+
+def test_sweep_switches_installation_per_organization(table, remover):
+    table.put_item(Item=record('alice', repo='org-a/repo', issue_number=1))
+    table.put_item(Item=record('bob', repo='org-b/repo', issue_number=2))
+    remover.get_org_owners.return_value = ['alice', 'bob', 'carol']
+    sweeper = ExpiredElevationSweeper(remover)
+
+    sweeper.sweep(now=NOW_EPOCH)
+
+    remover.get_all_parameters.assert_called_once()
+    assert sorted(call[0][0] for call in remover.use_organization.call_args_list) == ['org-a', 'org-b']
+    assert remover.github.session.post.call_count == 2
+
+def test_sweep_isolates_an_organization_whose_owner_listing_fails(table, remover):
+    table.put_item(Item=record('alice', repo='org-a/repo', issue_number=1))
+    table.put_item(Item=record('bob', repo='org-b/repo', issue_number=2))
+
+    def get_org_owners(organization):
+        if organization == 'org-a':
+            raise Exception("Not Found")
+        return ['alice', 'bob', 'carol']
+
+    remover.get_org_owners.side_effect = get_org_owners
+    sweeper = ExpiredElevationSweeper(remover)
+
+    results = sweeper.sweep(now=NOW_EPOCH)
+
+    assert sorted((r['user'], r['result']) for r in results) == [('alice', 'failed'), ('bob', 'demoted')]
+    statuses = {item['user']: item['status'] for item in table.scan()['Items']}
+    assert statuses == {'alice': 'elevated', 'bob': 'demoted'}
+
+def test_sweep_closes_undemoted_elevations_so_the_next_sweep_does_nothing(table, remover):
+    table.put_item(Item=record('alice', issue_number=1))
+    table.put_item(Item=record('dave', issue_number=2))
+    remover.get_org_owners.return_value = ['alice']
+    sweeper = ExpiredElevationSweeper(remover)
+
+    results = sweeper.sweep(now=NOW_EPOCH)
+
+    assert sorted((r['user'], r['result']) for r in results) == [('alice', 'last_owner'), ('dave', 'not_owner')]
+    items = {item['user']: item for item in table.scan()['Items']}
+    assert {user: (item['status'], item['close_reason']) for user, item in items.items()} == {
+        'alice': ('closed', 'last_owner'), 'dave': ('closed', 'not_owner')}
+    assert remover.github.session.post.call_count == 2
+
+    remover.github.session.reset_mock()
+    assert sweeper.sweep(now=NOW_EPOCH) == []
+    remover.github.session.post.assert_not_called()
+    remover.github.session.patch.assert_not_called()
+
+def test_handler_reuses_the_warm_remover(table, remover, monkeypatch):
+    factory = MagicMock(return_value=remover)
+    monkeypatch.setattr(sweeper_module.runtime_context, 'factory', factory)
+    sweeper_module.runtime_context.invalidate()
+
+    sweeper_module.handler({}, None)
+    sweeper_module.handler({}, None)
+
+    factory.assert_called_once()
@@ -1,130 +1,257 @@
 import json
-import boto3
+import base64
 import hmac
 import hashlib
-import requests
 import os
-from datetime import datetime
-from common.shared_functions import GitHubAuth, DEFAULT_REGION, ESCALATION_TEAM_NAME, ELEVATION_BOT
+import time
+from common.shared_functions import GitHubAuth, DEFAULT_REGION, ESCALATION_TEAM_NAME, ELEVATION_BOT, get_event_installation_id
+from common.runtime import RuntimeContext
+from common.parameters import ParameterLoader
+from common.github_client import GitHubClient
+from common.cache import TTLCache
+from common.concurrency import SideEffectGraph
+from common.notifications import NotificationBuffer
+from common.store import ElevationRequestStore, STATUS_PENDING
+from common.elevation_statistics import ElevationStatistics
+from common.deliveries import DeliveryDeduplicator
+from common.queues import create_queue
+from common.elevation_context import fetch_elevation_context, graphql_lookups_enabled
+from common.logger import logger
+from common.metrics import metrics
 from utilities import get_headers_from_event, request_is_to_elevate_access, comment_contains_approval, approving_own_request
 
+MEMBERSHIP_CACHE_SIZE = 256
+MEMBERSHIP_CACHE_TTL_SECONDS = 60
+FUNCTION_NAME = 'github_permission_manager_webhook'
+INGESTION_SYNC = 'sync'
+INGESTION_ASYNC = 'async'  # acknowledge with 202 and leave the work to worker.py
+
+def get_parameter_names(workspace):
+    return {
+        'app_id': f"/github_permission_manager_webhook/{workspace}_app_id",
+        'private_key': f"/github_permission_manager_webhook/{workspace}_private_key",
+        'installation_id': f"/github_permission_manager_webhook/{workspace}_installation_id",
+        'webhook_secret': f"/github_permission_manager_webhook/{workspace}_secret_for_webhook",
+        'step_function_arn': f"/github_permission_manager_demotion/{workspace}_step_function_arn",
+    }
+
 class GitHubPermissionManager:
-    def __init__(self, requests_module=requests):
+    def __init__(self, session=None):
         self.dynamodb = None
+        self.store = None
+        self.deliveries = None
         self.step_functions = None
         self.ssm_client = None
+        self.parameter_loader = None
         self.app_id = None
         self.private_key = None
+        self.default_installation_id = None
         self.installation_id = None
         self.webhook_secret = None
         self.step_function_arn = None
         self.auth_headers = None
-        self.requests = requests_module
+        self.github_auth = None
+        self.github = GitHubClient(lambda: self.auth_headers, session=session, installation_provider=lambda: self.installation_id)
+        self.notifications = NotificationBuffer(self.github)
+        self.membership_cache = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl_seconds=MEMBERSHIP_CACHE_TTL_SECONDS)
+        self._signature_secret = None
+        self._signature_hmac = None
+        self.use_graphql_lookups = graphql_lookups_enabled()
+        self.ingestion_mode = os.getenv('INGESTION_MODE', INGESTION_SYNC).lower()
+        self.queue = None
+
+    def initialise_ssm_client(self):
+        if self.ssm_client is None:
+            # boto3, requests, jwt and cryptography are imported on the paths that use them
+            import boto3
+            self.ssm_client = boto3.client('ssm', region_name=DEFAULT_REGION)
 
     def initialise_aws_clients(self):
-        self.dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION)
-        self.step_functions = boto3.client('stepfunctions', region_name=DEFAULT_REGION)
-        self.ssm_client = boto3.client('ssm', region_name=DEFAULT_REGION)
-
-    def get_all_parameters(self):
-        workspace = os.getenv('WORKSPACE')
-        self.app_id = self.get_ssm_parameter(f"/github_permission_manager_webhook/{workspace}_app_id")
-        self.private_key = self.get_ssm_parameter(f"/github_permission_manager_webhook/{workspace}_private_key")
-        self.installation_id = self.get_ssm_parameter(f"/github_permission_manager_webhook/{workspace}_installation_id")
-        self.webhook_secret = self.get_ssm_parameter(f"/github_permission_manager_webhook/{workspace}_secret_for_webhook")
-        self.step_function_arn = self.get_ssm_parameter(f"/github_permission_manager_demotion/{workspace}_step_function_arn")
+        import boto3
+        self.initialise_ssm_client()
+        if self.dynamodb is None:
+            self.dynamodb = boto3.resource('dynamodb', region_name=DEFAULT_REGION)
+            self.store = ElevationRequestStore(self.dynamodb, statistics=ElevationStatistics(self.dynamodb))
+            self.deliveries = DeliveryDeduplicator(self.dynamodb)
+        if self.step_functions is None:
+            self.step_functions = boto3.client('stepfunctions', region_name=DEFAULT_REGION)
+
+    def initialise_queue(self):
+        if self.queue is None:
+            self.queue = create_queue(os.environ['INGESTION_QUEUE_URL'], region_name=DEFAULT_REGION)
+
+    def enqueue_delivery(self, github_event, delivery_id, body):
+        self.initialise_queue()
+        self.queue.send({
+            'delivery_id': delivery_id,
+            'github_event': github_event,
+            'payload': body.decode('utf-8') if isinstance(body, bytes) else body,
+            'received_at': int(time.time())
+        })
+        logger.debug("Delivery queued", github_event=github_event, delivery_id=delivery_id)
+
+    def _get_parameter_names(self):
+        names = get_parameter_names(os.getenv('WORKSPACE'))
+        if self.parameter_loader is None:
+            self.parameter_loader = ParameterLoader(self.ssm_client, names.values())
+        return names
+
+    def load_webhook_secret(self):
+        self.initialise_ssm_client()
+        names = self._get_parameter_names()
+        self.webhook_secret = self.get_ssm_parameter(names['webhook_secret'])
+
+    def get_all_parameters(self, installation_id=None):
+        names = self._get_parameter_names()
+        credentials = (self.app_id, self.private_key, self.default_installation_id)
+        self.app_id = self.get_ssm_parameter(names['app_id'])
+        self.private_key = self.get_ssm_parameter(names['private_key'])
+        self.default_installation_id = self.get_ssm_parameter(names['installation_id'])
+        self.webhook_secret = self.get_ssm_parameter(names['webhook_secret'])
+        self.step_function_arn = self.get_ssm_parameter(names['step_function_arn'])
+        if credentials != (self.app_id, self.private_key, self.default_installation_id):
+            self.github_auth = None
+        self.use_installation(installation_id)
+
+    def use_installation(self, installation_id=None):
+        # The installation named by the event; the SSM one only when there is none
+        self.installation_id = str(installation_id) if installation_id else self.default_installation_id
         self.auth_headers = self.get_token_to_access_github()
 
     def get_token_to_access_github(self):
-        github_auth = GitHubAuth(self.private_key, self.app_id, self.installation_id)
-        access_token = github_auth.get_access_token()
+        if self.github_auth is None:
+            self.github_auth = GitHubAuth(self.private_key, self.app_id, self.default_installation_id, session=self.github.session)
+        access_token = self.github_auth.get_access_token(self.installation_id)
         return {
             "Authorization": f"Bearer {access_token}",
             "Accept": "application/vnd.github.v3+json"
         }
 
     def get_ssm_parameter(self, parameter_name):
-        parameter = self.ssm_client.get_parameter(Name=parameter_name, WithDecryption=True)
-        return parameter['Parameter']['Value']
+        return self.parameter_loader.get(parameter_name)
 
-    def post_comment_on_issue(self, payload, comment_body):
-        print(f"Posting comment: {comment_body}")
-        data = {"body": comment_body}
+    def _get_issue_location(self, payload):
         try:
-            response = self.requests.post(
-                f"https://api.github.com/repos/{payload['repository']['full_name']}/issues/{payload['issue']['number']}/comments",
-                headers=self.auth_headers,
-                json=data
-            )
-            response.raise_for_status()
-            print(f"Comment posted: {response.status_code}")
-        except requests.exceptions.HTTPError as http_err:
-            print(f"HTTP error occurred: {http_err}")
-        except Exception as err:
-            print(f"Other error occurred: {err}")
+            return payload['repository']['full_name'], payload['issue']['number']
+        except KeyError as err:
+            logger.error("Payload is missing the issue location", missing=str(err))
+            return None
+
+    def post_comment_on_issue(self, payload, comment_body):
+        location = self._get_issue_location(payload)
+        if location:
+            self.github.post_comment(*location, comment_body)
+
+    def notify(self, payload, comment_body):
+        location = self._get_issue_location(payload)
+        if location:
+            self.notifications.add(*location, comment_body)
 
     def make_owner_on_github(self, payload, user):
-        data = {"role": "admin"}
+        import requests
         try:
-            response = self.requests.put(
-                f"https://api.github.com/orgs/{payload['organization']['login']}/memberships/{user}",
-                headers=self.auth_headers,
-                json=data
-            )
+            response = self.github.set_org_membership_role(payload['organization']['login'], user, "admin")
             response.raise_for_status()
-            print(f"Promoted user to Owner: {response.status_code}")
+            logger.info("Promoted user to owner", user=user, status=response.status_code)
+            return True
         except requests.exceptions.HTTPError as http_err:
-            print(f"HTTP error occurred: {http_err}")
+            logger.error("HTTP error promoting user", user=user, error=str(http_err))
         except requests.exceptions.RequestException as req_err:
-            print(f"Request error occurred: {req_err}")
+            logger.error("Request error promoting user", user=user, error=str(req_err))
         except Exception as err:
-            print(f"Other error occurred: {err}")
+            logger.error("Error promoting user", user=user, error=str(err))
+        return False
 
     def is_team_member(self, username, org_name, team_slug):
-        team_id = self._get_team_id(org_name, team_slug)
-        return self._check_membership(team_id, username) if team_id else False
-
-    def _get_team_id(self, org_name, team_slug):
-        url = f"https://api.github.com/orgs/{org_name}/teams/{team_slug}"
-        response = self.requests.get(url, headers=self.auth_headers)
-        if response.status_code != 200:
-            print(f"Error fetching team: {response.status_code}")
+        key = (org_name.lower(), team_slug, username.lower())
+        cached = self.membership_cache.get(key)
+        if cached is not None:
+            return cached
+        is_member = self._check_membership(org_name, team_slug, username)
+        if is_member is None:
+            return False
+        self.membership_cache.set(key, is_member)
+        return is_member
+
+    def prefetch_team_memberships(self, org_name, usernames, team_slug=ESCALATION_TEAM_NAME):
+        # One listing of the team answers every user in a batch instead of a lookup per user
+        keys = {username.lower(): (org_name.lower(), team_slug, username.lower()) for username in usernames}
+        pending = [username for username, key in keys.items() if self.membership_cache.get(key) is None]
+        if len(pending) < 2:
+            return
+        try:
+            members = {member['login'].lower()
+                       for page in self.github.iter_pages(f"/orgs/{org_name}/teams/{team_slug}/members", params={"per_page": 100})
+                       for member in page}
+        except Exception as err:
+            logger.warning("Team listing failed, checking members one by one", team=team_slug, error=str(err))
+            return
+        for username in pending:
+            self.membership_cache.set(keys[username], username in members)
+
+    def get_elevation_context(self, payload, approver):
+        # Optional: one GraphQL read instead of separate REST lookups; REST remains the fallback
+        if not self.use_graphql_lookups:
+            return None
+        try:
+            return fetch_elevation_context(self.github, payload['repository']['owner']['login'], ESCALATION_TEAM_NAME,
+                                           approver=approver, requester=payload['issue']['user']['login'],
+                                           repository=payload['repository']['full_name'], issue_number=payload['issue']['number'])
+        except Exception as err:
+            logger.warning("Elevation context lookup failed, using REST", error=str(err))
             return None
-        return response.json().get('id')
 
-    def _check_membership(self, team_id, username):
-        url = f"https://api.github.com/teams/{team_id}/memberships/{username}"
-        response = self.requests.get(url, headers=self.auth_headers)
+    def _check_membership(self, org_name, team_slug, username):
+        response = self.github.get(f"/orgs/{org_name}/teams/{team_slug}/memberships/{username}")
         if response.status_code == 200:
-            print(f"User {username} is a member of the team.")
+            logger.debug("User is a member of the team", user=username, team=team_slug)
             return True
         elif response.status_code == 404:
-            print(f"User {username} is not a member of the team.")
+            logger.info("User is not a member of the team", user=username, team=team_slug)
             return False
-        print(f"Error checking membership: {response.status_code}")
-        return False
+        logger.error("Error checking membership", user=username, team=team_slug, status=response.status_code)
+        return None
 
     def request_is_from_github(self, event, headers):
         return self._is_valid_signature(event, headers)
 
     def _is_valid_signature(self, event, headers):
+        return self._is_valid_payload_signature(self._get_payload(event), headers)
+
+    def _is_valid_payload_signature(self, payload, headers):
         signature = headers.get('X-Hub-Signature-256')
-        if not signature:
+        if not signature or payload is None:
             return False
-        payload = self._get_payload(event)
         expected_signature = self._generate_signature(payload)
         return hmac.compare_digest(expected_signature, signature)
 
     def _get_payload(self, event):
         payload = event.get('body')
+        if payload is not None and event.get('isBase64Encoded'):
+            return base64.b64decode(payload)
         return payload.encode('utf-8') if isinstance(payload, str) else payload
 
+    def _get_signature_hmac(self):
+        # The keyed HMAC state is computed once per secret and copied per request
+        if self._signature_hmac is None or self._signature_secret != self.webhook_secret:
+            self._signature_hmac = hmac.new(self.webhook_secret.encode('utf-8'), digestmod=hashlib.sha256)
+            self._signature_secret = self.webhook_secret
+        return self._signature_hmac
+
     def _generate_signature(self, payload):
-        hash_object = hmac.new(self.webhook_secret.encode('utf-8'), msg=payload, digestmod=hashlib.sha256)
+        hash_object = self._get_signature_hmac().copy()
+        hash_object.update(payload)
         return "sha256=" + hash_object.hexdigest()
 
     def _parse_payload(self, payload):
-        return json.loads(payload) if isinstance(payload, str) else payload
+        return json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+
+    def _is_actionable(self, github_event, payload):
+        if github_event == 'issues':
+            return self._is_elevation_request(payload)
+        if github_event == 'issue_comment':
+            return payload.get('action') == 'created' and not self._is_comment_from_bot(payload['comment']['user']['login'])
+        return False
 
     def handle_issue(self, payload):
         payload = self._parse_payload(payload)
@@ -137,27 +264,24 @@ class GitHubPermissionManager:
                 self._notify_ineligible_user(payload, user)
 
     def _is_elevation_request(self, payload):
-        return payload['action'] == 'opened' and request_is_to_elevate_access(payload['issue'])
+        return payload.get('action') == 'opened' and request_is_to_elevate_access(payload['issue'])
 
-    def _is_user_eligible_for_elevation(self, user, payload):
-        return self.is_team_member(user, payload['repository']['owner']['login'], ESCALATION_TEAM_NAME)
+    def _is_user_eligible_for_elevation(self, user, payload, is_member=None):
+        org_name = payload['repository']['owner']['login']
+        if is_member is not None:
+            self.membership_cache.set((org_name.lower(), ESCALATION_TEAM_NAME, user.lower()), is_member)
+            return is_member
+        return self.is_team_member(user, org_name, ESCALATION_TEAM_NAME)
 
     def _process_elevation_request(self, payload, issue, user):
         self.insert_into_dynamodb(payload, issue, user)
-        self.post_comment_on_issue(payload, f"@{user} has requested elevation. Waiting for approval.")
+        self.notify(payload, f"@{user} has requested elevation. Waiting for approval.")
 
     def _notify_ineligible_user(self, payload, user):
-        self.post_comment_on_issue(payload, f"@{user} has requested elevation but is not a member of the elevators team.")
+        self.notify(payload, f"@{user} has requested elevation but is not a member of the elevators team.")
 
     def insert_into_dynamodb(self, payload, issue, user):
-        table = self.dynamodb.Table('GithubElevationRequests')
-        table.put_item(Item={
-            'user': user,
-            'issue_number': issue['number'],
-            'repo': payload['repository']['full_name'],
-            'status': 'pending',
-            'requested_at': datetime.now().isoformat()
-        })
+        self.store.create_request(user, payload['repository']['full_name'], issue['number'])
 
     def handle_issue_comment(self, payload):
         payload = self._parse_payload(payload)
@@ -167,90 +291,184 @@ class GitHubPermissionManager:
         user = comment['user']['login']
         if self._is_comment_from_bot(user):
             return
-        if not self._is_user_eligible_for_elevation(user, payload):
-            self.post_comment_on_issue(payload, f"@{user} has commented on the elevation request but is not a member of the elevators team.")
+        context = self.get_elevation_context(payload, user)
+        if not self._is_user_eligible_for_elevation(user, payload, context and context.approver_is_member):
+            self.notify(payload, f"@{user} has commented on the elevation request but is not a member of the elevators team.")
             return
         if comment_contains_approval(comment):
-            self._handle_approval_comment(payload, user)
+            self._handle_approval_comment(payload, user, context)
         else:
-            self.post_comment_on_issue(payload, f"@{user} has commented but not approved the elevation.")
+            self.notify(payload, f"@{user} has commented but not approved the elevation.")
 
     def _is_comment_from_bot(self, user):
         return user == ELEVATION_BOT
 
-    def _handle_approval_comment(self, payload, user):
+    def _handle_approval_comment(self, payload, user, context=None):
         original_requestor = payload['issue']['user']['login']
-        self.post_comment_on_issue(payload, f"@{user} has approved the elevation for @{original_requestor}.")
+        self.notify(payload, f"@{user} has approved the elevation for @{original_requestor}.")
         if approving_own_request(user, original_requestor):
-            self.post_comment_on_issue(payload, f"@{user} cannot approve own requests.")
+            self.notify(payload, f"@{user} cannot approve own requests.")
             return
-        self.promote_user_to_owner(payload, original_requestor)
+        if context and not self._can_promote_requester(payload, original_requestor, context):
+            return
+        self.promote_user_to_owner(payload, original_requestor, self.get_most_recent_request(original_requestor), approver=user)
+
+    def _can_promote_requester(self, payload, requester, context):
+        # Only checked when the batched read already returned the answers
+        if context.issue_state == 'closed':
+            self.notify(payload, f"The elevation request for @{requester} is closed and cannot be approved.")
+            return False
+        if context.requester_is_member is False:
+            self.notify(payload, f"@{requester} is no longer a member of the elevators team.")
+            return False
+        if context.requester_role == 'admin':
+            # Promoting would schedule a demotion that removes ownership they already had
+            self.notify(payload, f"@{requester} is already an owner of the organization.")
+            return False
+        return True
 
-    def promote_user_to_owner(self, payload, user):
-        print(f"Promoting user {user} to owner.")
-        most_recent_request = self.get_most_recent_request(user)
+    def promote_user_to_owner(self, payload, user, most_recent_request, approver=None):
+        logger.info("Promoting user to owner", user=user)
         if not most_recent_request:
-            print(f"User {user} not found in the database.")
+            logger.warning("User not found in the database", user=user)
             return
         requested_at_value = most_recent_request.get('requested_at', None)
-        self.make_owner_on_github(payload, user)
-        self.update_user_status(user, requested_at_value)
-        self.schedule_demotion(payload, user)
+        if most_recent_request.get('status') != STATUS_PENDING:
+            logger.info("Latest request is not pending, not promoting", user=user, status=most_recent_request.get('status'))
+            # The approval has already been announced on the issue
+            self.notify(payload, f"@{user} has no pending elevation request to approve - open a new request to be elevated again.")
+            return
+        if not self.make_owner_on_github(payload, user):
+            # The request stays pending, so approving again retries the promotion
+            self.notify(payload, f"Promoting @{user} to owner failed - approve again to retry")
+            return
+        try:
+            # Recorded only once the promotion has happened; the condition still lets one approval schedule the demotion
+            elevated = self.update_user_status(user, requested_at_value, approver)
+        except Exception:
+            self.revert_promotion(payload, user)
+            raise
+        if not elevated:
+            logger.info("Request already elevated by another approval", user=user)
+            return
+        # Nothing is said after this point, so the combined comment goes out alongside the schedule
+        graph = SideEffectGraph()
+        graph.add('schedule', self._schedule_or_revert, payload, user, requested_at_value)
+        graph.add('notify', self.notifications.flush)
+        graph.run()
+
+    def _schedule_or_revert(self, payload, user, requested_at_value):
+        try:
+            self.schedule_demotion(payload, user, requested_at_value)
+        except Exception:
+            # Without a scheduled demotion nothing would demote the user, and an elevated
+            # request cannot be approved again
+            if self.revert_promotion(payload, user):
+                self.store.revert_elevation(user, requested_at_value)
+                self.notify(payload, f"Scheduling the demotion of @{user} failed - approve again to retry")
+            raise
+
+    def revert_promotion(self, payload, user):
+        # Used when the promotion could not be recorded or its demotion scheduled
+        try:
+            self.github.set_org_membership_role(payload['organization']['login'], user, "member").raise_for_status()
+            logger.warning("Reverted promotion that could not be completed", user=user)
+            return True
+        except Exception as err:
+            logger.error("Failed to revert promotion, user remains an owner", user=user, error=str(err))
+            return False
 
     def get_most_recent_request(self, user):
-        table = self.dynamodb.Table('GithubElevationRequests')
-        response = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('user').eq(user),
-            ScanIndexForward=False,
-        )
-        items = response.get('Items', [])
-        return items[0] if items else None
-
-    def update_user_status(self, user, requested_at_value):
-        table = self.dynamodb.Table('GithubElevationRequests')
-        table.update_item(
-            Key={'user': user, 'requested_at': requested_at_value},
-            UpdateExpression="set #status = :s, elevated_at = :t",
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':s': 'elevated',
-                ':t': datetime.now().isoformat()
-            }
-        )
-
-    def schedule_demotion(self, payload, user):
+        return self.store.get_latest_request(user)
+
+    def update_user_status(self, user, requested_at_value, approver=None):
+        return self.store.mark_elevated(user, requested_at_value, int(os.environ['ELEVATION_DURATION']), approver=approver)
+
+    def schedule_demotion(self, payload, user, requested_at_value=None):
         elevation_duration = int(os.environ['ELEVATION_DURATION'])  # in seconds
-        self.step_functions.start_execution(
-            stateMachineArn=self.step_function_arn,
-            input=json.dumps({
-                'user': user,
-                'installation_id': payload['installation']['id'],
-                'organization': payload['organization']['login'],
-                'repository': payload['repository']['full_name'],
-                'issue_number': payload['issue']['number'],
-                'wait_seconds': elevation_duration
-            })
-        )
+        with metrics.timed('stepfunctions', 'StartExecution'):
+            self.step_functions.start_execution(
+                stateMachineArn=self.step_function_arn,
+                input=json.dumps({
+                    'user': user,
+                    'installation_id': payload['installation']['id'],
+                    'organization': payload['organization']['login'],
+                    'repository': payload['repository']['full_name'],
+                    'issue_number': payload['issue']['number'],
+                    'requested_at': requested_at_value,
+                    'wait_seconds': elevation_duration
+                })
+            )
 
     # Main handler method
     def main(self, event, _context):
-        self.initialise_aws_clients()
-        self.get_all_parameters()
         headers = get_headers_from_event(event)
-        if not self.request_is_from_github(event, headers):
-            print("Request is not from GitHub or is invalid returning 403")
+        self.load_webhook_secret()
+        body = self._get_payload(event)
+        if not self._is_valid_payload_signature(body, headers):
+            logger.warning("Request is not from GitHub or is invalid, returning 403")
             return {'statusCode': 403, 'body': json.dumps({'response': 'no'})}
 
         github_event = headers.get('X-GitHub-Event', None)
-        print("Github event: ", github_event)
-        if github_event == 'issues':
-            self.handle_issue(event.get('body'))
-        elif github_event == 'issue_comment':
-            self.handle_issue_comment(event.get('body'))
-
+        logger.debug("GitHub event received", github_event=github_event, delivery_id=headers.get('X-GitHub-Delivery'))
+        payload = self._parse_payload(body)
+        if not self._is_actionable(github_event, payload):
+            logger.debug("No action required", github_event=github_event)
+            return {'statusCode': 200, 'body': json.dumps({'response': 'yes'})}
+
+        delivery_id = headers.get('X-GitHub-Delivery')
+        if self.ingestion_mode == INGESTION_ASYNC:
+            # GitHub's 10 second delivery timeout no longer depends on GitHub or DynamoDB latency
+            self.enqueue_delivery(github_event, delivery_id, body)
+            return {'statusCode': 202, 'body': json.dumps({'response': 'queued'})}
+
+        if not self.process_delivery(github_event, delivery_id, payload):
+            return {'statusCode': 200, 'body': json.dumps({'response': 'duplicate'})}
         return {'statusCode': 200, 'body': json.dumps({'response': 'yes'})}
 
-def handler(event, context):
+    def process_delivery(self, github_event, delivery_id, payload):
+        # Only events that can lead to an action pay for a token and AWS clients
+        self.initialise_aws_clients()
+        if not self.deliveries.claim(delivery_id):
+            logger.info("Delivery has already been processed", delivery_id=delivery_id)
+            return False
+
+        try:
+            self.get_all_parameters(get_event_installation_id(payload))
+            self._handle_event(github_event, payload)
+        except Exception:
+            self.deliveries.release(delivery_id)
+            raise
+        return True
+
+    def _handle_event(self, github_event, payload):
+        self.notifications = NotificationBuffer(self.github)
+        try:
+            if github_event == 'issues':
+                self.handle_issue(payload)
+            elif github_event == 'issue_comment':
+                self.handle_issue_comment(payload)
+        finally:
+            # Everything said during the invocation goes out as a single comment
+            self.notifications.flush()
+
+def build_permission_manager():
     github_permission_manager = GitHubPermissionManager()
-    response = github_permission_manager.main(event, context)
+    github_permission_manager.load_webhook_secret()
+    return github_permission_manager
+
+runtime_context = RuntimeContext(build_permission_manager)
+runtime_context.prewarm()
+
+def handler(event, context):
+    metrics.start_invocation()
+    logger.start_invocation(context, function=FUNCTION_NAME)
+    try:
+        github_permission_manager = runtime_context.get()
+        response = github_permission_manager.main(event, context)
+    except Exception as err:
+        runtime_context.invalidate_after(err)
+        raise
+    finally:
+        metrics.flush(FUNCTION_NAME)
     return response
@@ -2,7 +2,7 @@ import pytest
 import hmac
 import hashlib
 from github_permission_manager_webhook.handler import GitHubPermissionManager
-from github_permission_manager_webhook.utilities import get_headers_from_event, request_is_to_elevate_access, comment_contains_approval, approving_own_request
+from github_permission_manager_webhook.utilities import get_headers_from_event, request_is_to_elevate_access, comment_contains_approval, approving_own_request, IntentClassifier, MAX_SCAN_CHARS
 
 def test_is_valid_request_valid_signature():
     test_permission_manager = GitHubPermissionManager()
@@ -215,3 +215,63 @@ def test_approving_own_request_different_user():
     user = 'test_user'
     original_requestor = 'different_user'
     assert approving_own_request(user, original_requestor) == False
+
+def test_request_is_to_elevate_access_ignores_partial_words():
+    issue = {
+        'title': 'Requested review on the pipeline',
+        'body': 'Pull requests are welcome'
+    }
+    assert request_is_to_elevate_access(issue) == False
+
+def test_request_is_to_elevate_access_with_null_body():
+    issue = {
+        'title': 'Elevate me',
+        'body': None
+    }
+    assert request_is_to_elevate_access(issue) == True
+
+@pytest.mark.parametrize("title, expected", [
+    ("Requesting elevated access for incident", True),
+    ("Elevation needed", True),
+    ("Pull requests welcome, but I am requesting access", True),
+    ("Requested reviewers on the pipeline", False),
+    ("Merge request for the pipeline", False),
+])
+def test_request_is_to_elevate_access_matches_inflections(title, expected):
+    assert request_is_to_elevate_access({'title': title, 'body': None}) == expected
+
+@pytest.mark.parametrize("body", ["Approving, go ahead", "approves", "Approved"])
+def test_comment_contains_approval_matches_inflections(body):
+    assert comment_contains_approval({'body': body}) == True
+
+def test_comment_contains_approval_ignores_disapprove():
+    comment = {
+        'body': 'I disapprove of this, no approvals from me'
+    }
+    assert comment_contains_approval(comment) == False
+
+def test_comment_contains_approval_with_shortcode():
+    comment = {
+        'body': ':+1:'
+    }
+    assert comment_contains_approval(comment) == True
+
+def test_intent_classifier_only_scans_bounded_prefix():
+    classifier = IntentClassifier(keywords=['approve'])
+    assert classifier.matches('x ' * 10 + 'approve')
+    assert not classifier.matches('x' * MAX_SCAN_CHARS + ' approve')
+
+def test_intent_classifier_escapes_configured_words():
+    classifier = IntentClassifier(keywords=['lgtm'], emojis=['+1'])
+    assert classifier.matches('LGTM')
+    assert classifier.matches('+1')
+    assert not classifier.matches('lgtm2')
+
+def test_intent_classifier_stems_and_exclusions():
+    classifier = IntentClassifier(keywords=['request*'], exclusions=['requested review'])
+    assert classifier.matches('requests')
+    assert not classifier.matches('requested review')
+    assert classifier.matches('requested review, then requested access')
+
+def test_intent_classifier_without_rules_matches_nothing():
+    assert not IntentClassifier().matches('approve')
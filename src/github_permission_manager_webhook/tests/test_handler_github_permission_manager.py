@@ -1,20 +1,33 @@
 import pytest
+import threading
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
 import time
 import json
+import base64
+import hmac
+import hashlib
 import jwt
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 import requests
 
-from github_permission_manager_webhook.handler import GitHubPermissionManager, GitHubAuth
+from github_permission_manager_webhook import handler as handler_module
+from github_permission_manager_webhook.handler import GitHubPermissionManager, GitHubAuth, MEMBERSHIP_CACHE_TTL_SECONDS
+from common.github_client import DEFAULT_TIMEOUT
+from common.elevation_context import ElevationContext
+from common.rate_limits import RateLimitExceeded
+from common.shared_functions import ESCALATION_TEAM_NAME
+from common.queues import InMemoryQueue
 from github_permission_manager_webhook.utilities import get_headers_from_event, request_is_to_elevate_access, comment_contains_approval, approving_own_request
 
 @pytest.fixture
 def github_permission_manager():
-    mock_requests = MagicMock()
-    return GitHubPermissionManager(requests_module=mock_requests)
+    mock_session = MagicMock()
+    manager = GitHubPermissionManager(session=mock_session)
+    manager.deliveries = MagicMock()
+    manager.deliveries.claim.return_value = True
+    return manager
 
 @pytest.fixture
 def mock_ssm_client():
@@ -100,7 +113,8 @@ def test_get_token_to_access_github(github_permission_manager):
         MockGitHubAuth.assert_called_once_with(
             github_permission_manager.private_key,
             github_permission_manager.app_id,
-            github_permission_manager.installation_id
+            github_permission_manager.installation_id,
+            session=github_permission_manager.github.session
         )
 
         mock_github_auth_instance.get_access_token.assert_called_once()
@@ -144,11 +158,25 @@ def test_get_all_parameters(github_permission_manager):
         assert github_permission_manager.step_function_arn == "mock_workspace_step_function_arn"
         assert github_permission_manager.auth_headers == {"Authorization": "Bearer mock_token"}
 
+def test_get_all_parameters_uses_one_batched_ssm_call(github_permission_manager):
+    github_permission_manager.ssm_client = MagicMock()
+    github_permission_manager.ssm_client.get_parameters.side_effect = lambda Names, WithDecryption: {
+        'Parameters': [{'Name': name, 'Value': f"value_of_{name}", 'Version': 1} for name in Names]
+    }
+    with patch.dict('os.environ', {'WORKSPACE': 'workspace'}), \
+        patch.object(github_permission_manager, 'get_token_to_access_github', return_value={}):
+        github_permission_manager.get_all_parameters()
+        github_permission_manager.get_all_parameters()
+
+    github_permission_manager.ssm_client.get_parameters.assert_called_once()
+    github_permission_manager.ssm_client.get_parameter.assert_not_called()
+    assert github_permission_manager.webhook_secret == "value_of_/github_permission_manager_webhook/workspace_secret_for_webhook"
+
 def test_post_comment_on_issue(github_permission_manager):
     payload = {'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1}}
     comment_body = 'Test comment'
 
-    mock_post = github_permission_manager.requests.post
+    mock_post = github_permission_manager.github.session.post
     mock_response = MagicMock()
     mock_response.status_code = 201
     mock_post.return_value = mock_response
@@ -158,6 +186,7 @@ def test_post_comment_on_issue(github_permission_manager):
     mock_post.assert_called_once_with(
         'https://api.github.com/repos/org/repo/issues/1/comments',
         headers=github_permission_manager.auth_headers,
+        timeout=DEFAULT_TIMEOUT,
         json={"body": comment_body}
     )
 
@@ -167,7 +196,7 @@ def test_post_comment_on_issue_http_error(github_permission_manager, capfd):
     payload = {'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1}}
     comment_body = 'Test comment'
 
-    mock_post = github_permission_manager.requests.post
+    mock_post = github_permission_manager.github.session.post
     mock_response = MagicMock()
     mock_response.status_code = 404
     mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("Not Found")
@@ -178,19 +207,21 @@ def test_post_comment_on_issue_http_error(github_permission_manager, capfd):
     mock_post.assert_called_once_with(
         'https://api.github.com/repos/org/repo/issues/1/comments',
         headers=github_permission_manager.auth_headers,
+        timeout=DEFAULT_TIMEOUT,
         json={"body": comment_body}
     )
 
     # Capture the output
     captured = capfd.readouterr()
-    assert "HTTP error occurred: Not Found" in captured.out
+    assert '"message": "HTTP error occurred"' in captured.out
+    assert '"error": "Not Found"' in captured.out
     assert mock_post.called
 
 def test_post_comment_on_issue_other_error(github_permission_manager, capfd):
     payload = {'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1}}
     comment_body = 'Test comment'
 
-    mock_post = github_permission_manager.requests.post
+    mock_post = github_permission_manager.github.session.post
     mock_response = MagicMock()
     mock_response.status_code = 500
     mock_response.raise_for_status.side_effect = Exception("Some other error")
@@ -201,12 +232,14 @@ def test_post_comment_on_issue_other_error(github_permission_manager, capfd):
     mock_post.assert_called_once_with(
         'https://api.github.com/repos/org/repo/issues/1/comments',
         headers=github_permission_manager.auth_headers,
+        timeout=DEFAULT_TIMEOUT,
         json={"body": comment_body}
     )
 
     # Capture the output
     captured = capfd.readouterr()
-    assert "Other error occurred: Some other error" in captured.out
+    assert '"message": "Other error occurred"' in captured.out
+    assert '"error": "Some other error"' in captured.out
     assert mock_post.called
 
 def test_make_owner_on_github(github_permission_manager):
@@ -215,16 +248,17 @@ def test_make_owner_on_github(github_permission_manager):
     }
     user = 'test-user'
 
-    mock_put = github_permission_manager.requests.put
+    mock_put = github_permission_manager.github.session.put
     mock_response = MagicMock()
     mock_response.status_code = 200
     mock_put.return_value = mock_response
 
-    github_permission_manager.make_owner_on_github(payload, user)
+    assert github_permission_manager.make_owner_on_github(payload, user) == True
 
     mock_put.assert_called_once_with(
         'https://api.github.com/orgs/test-org/memberships/test-user',
         headers=github_permission_manager.auth_headers,
+        timeout=DEFAULT_TIMEOUT,
         json={"role": "admin"}
     )
 
@@ -235,30 +269,50 @@ def test_is_team_member(github_permission_manager):
     org = 'org'
     team = 'team'
 
-    mock_get = github_permission_manager.requests.get
-    mock_response_team = MagicMock()
-    mock_response_team.json.return_value = {'id': 1}
-    mock_response_team.status_code = 200
-
+    mock_get = github_permission_manager.github.session.get
     mock_response_membership = MagicMock()
     mock_response_membership.status_code = 200
-
-    mock_get.side_effect = [mock_response_team, mock_response_membership]
+    mock_get.return_value = mock_response_membership
 
     result = github_permission_manager.is_team_member(user, org, team)
 
-    mock_get.assert_any_call(
-        f'https://api.github.com/orgs/{org}/teams/{team}',
-        headers=github_permission_manager.auth_headers
-    )
-
-    mock_get.assert_any_call(
-        f'https://api.github.com/teams/1/memberships/{user}',
-        headers=github_permission_manager.auth_headers
+    mock_get.assert_called_once_with(
+        f'https://api.github.com/orgs/{org}/teams/{team}/memberships/{user}',
+        headers=github_permission_manager.auth_headers,
+        timeout=DEFAULT_TIMEOUT
     )
 
     assert result == True
 
+@pytest.mark.parametrize("status_code, expected", [(200, True), (404, False)])
+def test_is_team_member_caches_result(github_permission_manager, status_code, expected):
+    mock_get = github_permission_manager.github.session.get
+    mock_get.return_value.status_code = status_code
+
+    assert github_permission_manager.is_team_member('User', 'org', 'team') == expected
+    assert github_permission_manager.is_team_member('user', 'Org', 'team') == expected
+    mock_get.assert_called_once()
+
+def test_is_team_member_does_not_cache_errors(github_permission_manager):
+    mock_get = github_permission_manager.github.session.get
+    mock_get.return_value.status_code = 502
+
+    assert github_permission_manager.is_team_member('user', 'org', 'team') == False
+    assert github_permission_manager.is_team_member('user', 'org', 'team') == False
+    assert mock_get.call_count == 2
+
+def test_is_team_member_cache_expires(github_permission_manager):
+    clock = MagicMock(return_value=1000.0)
+    github_permission_manager.membership_cache.clock = clock
+    mock_get = github_permission_manager.github.session.get
+    mock_get.return_value.status_code = 200
+
+    github_permission_manager.is_team_member('user', 'org', 'team')
+    clock.return_value = 1000.0 + MEMBERSHIP_CACHE_TTL_SECONDS
+    github_permission_manager.is_team_member('user', 'org', 'team')
+
+    assert mock_get.call_count == 2
+
 def test_handle_issue_ineligible_user(github_permission_manager):
     payload = {
         'action': 'opened',
@@ -311,13 +365,431 @@ def test_handle_issue_comment_ineligible_user(github_permission_manager):
         mock_handle.assert_not_called()
         mock_elevation_eligible.assert_called_once()
 
+def pending_request():
+    return {'requested_at': 'then', 'status': 'pending'}
+
+def test_handle_approval_comment_promotes_requestor(github_permission_manager):
+    payload = {'issue': {'user': {'login': 'requestor'}}, 'organization': {'login': 'org'}}
+    with patch.object(github_permission_manager, 'notify') as mock_notify, \
+        patch.object(github_permission_manager, 'get_most_recent_request', return_value=pending_request()), \
+        patch.object(github_permission_manager, 'promote_user_to_owner') as mock_promote:
+        github_permission_manager._handle_approval_comment(payload, 'approver')
+        mock_notify.assert_called_once_with(payload, "@approver has approved the elevation for @requestor.")
+        mock_promote.assert_called_once_with(payload, 'requestor', pending_request(), approver='approver')
+
+def test_handle_approval_comment_own_request_posts_one_comment(github_permission_manager):
+    payload = {'issue': {'number': 1, 'user': {'login': 'requestor'}}, 'repository': {'full_name': 'org/repo'}}
+    with patch.object(github_permission_manager, 'promote_user_to_owner') as mock_promote:
+        github_permission_manager._handle_approval_comment(payload, 'requestor')
+        github_permission_manager.notifications.flush()
+        mock_promote.assert_not_called()
+        mock_post = github_permission_manager.github.session.post
+        mock_post.assert_called_once()
+        assert mock_post.call_args[1]['json'] == {
+            "body": "@requestor has approved the elevation for @requestor.\n\n@requestor cannot approve own requests."
+        }
+
+def comment_payload(body='approve'):
+    return {
+        'action': 'created',
+        'comment': {'user': {'login': 'approver'}, 'body': body},
+        'issue': {'number': 1, 'user': {'login': 'requestor'}, 'state': 'open'},
+        'repository': {'owner': {'login': 'org'}, 'full_name': 'org/repo'},
+        'organization': {'login': 'org'}
+    }
+
+def test_handle_issue_comment_uses_graphql_context_for_eligibility(github_permission_manager):
+    github_permission_manager.use_graphql_lookups = True
+    context = ElevationContext(approver_is_member=True, requester_is_member=True, requester_role='member',
+                               requester_role_known=True, issue_state='open')
+    with patch.object(handler_module, 'fetch_elevation_context', return_value=context) as mock_fetch, \
+        patch.object(github_permission_manager, '_check_membership') as mock_check, \
+        patch.object(github_permission_manager, 'get_most_recent_request', return_value=pending_request()), \
+        patch.object(github_permission_manager, 'promote_user_to_owner') as mock_promote:
+        github_permission_manager.handle_issue_comment(comment_payload())
+        mock_fetch.assert_called_once_with(github_permission_manager.github, 'org', ESCALATION_TEAM_NAME, approver='approver',
+                                           requester='requestor', repository='org/repo', issue_number=1)
+        mock_check.assert_not_called()
+        mock_promote.assert_called_once_with(comment_payload(), 'requestor', pending_request(), approver='approver')
+    assert github_permission_manager.is_team_member('approver', 'org', ESCALATION_TEAM_NAME) is True
+
+def test_handle_issue_comment_falls_back_to_rest_when_graphql_fails(github_permission_manager):
+    github_permission_manager.use_graphql_lookups = True
+    with patch.object(handler_module, 'fetch_elevation_context', side_effect=requests.exceptions.HTTPError("502")), \
+        patch.object(github_permission_manager, '_check_membership', return_value=True) as mock_check, \
+        patch.object(github_permission_manager, 'get_most_recent_request', return_value=pending_request()), \
+        patch.object(github_permission_manager, 'promote_user_to_owner') as mock_promote:
+        github_permission_manager.handle_issue_comment(comment_payload())
+        mock_check.assert_called_once_with('org', ESCALATION_TEAM_NAME, 'approver')
+        mock_promote.assert_called_once()
+
+@pytest.mark.parametrize("context, message", [
+    (ElevationContext(approver_is_member=True, issue_state='closed'),
+     "The elevation request for @requestor is closed and cannot be approved."),
+    (ElevationContext(approver_is_member=True, requester_is_member=False),
+     "@requestor is no longer a member of the elevators team."),
+    (ElevationContext(approver_is_member=True, requester_role='admin', requester_role_known=True),
+     "@requestor is already an owner of the organization."),
+])
+def test_handle_issue_comment_graphql_context_blocks_promotion(github_permission_manager, context, message):
+    github_permission_manager.use_graphql_lookups = True
+    with patch.object(handler_module, 'fetch_elevation_context', return_value=context), \
+        patch.object(github_permission_manager, 'get_most_recent_request', return_value=pending_request()), \
+        patch.object(github_permission_manager, 'notify') as mock_notify, \
+        patch.object(github_permission_manager, 'promote_user_to_owner') as mock_promote:
+        github_permission_manager.handle_issue_comment(comment_payload())
+        mock_promote.assert_not_called()
+        assert mock_notify.call_args[0][1] == message
+
+def test_handle_issue_comment_rest_path_does_not_read_the_requester_role(github_permission_manager):
+    # Without GraphQL lookups, approval costs no more GitHub calls than before those checks existed
+    with patch.object(github_permission_manager, '_check_membership', return_value=True), \
+        patch.object(github_permission_manager.github, 'get_org_membership_role') as mock_role, \
+        patch.object(github_permission_manager, 'get_most_recent_request', return_value=pending_request()), \
+        patch.object(github_permission_manager, 'promote_user_to_owner') as mock_promote:
+        github_permission_manager.handle_issue_comment(comment_payload())
+        mock_role.assert_not_called()
+        mock_promote.assert_called_once_with(comment_payload(), 'requestor', pending_request(), approver='approver')
+
+def test_main_flushes_notifications_once(staged_manager):
+    manager, _, _, mock_handle_issue, _ = staged_manager
+    body = '{"action": "opened", "issue": {"number": 1, "title": "Request elevation"}, "repository": {"full_name": "org/repo"}}'
+
+    def handle_issue(payload):
+        manager.notify(payload, "first")
+        manager.notify(payload, "second")
+    mock_handle_issue.side_effect = handle_issue
+
+    manager.main(signed_event('issues', body), None)
+
+    manager.github.session.post.assert_called_once()
+    assert manager.github.session.post.call_args[1]['json'] == {"body": "first\n\nsecond"}
+
+def test_promote_user_to_owner_promotes_then_records_then_schedules(github_permission_manager):
+    calls = []
+    payload = {'issue': {'number': 1}}
+    with patch.object(github_permission_manager, 'update_user_status', side_effect=lambda *a: calls.append('record') or True) as mock_update, \
+        patch.object(github_permission_manager, 'make_owner_on_github', side_effect=lambda *a: calls.append('promote') or True), \
+        patch.object(github_permission_manager, 'schedule_demotion', side_effect=lambda *a: calls.append('schedule')) as mock_schedule:
+        github_permission_manager.promote_user_to_owner(payload, 'requestor', pending_request(), approver='approver')
+        mock_update.assert_called_once_with('requestor', 'then', 'approver')
+        mock_schedule.assert_called_once_with(payload, 'requestor', 'then')
+        assert calls == ['promote', 'record', 'schedule']
+
+def test_promote_user_to_owner_flushes_notifications_alongside_the_schedule(github_permission_manager):
+    barrier = threading.Barrier(2, timeout=5)
+    payload = {'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1}}
+    github_permission_manager.notify(payload, "approved")
+    github_permission_manager.github.session.post.side_effect = lambda *a, **k: barrier.wait()
+    with patch.object(github_permission_manager, 'make_owner_on_github', return_value=True), \
+        patch.object(github_permission_manager, 'update_user_status', return_value=True), \
+        patch.object(github_permission_manager, 'schedule_demotion', side_effect=lambda *a: barrier.wait()) as mock_schedule:
+        github_permission_manager.promote_user_to_owner(payload, 'requestor', pending_request())
+        mock_schedule.assert_called_once()
+    github_permission_manager.github.session.post.assert_called_once()
+
+def test_promote_user_to_owner_skips_request_that_is_not_pending(github_permission_manager):
+    payload = {'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1}}
+    with patch.object(github_permission_manager, 'update_user_status') as mock_update, \
+        patch.object(github_permission_manager, 'make_owner_on_github') as mock_promote, \
+        patch.object(github_permission_manager, 'schedule_demotion') as mock_schedule:
+        github_permission_manager.promote_user_to_owner(payload, 'requestor', {'requested_at': 'then', 'status': 'demoted'})
+        mock_promote.assert_not_called()
+        mock_update.assert_not_called()
+        mock_schedule.assert_not_called()
+    github_permission_manager.notifications.flush()
+    assert "no pending elevation request" in github_permission_manager.github.session.post.call_args[1]['json']['body']
+
+def test_promote_user_to_owner_leaves_request_pending_when_promotion_fails(github_permission_manager):
+    payload = {'organization': {'login': 'org'}, 'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1}}
+    github_permission_manager.github.session.put.return_value.raise_for_status.side_effect = Exception("502 Bad Gateway")
+    with patch.object(github_permission_manager, 'update_user_status') as mock_update, \
+        patch.object(github_permission_manager, 'schedule_demotion') as mock_schedule:
+        github_permission_manager.promote_user_to_owner(payload, 'requestor', pending_request())
+        mock_update.assert_not_called()
+        mock_schedule.assert_not_called()
+    github_permission_manager.notifications.flush()
+    assert "approve again to retry" in github_permission_manager.github.session.post.call_args[1]['json']['body']
+
+def test_promote_user_to_owner_does_not_schedule_twice_for_a_lost_race(github_permission_manager):
+    with patch.object(github_permission_manager, 'make_owner_on_github', return_value=True), \
+        patch.object(github_permission_manager, 'update_user_status', return_value=False), \
+        patch.object(github_permission_manager, 'schedule_demotion') as mock_schedule:
+        github_permission_manager.promote_user_to_owner({}, 'requestor', pending_request())
+        mock_schedule.assert_not_called()
+
+def test_promote_user_to_owner_reverts_promotion_it_cannot_record(github_permission_manager):
+    payload = {'organization': {'login': 'org'}}
+    with patch.object(github_permission_manager, 'make_owner_on_github', return_value=True), \
+        patch.object(github_permission_manager, 'update_user_status', side_effect=Exception("throttled")), \
+        patch.object(github_permission_manager, 'schedule_demotion') as mock_schedule, \
+        pytest.raises(Exception, match="throttled"):
+        github_permission_manager.promote_user_to_owner(payload, 'requestor', pending_request())
+    mock_schedule.assert_not_called()
+    assert github_permission_manager.github.session.put.call_args[1]['json'] == {"role": "member"}
+
+def test_promote_user_to_owner_reverts_elevation_it_cannot_schedule(github_permission_manager):
+    payload = {'organization': {'login': 'org'}, 'repository': {'full_name': 'org/repo'}, 'issue': {'number': 1},
+               'installation': {'id': 1}}
+    github_permission_manager.store = MagicMock()
+    github_permission_manager.step_functions = MagicMock()
+    github_permission_manager.step_functions.start_execution.side_effect = Exception("ThrottlingException")
+    with patch.dict('os.environ', {'ELEVATION_DURATION': '300'}), \
+        patch.object(github_permission_manager, 'make_owner_on_github', return_value=True), \
+        patch.object(github_permission_manager, 'update_user_status', return_value=True), \
+        pytest.raises(Exception, match="ThrottlingException"):
+        github_permission_manager.promote_user_to_owner(payload, 'requestor', pending_request())
+    assert github_permission_manager.github.session.put.call_args[1]['json'] == {"role": "member"}
+    github_permission_manager.store.revert_elevation.assert_called_once_with('requestor', 'then')
+    github_permission_manager.notifications.flush()
+    assert "approve again to retry" in github_permission_manager.github.session.post.call_args[1]['json']['body']
+
+def test_promote_user_to_owner_keeps_elevation_it_cannot_revert(github_permission_manager):
+    github_permission_manager.store = MagicMock()
+    github_permission_manager.github.session.put.return_value.raise_for_status.side_effect = Exception("502 Bad Gateway")
+    with patch.object(github_permission_manager, 'make_owner_on_github', return_value=True), \
+        patch.object(github_permission_manager, 'update_user_status', return_value=True), \
+        patch.object(github_permission_manager, 'schedule_demotion', side_effect=Exception("ThrottlingException")), \
+        pytest.raises(Exception, match="ThrottlingException"):
+        github_permission_manager.promote_user_to_owner({'organization': {'login': 'org'}}, 'requestor', pending_request())
+    # Still elevated, so the expiry sweeper demotes the user
+    github_permission_manager.store.revert_elevation.assert_not_called()
+
+def test_schedule_demotion_passes_request_key(github_permission_manager):
+    github_permission_manager.step_functions = MagicMock()
+    github_permission_manager.step_function_arn = 'arn'
+    payload = {
+        'installation': {'id': 1}, 'organization': {'login': 'org'},
+        'repository': {'full_name': 'org/repo'}, 'issue': {'number': 2}
+    }
+    with patch.dict('os.environ', {'ELEVATION_DURATION': '300'}):
+        github_permission_manager.schedule_demotion(payload, 'requestor', 'then')
+    execution_input = json.loads(github_permission_manager.step_functions.start_execution.call_args[1]['input'])
+    assert execution_input['requested_at'] == 'then'
+    assert execution_input['wait_seconds'] == 300
+
+def test_promote_user_to_owner_without_request(github_permission_manager):
+    with patch.object(github_permission_manager, 'make_owner_on_github') as mock_promote:
+        github_permission_manager.promote_user_to_owner({}, 'requestor', None)
+        mock_promote.assert_not_called()
+
 def test_main_handler(github_permission_manager):
-    event = {'headers': {'X-GitHub-Event': 'issues'}, 'body': '{}'}
+    event = {'headers': {'X-GitHub-Event': 'issues'}, 'body': '{"action": "opened"}'}
     with patch.object(github_permission_manager, 'initialise_aws_clients'), \
+        patch.object(github_permission_manager, 'load_webhook_secret'), \
         patch.object(github_permission_manager, 'get_all_parameters'), \
-        patch.object(github_permission_manager, 'request_is_from_github', return_value=True), \
+        patch.object(github_permission_manager, '_is_valid_payload_signature', return_value=True), \
+        patch.object(github_permission_manager, '_is_actionable', return_value=True), \
         patch.object(github_permission_manager, 'handle_issue') as mock_handle:
         response = github_permission_manager.main(event, None)
-        mock_handle.assert_called_once()
+        mock_handle.assert_called_once_with({'action': 'opened'})
         assert response['statusCode'] == 200
         assert json.loads(response['body']) == {'response': 'yes'}
+
+def signed_event(github_event, body, secret='mysecret', base64_encoded=False):
+    signature = "sha256=" + hmac.new(secret.encode('utf-8'), msg=body.encode('utf-8'), digestmod=hashlib.sha256).hexdigest()
+    event = {
+        'headers': {'X-GitHub-Event': github_event, 'X-Hub-Signature-256': signature},
+        'body': body
+    }
+    if base64_encoded:
+        event['body'] = base64.b64encode(body.encode('utf-8')).decode('ascii')
+        event['isBase64Encoded'] = True
+    return event
+
+@pytest.fixture
+def staged_manager(github_permission_manager):
+    def load_webhook_secret():
+        github_permission_manager.webhook_secret = 'mysecret'
+    with patch.object(github_permission_manager, 'load_webhook_secret', side_effect=load_webhook_secret), \
+        patch.object(github_permission_manager, 'initialise_aws_clients') as mock_clients, \
+        patch.object(github_permission_manager, 'get_all_parameters') as mock_parameters, \
+        patch.object(github_permission_manager, 'handle_issue') as mock_handle_issue, \
+        patch.object(github_permission_manager, 'handle_issue_comment') as mock_handle_comment:
+        yield github_permission_manager, mock_clients, mock_parameters, mock_handle_issue, mock_handle_comment
+
+def test_main_rejects_forged_signature_before_setup(staged_manager):
+    manager, mock_clients, mock_parameters, mock_handle_issue, _ = staged_manager
+    event = signed_event('issues', '{"action": "opened"}', secret='wrongsecret')
+
+    response = manager.main(event, None)
+
+    assert response['statusCode'] == 403
+    mock_clients.assert_not_called()
+    mock_parameters.assert_not_called()
+    mock_handle_issue.assert_not_called()
+
+@pytest.mark.parametrize("github_event, body", [
+    ('ping', '{"zen": "Keep it logically awesome."}'),
+    ('issues', '{"action": "edited", "issue": {"title": "Request elevation"}}'),
+    ('issues', '{"action": "opened", "issue": {"title": "Bug report", "body": "Broken"}}'),
+    ('issue_comment', '{"action": "deleted", "comment": {"user": {"login": "user"}}}'),
+    ('issue_comment', '{"action": "created", "comment": {"user": {"login": "elevatemetoowner[bot]"}}}'),
+])
+def test_main_skips_events_that_need_no_action(staged_manager, github_event, body):
+    manager, mock_clients, mock_parameters, mock_handle_issue, mock_handle_comment = staged_manager
+
+    response = manager.main(signed_event(github_event, body), None)
+
+    assert response['statusCode'] == 200
+    mock_clients.assert_not_called()
+    mock_parameters.assert_not_called()
+    mock_handle_issue.assert_not_called()
+    mock_handle_comment.assert_not_called()
+
+def test_main_handles_base64_encoded_body(staged_manager):
+    manager, mock_clients, mock_parameters, _, mock_handle_comment = staged_manager
+    body = '{"action": "created", "comment": {"user": {"login": "user"}, "body": "approve"}}'
+
+    response = manager.main(signed_event('issue_comment', body, base64_encoded=True), None)
+
+    assert response['statusCode'] == 200
+    mock_clients.assert_called_once()
+    mock_parameters.assert_called_once()
+    mock_handle_comment.assert_called_once_with(json.loads(body))
+
+def test_signature_hmac_is_reused_until_secret_changes(github_permission_manager):
+    github_permission_manager.webhook_secret = 'mysecret'
+    first = github_permission_manager._get_signature_hmac()
+    assert github_permission_manager._get_signature_hmac() is first
+    github_permission_manager.webhook_secret = 'rotated'
+    assert github_permission_manager._get_signature_hmac() is not first
+
+def test_handler_reuses_manager_across_invocations():
+    event = {'headers': {}, 'body': '{}'}
+    with patch.object(handler_module.runtime_context, 'factory') as mock_factory:
+        handler_module.runtime_context.invalidate()
+        mock_factory.return_value.main.return_value = {'statusCode': 200}
+        handler_module.handler(event, None)
+        handler_module.handler(event, None)
+        mock_factory.assert_called_once()
+        assert mock_factory.return_value.main.call_count == 2
+    handler_module.runtime_context.invalidate()
+
+def test_handler_invalidates_context_on_error():
+    event = {'headers': {}, 'body': '{}'}
+    with patch.object(handler_module.runtime_context, 'factory') as mock_factory:
+        handler_module.runtime_context.invalidate()
+        mock_factory.return_value.main.side_effect = Exception("bad credentials")
+        with pytest.raises(Exception):
+            handler_module.handler(event, None)
+        assert handler_module.runtime_context.is_expired()
+
+def test_handler_keeps_context_when_rate_limited():
+    event = {'headers': {}, 'body': '{}'}
+    with patch.object(handler_module.runtime_context, 'factory') as mock_factory:
+        handler_module.runtime_context.invalidate()
+        mock_factory.return_value.main.side_effect = RateLimitExceeded('4001', 1717243200)
+        with pytest.raises(RateLimitExceeded):
+            handler_module.handler(event, None)
+        assert not handler_module.runtime_context.is_expired()
+    handler_module.runtime_context.invalidate()
+
+APPROVAL_COMMENT_BODY = '{"action": "created", "comment": {"user": {"login": "user"}, "body": "approve"}}'
+
+def test_main_skips_duplicate_delivery_before_fetching_token(staged_manager):
+    manager, _, mock_parameters, _, mock_handle_comment = staged_manager
+    manager.deliveries.claim.return_value = False
+    event = signed_event('issue_comment', APPROVAL_COMMENT_BODY)
+    event['headers']['X-GitHub-Delivery'] = 'delivery-1'
+
+    response = manager.main(event, None)
+
+    assert json.loads(response['body']) == {'response': 'duplicate'}
+    manager.deliveries.claim.assert_called_once_with('delivery-1')
+    mock_parameters.assert_not_called()
+    mock_handle_comment.assert_not_called()
+
+def test_main_releases_delivery_when_processing_fails(staged_manager):
+    manager, _, _, _, mock_handle_comment = staged_manager
+    mock_handle_comment.side_effect = Exception("boom")
+    event = signed_event('issue_comment', APPROVAL_COMMENT_BODY)
+    event['headers']['X-GitHub-Delivery'] = 'delivery-1'
+
+    with pytest.raises(Exception):
+        manager.main(event, None)
+
+    manager.deliveries.release.assert_called_once_with('delivery-1')
+
+def test_handler_emits_one_emf_line_per_invocation(capfd):
+    event = {'headers': {}, 'body': '{}'}
+    with patch.object(handler_module.runtime_context, 'factory') as mock_factory:
+        handler_module.runtime_context.invalidate()
+        mock_factory.return_value.main.side_effect = Exception("bad credentials")
+        with pytest.raises(Exception):
+            handler_module.handler(event, None)
+    handler_module.runtime_context.invalidate()
+
+    documents = [json.loads(line) for line in capfd.readouterr().out.splitlines() if '"_aws"' in line]
+    assert len(documents) == 1
+    assert documents[0]['Function'] == handler_module.FUNCTION_NAME
+    assert 'HandlerDuration' in documents[0]
+    assert documents[0]['ColdStart'] in (0, 1)
+
+def test_main_async_mode_queues_verified_delivery_and_returns_202(staged_manager):
+    manager, mock_clients, mock_parameters, _, mock_handle_comment = staged_manager
+    manager.ingestion_mode = 'async'
+    manager.queue = InMemoryQueue()
+    event = signed_event('issue_comment', APPROVAL_COMMENT_BODY)
+    event['headers']['X-GitHub-Delivery'] = 'delivery-1'
+
+    response = manager.main(event, None)
+
+    assert response['statusCode'] == 202
+    mock_clients.assert_not_called()
+    mock_parameters.assert_not_called()
+    mock_handle_comment.assert_not_called()
+    manager.deliveries.claim.assert_not_called()
+    message = manager.queue.receive()[0].body
+    assert message['delivery_id'] == 'delivery-1'
+    assert message['github_event'] == 'issue_comment'
+    assert message['payload'] == APPROVAL_COMMENT_BODY
+
+def test_main_async_mode_still_rejects_forged_signature(staged_manager):
+    manager, _, _, _, _ = staged_manager
+    manager.ingestion_mode = 'async'
+    manager.queue = InMemoryQueue()
+
+    response = manager.main(signed_event('issue_comment', APPROVAL_COMMENT_BODY, secret='wrongsecret'), None)
+
+    assert response['statusCode'] == 403
+    assert len(manager.queue) == 0
+
+def test_process_delivery_handles_queued_event(staged_manager):
+    manager, mock_clients, mock_parameters, _, mock_handle_comment = staged_manager
+    payload = json.loads(APPROVAL_COMMENT_BODY)
+
+    assert manager.process_delivery('issue_comment', 'delivery-1', payload) is True
+
+    mock_clients.assert_called_once()
+    mock_parameters.assert_called_once()
+    mock_handle_comment.assert_called_once_with(payload)
+
+def test_process_delivery_uses_the_installation_named_by_the_payload(staged_manager):
+    manager, _, mock_parameters, _, _ = staged_manager
+    payload = dict(json.loads(APPROVAL_COMMENT_BODY), installation={'id': 44444})
+
+    manager.process_delivery('issue_comment', 'delivery-1', payload)
+
+    mock_parameters.assert_called_once_with(44444)
+
+def test_use_installation_falls_back_to_ssm_installation(github_permission_manager):
+    github_permission_manager.default_installation_id = '4001'
+    github_permission_manager.github_auth = MagicMock()
+    github_permission_manager.github_auth.get_access_token.side_effect = lambda installation_id: f"token-{installation_id}"
+
+    github_permission_manager.use_installation(44444)
+    assert github_permission_manager.installation_id == '44444'
+    assert github_permission_manager.auth_headers['Authorization'] == "Bearer token-44444"
+
+    github_permission_manager.use_installation(None)
+    assert github_permission_manager.installation_id == '4001'
+    assert github_permission_manager.auth_headers['Authorization'] == "Bearer token-4001"
+
+def test_update_user_status_records_the_approver(github_permission_manager, monkeypatch):
+    monkeypatch.setenv('ELEVATION_DURATION', '300')
+    github_permission_manager.store = MagicMock()
+
+    github_permission_manager.update_user_status('requestor', 'then', 'approver')
+
+    github_permission_manager.store.mark_elevated.assert_called_once_with('requestor', 'then', 300, approver='approver')
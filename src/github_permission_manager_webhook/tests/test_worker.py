@@ -0,0 +1,112 @@
+import json
+import pytest
+from unittest.mock import MagicMock, call, patch
+from github_permission_manager_webhook import worker
+from github_permission_manager_webhook.handler import GitHubPermissionManager
+from common.queues import InMemoryQueue
+from common.shared_functions import ESCALATION_TEAM_NAME
+
+def comment_payload(commenter='approver', organization='org', installation=1):
+    return {
+        'action': 'created',
+        'comment': {'user': {'login': commenter}, 'body': 'approve'},
+        'issue': {'number': 1, 'user': {'login': 'requestor'}},
+        'repository': {'owner': {'login': organization}, 'full_name': f"{organization}/repo"},
+        'organization': {'login': organization},
+        'installation': {'id': installation}
+    }
+
+def queued_delivery(delivery_id='delivery-1', payload=None, github_event='issue_comment'):
+    return {'delivery_id': delivery_id, 'github_event': github_event,
+            'payload': json.dumps(payload or comment_payload()), 'received_at': 0}
+
+def sqs_record(message_id, body):
+    return {'messageId': message_id, 'body': body if isinstance(body, str) else json.dumps(body)}
+
+def test_batch_worker_groups_by_installation_and_prefetches_members_once_per_group():
+    manager = MagicMock()
+    messages = [
+        ('m-1', queued_delivery('d-1', comment_payload('alice', 'org-a'))),
+        ('m-2', queued_delivery('d-2', comment_payload('bob', 'org-b', installation=2))),
+        ('m-3', queued_delivery('d-3', comment_payload('carol', 'org-a'))),
+    ]
+
+    assert worker.BatchWorker(manager).run(messages) == []
+
+    assert manager.get_all_parameters.call_args_list == [call(1), call(2)]
+    assert manager.prefetch_team_memberships.call_args_list == [call('org-a', ['alice', 'carol']), call('org-b', ['bob'])]
+    assert [args[0][1] for args in manager.process_delivery.call_args_list] == ['d-1', 'd-3', 'd-2']
+
+def test_batch_worker_reports_failed_and_malformed_deliveries():
+    manager = MagicMock()
+    manager.process_delivery.side_effect = [True, Exception("GitHub unavailable")]
+    messages = [
+        ('m-1', queued_delivery('d-1')),
+        ('m-2', queued_delivery('d-2')),
+        ('m-3', {'delivery_id': 'd-3', 'github_event': 'issue_comment', 'payload': 'not json'}),
+    ]
+
+    assert worker.BatchWorker(manager).run(messages) == ['m-3', 'm-2']
+
+def test_batch_worker_fails_only_the_group_whose_setup_fails():
+    manager = MagicMock()
+    manager.get_all_parameters.side_effect = [Exception("Installation not found"), None]
+    messages = [
+        ('m-1', queued_delivery('d-1', comment_payload('alice', 'org-a'))),
+        ('m-2', queued_delivery('d-2', comment_payload('bob', 'org-b', installation=2))),
+        ('m-3', queued_delivery('d-3', comment_payload('carol', 'org-a'))),
+    ]
+
+    assert worker.BatchWorker(manager).run(messages) == ['m-1', 'm-3']
+
+    assert manager.prefetch_team_memberships.call_args_list == [call('org-b', ['bob'])]
+    assert [args[0][1] for args in manager.process_delivery.call_args_list] == ['d-2']
+
+def test_prefetch_team_memberships_lists_the_team_once():
+    manager = GitHubPermissionManager(session=MagicMock())
+    with patch.object(manager.github, 'iter_pages', return_value=iter([[{'login': 'Alice'}, {'login': 'dave'}]])) as mock_pages, \
+        patch.object(manager, '_check_membership') as mock_check:
+        manager.prefetch_team_memberships('org', ['alice', 'bob'])
+        assert manager.is_team_member('alice', 'org', ESCALATION_TEAM_NAME) is True
+        assert manager.is_team_member('bob', 'org', ESCALATION_TEAM_NAME) is False
+        mock_check.assert_not_called()
+    mock_pages.assert_called_once_with(f"/orgs/org/teams/{ESCALATION_TEAM_NAME}/members", params={"per_page": 100})
+
+def test_prefetch_team_memberships_skips_single_user():
+    manager = GitHubPermissionManager(session=MagicMock())
+    with patch.object(manager.github, 'iter_pages') as mock_pages:
+        manager.prefetch_team_memberships('org', ['alice'])
+    mock_pages.assert_not_called()
+
+def test_drain_deletes_processed_and_puts_failed_back():
+    queue = InMemoryQueue()
+    queue.send(queued_delivery('delivery-1'))
+    queue.send(queued_delivery('delivery-2'))
+    manager = MagicMock()
+    manager.process_delivery.side_effect = [True, Exception("GitHub unavailable")]
+
+    assert worker.drain(queue, manager) == (1, 1)
+    assert [message.body['delivery_id'] for message in queue.receive()] == ['delivery-2']
+
+def test_handler_reports_partial_batch_failures():
+    manager = MagicMock()
+    manager.process_delivery.side_effect = [True, Exception("boom")]
+    event = {'Records': [
+        sqs_record('m-1', queued_delivery('d-1')),
+        sqs_record('m-2', queued_delivery('d-2')),
+        sqs_record('m-3', 'not json'),
+    ]}
+    with patch.object(worker.runtime_context, 'get', return_value=manager), patch.object(worker, 'metrics') as mock_metrics:
+        response = worker.handler(event, None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'm-3'}, {'itemIdentifier': 'm-2'}]}
+    mock_metrics.flush.assert_called_once_with(worker.FUNCTION_NAME)
+
+def test_handler_raises_when_the_batch_cannot_start():
+    manager = MagicMock()
+    manager.initialise_aws_clients.side_effect = Exception("AWS unavailable")
+    with patch.object(worker.runtime_context, 'get', return_value=manager), \
+        patch.object(worker.runtime_context, 'invalidate') as mock_invalidate, \
+        patch.object(worker, 'metrics'), \
+        pytest.raises(Exception):
+        worker.handler({'Records': [sqs_record('m-1', queued_delivery())]}, None)
+    mock_invalidate.assert_called_once()
@@ -1,18 +1,77 @@
+import os
 import re
 
+# A trailing * matches any ending, e.g. elevat* for elevate, elevated and elevation
+DEFAULT_ELEVATION_KEYWORDS = ('request*', 'elevat*')
+# Phrases whose keywords are not about elevation, e.g. "requested review" or "pull requests"
+DEFAULT_ELEVATION_EXCLUSIONS = ('requested review*', 'review request*', 'pull request*', 'merge request*')
+DEFAULT_APPROVAL_KEYWORDS = ('approve', 'approved', 'approves', 'approving')
+DEFAULT_APPROVAL_EMOJIS = ('👍', ':+1:', ':thumbsup:')
+MAX_SCAN_CHARS = 4096  # Intent is stated near the top; long pasted logs are not scanned
+
 def get_headers_from_event(event):
     return event.get('headers', {}) or event.get('Headers', {})
 
+def _configured_words(env_name, default):
+    value = os.getenv(env_name)
+    if value is None:
+        return default
+    return tuple(word.strip() for word in value.split(',') if word.strip())
+
+def _word_pattern(words):
+    # Longest first so "elevation" is preferred over "elevate" inside the alternation
+    alternatives = [re.escape(word[:-1]) + r'\w*' if word.endswith('*') else re.escape(word)
+                    for word in sorted(set(words), key=len, reverse=True)]
+    return r'\b(?:' + '|'.join(alternatives) + r')\b'
+
+class IntentClassifier:
+    """Matches whole keywords and emoji tokens, compiled once and scanning a bounded prefix of each text.
+
+    Keywords inside an excluded phrase do not count.
+    """
+
+    def __init__(self, keywords=(), emojis=(), exclusions=(), max_scan_chars=MAX_SCAN_CHARS):
+        alternatives = []
+        if keywords:
+            alternatives.append(_word_pattern(keywords))
+        if emojis:
+            alternatives.extend(re.escape(emoji) for emoji in emojis)
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+        self.exclusion = re.compile(_word_pattern(exclusions), re.IGNORECASE) if exclusions else None
+        self.max_scan_chars = max_scan_chars
+
+    def matches(self, *texts):
+        if self.pattern is None:
+            return False
+        for text in texts:
+            if text and self._matches(text):
+                return True
+        return False
+
+    def _matches(self, text):
+        if self.pattern.search(text, 0, self.max_scan_chars) is None:
+            return False
+        # Exclusions only need scanning once a keyword has matched
+        excluded = [match.span() for match in self.exclusion.finditer(text, 0, self.max_scan_chars)] if self.exclusion else []
+        if not excluded:
+            return True
+        return any(not any(start <= match.start() and match.end() <= end for start, end in excluded)
+                   for match in self.pattern.finditer(text, 0, self.max_scan_chars))
+
+ELEVATION_CLASSIFIER = IntentClassifier(
+    keywords=_configured_words('ELEVATION_KEYWORDS', DEFAULT_ELEVATION_KEYWORDS),
+    exclusions=_configured_words('ELEVATION_EXCLUSIONS', DEFAULT_ELEVATION_EXCLUSIONS)
+)
+APPROVAL_CLASSIFIER = IntentClassifier(
+    keywords=_configured_words('APPROVAL_KEYWORDS', DEFAULT_APPROVAL_KEYWORDS),
+    emojis=_configured_words('APPROVAL_EMOJIS', DEFAULT_APPROVAL_EMOJIS)
+)
+
 def request_is_to_elevate_access(issue):
-    keywords = ['request', 'elevate', 'elevation']
-    title = issue.get('title', '')
-    body = issue.get('body', '')
-    pattern = re.compile('|'.join(keywords), re.IGNORECASE)
-    return bool(pattern.search(title) or pattern.search(body))
+    return ELEVATION_CLASSIFIER.matches(issue.get('title'), issue.get('body'))
 
 def comment_contains_approval(comment):
-    pattern = re.compile(r'approve|👍', re.IGNORECASE)
-    return bool(pattern.search(comment['body']))
+    return APPROVAL_CLASSIFIER.matches(comment.get('body'))
 
 def approving_own_request(user, original_requestor):
     return user == original_requestor
@@ -0,0 +1,132 @@
+import json
+import os
+from common.queues import create_queue
+from common.shared_functions import get_event_installation_id
+from common.logger import logger
+from common.metrics import metrics
+from handler import runtime_context
+
+FUNCTION_NAME = 'github_permission_manager_worker'
+
+def get_group_key(payload):
+    organization = (payload.get('organization') or {}).get('login') or payload['repository']['owner']['login']
+    return organization, get_event_installation_id(payload)
+
+def get_eligibility_user(github_event, payload):
+    # The user whose escalation team membership the event will be decided on
+    if github_event == 'issues':
+        return payload['issue']['user']['login']
+    if github_event == 'issue_comment':
+        return payload['comment']['user']['login']
+    return None
+
+class QueuedDelivery:
+    def __init__(self, identifier, body):
+        # The signature was checked at ingress; the queue only ever holds verified deliveries
+        self.identifier = identifier
+        self.delivery_id = body.get('delivery_id')
+        self.github_event = body['github_event']
+        self.payload = json.loads(body['payload'])
+
+class BatchWorker:
+    """Processes a batch of queued deliveries grouped by organization and installation.
+
+    Each group switches to its installation's pooled token and resolves team membership
+    for all of its users in one listing before its deliveries are handled in arrival order.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def run(self, messages):
+        """Takes (identifier, body) pairs and returns the identifiers that failed."""
+        failures, groups = [], {}
+        for identifier, body in messages:
+            try:
+                delivery = QueuedDelivery(identifier, body)
+                groups.setdefault(get_group_key(delivery.payload), []).append(delivery)
+            except (KeyError, TypeError, ValueError) as err:
+                logger.error("Queued delivery is malformed", identifier=identifier, error=str(err))
+                failures.append(identifier)
+        if not groups:
+            return failures
+
+        self.manager.initialise_aws_clients()
+        for (organization, installation), deliveries in groups.items():
+            logger.debug("Processing delivery group", organization=organization, installation=installation,
+                         deliveries=len(deliveries))
+            if not self._prepare(organization, installation, deliveries):
+                # Only this group's records go back to the queue; the other groups still run
+                failures.extend(delivery.identifier for delivery in deliveries)
+                continue
+            for delivery in deliveries:
+                if not self._process(delivery):
+                    failures.append(delivery.identifier)
+        return failures
+
+    def _prepare(self, organization, installation, deliveries):
+        try:
+            self.manager.get_all_parameters(installation)
+            users = {get_eligibility_user(delivery.github_event, delivery.payload) for delivery in deliveries}
+            self.manager.prefetch_team_memberships(organization, sorted(user for user in users if user))
+            return True
+        except Exception as err:
+            logger.error("Delivery group setup failed", organization=organization, installation=installation,
+                         error=str(err))
+            return False
+
+    def _process(self, delivery):
+        try:
+            self.manager.process_delivery(delivery.github_event, delivery.delivery_id, delivery.payload)
+            return True
+        except Exception as err:
+            logger.error("Queued delivery failed", delivery_id=delivery.delivery_id, error=str(err))
+            return False
+
+def drain(queue, manager):
+    """Processes everything on a local queue; failed messages are put back once the queue is empty."""
+    worker = BatchWorker(manager)
+    processed, failed = 0, []
+    while True:
+        messages = queue.receive()
+        if not messages:
+            break
+        failures = set(worker.run([(message.receipt, message.body) for message in messages]))
+        for message in messages:
+            if message.receipt in failures:
+                failed.append(message)
+            else:
+                queue.delete(message.receipt)
+                processed += 1
+    for message in failed:
+        queue.release(message.receipt)
+    return processed, len(failed)
+
+def handler(event, context):
+    # SQS event source with ReportBatchItemFailures: only the failed records return to the
+    # queue, and the delivery claims stop a retried record being handled twice
+    metrics.start_invocation()
+    logger.start_invocation(context, function=FUNCTION_NAME)
+    records = (event or {}).get('Records', [])
+    try:
+        manager = runtime_context.get()
+        messages, failures = [], []
+        for record in records:
+            try:
+                messages.append((record['messageId'], json.loads(record['body'])))
+            except ValueError as err:
+                logger.error("Queued record is not JSON", identifier=record['messageId'], error=str(err))
+                failures.append(record['messageId'])
+        failures.extend(BatchWorker(manager).run(messages))
+    except Exception as err:
+        runtime_context.invalidate_after(err)
+        raise
+    finally:
+        metrics.flush(FUNCTION_NAME)
+    logger.info("Batch processed", records=len(records), failed=len(failures))
+    return {'batchItemFailures': [{'itemIdentifier': identifier} for identifier in failures]}
+
+if __name__ == '__main__':
+    # Local run, e.g. INGESTION_QUEUE_URL=file:///tmp/deliveries python worker.py
+    processed, failed = drain(create_queue(os.environ['INGESTION_QUEUE_URL']), runtime_context.get())
+    logger.info("Queue drained", processed=processed, failed=failed)